@@ -0,0 +1,231 @@
+'''
+전체 유저 추천을 미리 만들어 두는 배치 작업 (nightly)
+
+python batch_recommend.py --chunk-size 200 --concurrency 8 --rate 5
+python batch_recommend.py --resume            # 실패한 유저를 다시 시도한 뒤 체크포인트 이후 유저부터 이어서
+
+유저를 userId 순으로 chunk 단위로 읽어 프롬프트를 한 번에 만들고, LLM 호출은 동시성/초당 호출 수
+제한과 재시도를 걸어 병렬로 실행한다. 결과는 chunk마다 하나의 트랜잭션으로 Recommendations에
+넣고, 커밋이 끝나면 체크포인트 파일에 마지막 userId를 기록한다. runId는 배치 id + userId라서
+커밋 후 체크포인트 전에 멈춘 chunk를 --resume으로 다시 돌려도 같은 run을 덮어쓴다.
+'''
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import async_session_maker, init_db
+from models import Users, Ratings
+from recommendation_store import new_run_id, run_rows, upsert_runs
+from catalog import movie_catalog
+from movie_stats import get_mean_ratings
+from candidates import rank_candidates, format_candidates, get_popularity
+from user_profiles import UserProfile, user_profiles
+import llm_recommend
+from llm_recommend import fill_template, target_template, completed_items, LLM_RECOMMENDER_ID, LLM_RECOMMENDER_NAME
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BATCH_CHECKPOINT_PATH = os.path.join(BASE_DIR, "batch_recommend.checkpoint.json")
+
+
+class RateLimiter:
+    """
+    Spaces calls at least 1/rate seconds apart (rate <= 0 disables the limit).
+    """
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            now = loop.time()
+            if self._next_at > now:
+                await asyncio.sleep(self._next_at - now)
+            self._next_at = max(now, self._next_at) + self.interval
+
+
+def load_checkpoint(path: str) -> dict:
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return new_checkpoint()
+
+
+def new_checkpoint() -> dict:
+    return {"batch_id": new_run_id(), "last_user_id": 0, "done": 0, "failed": []}
+
+
+def save_checkpoint(path: str, checkpoint: dict):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+async def next_user_chunk(db: AsyncSession, after_user_id: int, chunk_size: int) -> List[int]:
+    results = await db.execute(
+        select(Users.userId).where(Users.userId > after_user_id).order_by(Users.userId).limit(chunk_size)
+    )
+    return list(results.scalars().all())
+
+
+async def build_chunk_prompts(user_ids: List[int], db: AsyncSession) -> Dict[int, dict]:
+    # chunk 전체 평점을 한 번에 읽어 유저별 프로필을 만든다, 온라인 추천과 같은 히스토리 순서/후보 순위
+    results = await db.execute(
+        select(Ratings.userId, Ratings.movieId, Ratings.rating, Ratings.timestamp)
+        .where(Ratings.userId.in_(user_ids))
+    )
+    rows_by_user: Dict[int, list] = {userId: [] for userId in user_ids}
+    for row in results.all():
+        rows_by_user[row.userId].append((row.movieId, row.rating, row.timestamp))
+
+    popularity = await get_popularity(db)
+    prompts = {}
+    for userId, rows in rows_by_user.items():
+        profile = UserProfile.from_ratings(userId, rows, user_profiles.top_n)
+        candidates = rank_candidates(profile.rated, popularity, affinity=profile.genre_affinity())
+        if not candidates:
+            continue
+        prompts[userId] = {"movie_candidates": format_candidates(candidates),
+                           "question": fill_template(target_template,
+                                                     {'rating_history': profile.rating_history()})}
+    return prompts
+
+
+async def invoke_with_retry(chain, inputs: dict, semaphore: asyncio.Semaphore,
+                            rate_limiter: RateLimiter, retries: int, backoff: float):
+    for attempt in range(retries + 1):
+        async with semaphore:
+            await rate_limiter.wait()
+            try:
+                return await chain.ainvoke(inputs)
+            except Exception as e:
+                if attempt == retries:
+                    raise
+                logger.warning(f"batch llm call failed (attempt {attempt + 1}): {e}")
+        await asyncio.sleep(backoff * (2 ** attempt))
+
+
+async def process_chunk(user_ids: List[int], chain, db: AsyncSession, semaphore: asyncio.Semaphore,
+                        rate_limiter: RateLimiter, retries: int, backoff: float, batch_id: str):
+    prompts = await build_chunk_prompts(user_ids, db)
+    order = list(prompts)
+    responses = await asyncio.gather(
+        *(invoke_with_retry(chain, prompts[userId], semaphore, rate_limiter, retries, backoff)
+          for userId in order),
+        return_exceptions=True
+    )
+
+    matched: Dict[int, list] = {}
+    failed = [userId for userId in user_ids if userId not in prompts]
+    for userId, response in zip(order, responses):
+        if isinstance(response, Exception) or not isinstance(response, dict) or 'items' not in response:
+            failed.append(userId)
+            continue
+        matched[userId] = movie_catalog.find_titles(completed_items(response['items'], final=True))
+
+    mean_ratings = await get_mean_ratings(db, list({m.movieId for movies in matched.values() for m in movies}))
+    timestamp_unix = time.time()
+    runs, items = [], []
+    for userId, movies in matched.items():
+        if not movies:
+            # LLM 답이 카탈로그 제목과 하나도 맞지 않았다, 저장할 것이 없으니 실패로 남겨 다시 시도한다
+            failed.append(userId)
+            continue
+        run, run_items = run_rows(f"{batch_id}-{userId}", userId,
+                                  [{"movieId": movie.movieId, "rating": mean_ratings.get(movie.movieId)}
+                                   for movie in movies],
+                                  LLM_RECOMMENDER_ID, LLM_RECOMMENDER_NAME, created_at=timestamp_unix)
+        runs.append(run)
+        items.extend(run_items)
+
+    # chunk 하나 = 트랜잭션 하나
+    await upsert_runs(db, runs, items)
+    await db.commit()
+    return len(runs), failed
+
+
+async def run_batch(chunk_size: int = 200, concurrency: int = 8, rate: float = 5.0, retries: int = 3,
+                    backoff: float = 1.0, checkpoint_path: str = BATCH_CHECKPOINT_PATH,
+                    resume: bool = False, max_users: Optional[int] = None, chain=None) -> dict:
+    """
+    Precompute LLM recommendations for every user. `chain` defaults to llm_recommend.get_chain()
+    and can be replaced with a stub for tests.
+    """
+    chain = chain or llm_recommend.get_chain()
+    checkpoint = load_checkpoint(checkpoint_path) if resume else new_checkpoint()
+    checkpoint.setdefault("batch_id", new_run_id())  # batch_id가 없던 예전 체크포인트
+    semaphore = asyncio.Semaphore(concurrency)
+    rate_limiter = RateLimiter(rate)
+
+    await init_db()
+    start = time.perf_counter()
+    processed = retried = 0
+    async with async_session_maker() as db:
+        await movie_catalog.ensure_loaded(db)
+        # --resume: 지난 실행에서 실패한 유저부터 다시 시도한다, 아직 시도하지 않은 유저는 체크포인트에 남겨 둔다
+        retry_ids = list(dict.fromkeys(checkpoint["failed"])) if resume else []
+        still_failed = []
+        for offset in range(0, len(retry_ids), chunk_size):
+            user_ids = retry_ids[offset:offset + chunk_size]
+            done, failed = await process_chunk(user_ids, chain, db, semaphore, rate_limiter, retries, backoff,
+                                               checkpoint["batch_id"])
+            retried += len(user_ids)
+            still_failed.extend(failed)
+            checkpoint["done"] += done
+            checkpoint["failed"] = still_failed + retry_ids[offset + chunk_size:]
+            save_checkpoint(checkpoint_path, checkpoint)
+            print(f"retried {retried}/{len(retry_ids)} failed users, {len(user_ids) - len(failed)} recovered")
+
+        while max_users is None or processed < max_users:
+            size = chunk_size if max_users is None else min(chunk_size, max_users - processed)
+            user_ids = await next_user_chunk(db, checkpoint["last_user_id"], size)
+            if not user_ids:
+                break
+            done, failed = await process_chunk(user_ids, chain, db, semaphore, rate_limiter, retries, backoff,
+                                               checkpoint["batch_id"])
+            processed += len(user_ids)
+            checkpoint["last_user_id"] = user_ids[-1]
+            checkpoint["done"] += done
+            checkpoint["failed"].extend(failed)
+            save_checkpoint(checkpoint_path, checkpoint)
+
+            elapsed = time.perf_counter() - start
+            print(f"users {processed} (last userId {user_ids[-1]}), done {checkpoint['done']}, "
+                  f"failed {len(checkpoint['failed'])}, {processed / elapsed:.1f} users/sec")
+
+    elapsed = time.perf_counter() - start
+    return {"processed_users": processed,
+            "retried_users": retried,
+            "recommended_users": checkpoint["done"],
+            "failed_users": len(checkpoint["failed"]),
+            "seconds": round(elapsed, 2),
+            "users_per_sec": round(processed / elapsed, 2) if elapsed else 0.0}
+
+
+# 스크립트 실행
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Precompute LLM recommendations for all users")
+    arg_parser.add_argument("--chunk-size", type=int, default=200)
+    arg_parser.add_argument("--concurrency", type=int, default=8, help="동시에 실행할 LLM 호출 수")
+    arg_parser.add_argument("--rate", type=float, default=5.0, help="초당 LLM 호출 수 (0이면 제한 없음)")
+    arg_parser.add_argument("--retries", type=int, default=3)
+    arg_parser.add_argument("--checkpoint", default=BATCH_CHECKPOINT_PATH)
+    arg_parser.add_argument("--resume", action="store_true")
+    arg_parser.add_argument("--max-users", type=int, default=None)
+    args = arg_parser.parse_args()
+
+    report = asyncio.run(run_batch(args.chunk_size, args.concurrency, args.rate, args.retries,
+                                   checkpoint_path=args.checkpoint, resume=args.resume,
+                                   max_users=args.max_users))
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,131 @@
+# LLM에 넘길 후보 영화 생성 단계
+# 전체 카탈로그 대신 장르 선호도 + 인기도로 상위 N개만 골라 프롬프트 토큰을 줄인다.
+import heapq
+import logging
+import math
+import os
+import re
+import time
+from typing import Collection, Dict, List
+from sqlalchemy.ext.asyncio import AsyncSession
+from catalog import movie_catalog, MovieRecord
+from movie_stats import get_rating_counts, get_mean_ratings
+from user_profiles import user_profiles
+
+logger = logging.getLogger(__name__)
+
+CANDIDATE_TOP_N = int(os.getenv("CANDIDATE_TOP_N", "200"))
+# LLM이 예산 안에 답하지 못할 때 후보 순위(장르 선호도 + 인기도) 상위를 그대로 추천한다
+FALLBACK_RECOMMENDER_ID = 5
+FALLBACK_RECOMMENDER_NAME = 'Fallback-GenrePopular-v1'
+GENRE_WEIGHT = float(os.getenv("CANDIDATE_GENRE_WEIGHT", "0.7"))
+POPULARITY_WEIGHT = float(os.getenv("CANDIDATE_POPULARITY_WEIGHT", "0.3"))
+POPULARITY_TTL = float(os.getenv("CANDIDATE_POPULARITY_TTL", "300"))  # 인기도 캐시 유지 시간 (초)
+
+_popularity: Dict[int, float] = {}
+_popularity_loaded_at = 0.0
+_full_catalog_tokens = (None, 0)  # (catalog version, token 수)
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count (words + punctuation). Only used to compare prompt sizes.
+    """
+    return len(_TOKEN_PATTERN.findall(text))
+
+
+async def get_popularity(db: AsyncSession) -> Dict[int, float]:
+    # log(평점 수)를 0~1로 정규화, movie_stats 전체를 매번 읽지 않도록 TTL 캐시
+    global _popularity, _popularity_loaded_at
+    if _popularity and time.monotonic() - _popularity_loaded_at < POPULARITY_TTL:
+        return _popularity
+    counts = await get_rating_counts(db)
+    max_log = math.log1p(max(counts.values())) if counts else 0.0
+    _popularity = {movieId: (math.log1p(count) / max_log if max_log else 0.0)
+                   for movieId, count in counts.items()}
+    _popularity_loaded_at = time.monotonic()
+    return _popularity
+
+
+def genre_affinity(rated: Dict[int, float]) -> Dict[str, float]:
+    # 유저가 준 평점 비중을 장르별로 더하고 최댓값 1로 정규화
+    affinity: Dict[str, float] = {}
+    for movieId, rating in rated.items():
+        record = movie_catalog.get(movieId)
+        if record is None:
+            continue
+        for genre in record.genres:
+            affinity[genre] = affinity.get(genre, 0.0) + rating / 5
+    top = max(affinity.values()) if affinity else 0.0
+    return {genre: value / top for genre, value in affinity.items()} if top else {}
+
+
+async def generate_candidates(userId: int, db: AsyncSession, top_n: int = CANDIDATE_TOP_N) -> List[MovieRecord]:
+    await movie_catalog.ensure_loaded(db)
+    # 평가한 영화와 장르 선호도는 유저 프로필에서 읽는다 (ratings를 다시 읽지 않는다)
+    profile = await user_profiles.get(userId, db)
+    popularity = await get_popularity(db)
+    return rank_candidates(profile.rated, popularity, top_n, affinity=profile.genre_affinity())
+
+
+def rank_candidates(rated: Collection[int], popularity: Dict[int, float],
+                    top_n: int = CANDIDATE_TOP_N, affinity: Dict[str, float] = None) -> List[MovieRecord]:
+    # rated: 유저가 평가한 movieId (-> rating), 이미 본 영화는 후보에서 뺀다
+    # affinity를 주지 않으면 rated의 평점으로 장르 선호도를 계산한다
+    if affinity is None:
+        affinity = genre_affinity(rated)
+
+    def score(record: MovieRecord) -> float:
+        genre_score = 0.0
+        if affinity and record.genres:
+            genre_score = sum(affinity.get(g, 0.0) for g in record.genres) / len(record.genres)
+        return GENRE_WEIGHT * genre_score + POPULARITY_WEIGHT * popularity.get(record.movieId, 0.0)
+
+    unseen = (record for record in movie_catalog.by_id.values() if record.movieId not in rated)
+    return heapq.nlargest(top_n, unseen, key=score)
+
+
+async def candidate_movie_info(candidates: List[MovieRecord], db: AsyncSession, k: int = 10) -> List[dict]:
+    # 이미 만든 후보 목록의 앞 k개, 평균 평점만 movie_stats에서 읽는다
+    top = candidates[:k]
+    mean_ratings = await get_mean_ratings(db, [record.movieId for record in top])
+    timestamp_unix = time.time()
+    return [{"movieId": record.movieId,
+             "rating": mean_ratings.get(record.movieId),
+             "title": record.title,
+             "genre": record.genre,
+             "timestamp": timestamp_unix}
+            for record in top]
+
+
+async def popular_recommend_movies(userId: int, db: AsyncSession, k: int = 10) -> List[dict]:
+    # 유저가 좋아하는 장르의 인기 영화 (LLM 없이)
+    return await candidate_movie_info(await generate_candidates(userId, db, top_n=k), db, k)
+
+
+def format_candidates(candidates: List[MovieRecord]) -> str:
+    # 한 줄에 "제목 | 장르", LLM은 제목을 그대로 돌려주면 된다
+    return "\n".join(f"{record.title} | {record.genre}" for record in candidates)
+
+
+def full_catalog_tokens() -> int:
+    # 필터링 전 프롬프트 (영화 dict 전체 목록) 토큰 수, 카탈로그가 바뀔 때만 다시 계산
+    global _full_catalog_tokens
+    version, tokens = _full_catalog_tokens
+    if version != movie_catalog.version:
+        tokens = estimate_tokens(str(movie_catalog.movie_list()))
+        _full_catalog_tokens = (movie_catalog.version, tokens)
+    return tokens
+
+
+def candidate_token_report(candidate_text: str) -> dict:
+    before = full_catalog_tokens()
+    after = estimate_tokens(candidate_text)
+    report = {"candidateCount": candidate_text.count("\n") + 1 if candidate_text else 0,
+              "fullCatalogTokens": before,
+              "candidateTokens": after,
+              "savedRatio": round(1 - after / before, 4) if before else 0.0}
+    logger.info(f"candidate prompt tokens: {report}")
+    return report
@@ -0,0 +1,132 @@
+# movies 테이블을 메모리에 한 번만 올려두고 검색/추천/영화 정보 조회가 같이 쓴다.
+import asyncio
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Movies
+from search_index import MovieSearchIndex
+from title_index import TitleResolver, TitleMatch
+from genre_bits import genre_mask
+
+
+class MovieRecord:
+    __slots__ = ("movieId", "title", "genre", "genres", "genre_mask", "_search_key")
+
+    def __init__(self, movieId: int, title: str, genre: str, mask: Optional[int] = None):
+        self.movieId = movieId
+        self.title = title
+        self.genre = genre
+        self.genres = tuple(g for g in genre.split("|") if g) if genre else ()
+        self.genre_mask = genre_mask(genre) if mask is None else mask
+        # ILIKE '%q%'와 같은 결과를 내도록 소문자로 미리 합쳐둔다
+        self._search_key = f"{title.lower()}\x00{genre.lower()}"
+
+    def as_dict(self) -> dict:
+        return {"movieId": self.movieId, "title": self.title, "genre": self.genre}
+
+
+class MovieCatalog:
+    """
+    In-memory copy of the movies table keyed by movieId and title.
+    Loaded once at startup; movies are only written by init_data, before the server starts.
+    """
+    def __init__(self):
+        self.by_id: Dict[int, MovieRecord] = {}
+        self.by_title: Dict[str, MovieRecord] = {}
+        self.version = 0
+        self.search_index = MovieSearchIndex()
+        self.title_index = TitleResolver()
+        self._movie_list: Optional[List[dict]] = None
+        # (version, movieId 오름차순 배열, 같은 순서의 장르 비트마스크 배열)
+        self._genre_arrays: Tuple[int, np.ndarray, np.ndarray] = (-1, None, None)
+        self._loaded = False
+        self._lock = asyncio.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def __len__(self):
+        return len(self.by_id)
+
+    async def load(self, db: AsyncSession):
+        results = await db.execute(
+            select(Movies.movieId, Movies.title, Movies.genre, Movies.genreMask).order_by(Movies.movieId)
+        )
+        by_id = {}
+        by_title = {}
+        for row in results.all():
+            record = MovieRecord(row.movieId, row.title, row.genre, row.genreMask)
+            by_id[record.movieId] = record
+            by_title[record.title] = record
+        self.by_id = by_id
+        self.by_title = by_title
+        self.search_index.build(by_id.values())
+        self.title_index.build(by_id.values())
+        self._movie_list = None
+        self._loaded = True
+        self.version += 1
+
+    async def ensure_loaded(self, db: AsyncSession):
+        if self._loaded:
+            return
+        async with self._lock:
+            if not self._loaded:
+                await self.load(db)
+
+    def get(self, movieId: int) -> Optional[MovieRecord]:
+        return self.by_id.get(movieId)
+
+    def resolve_titles(self, titles: List[str]) -> List[Tuple[MovieRecord, TitleMatch]]:
+        """
+        Map free-form titles (e.g. LLM output) to movies: exact, then normalized, then fuzzy.
+        Keeps the input order, drops unresolved titles and repeated movies.
+        """
+        resolved = []
+        seen = set()
+        for match in self.title_index.resolve(titles):
+            if match is None or match.movieId in seen or match.movieId not in self.by_id:
+                continue
+            seen.add(match.movieId)
+            resolved.append((self.by_id[match.movieId], match))
+        return resolved
+
+    def find_titles(self, titles: List[str]) -> List[MovieRecord]:
+        return [record for record, _ in self.resolve_titles(titles)]
+
+    def search(self, query: str) -> List[MovieRecord]:
+        # 부분 문자열 검색 (ILIKE '%q%'와 동일), 전체 카탈로그를 훑는다
+        needle = query.lower()
+        return [record for record in self.by_id.values() if needle in record._search_key]
+
+    def search_page(self, query: str, limit: int = 50, offset: int = 0) -> Tuple[List[MovieRecord], int]:
+        """
+        Ranked prefix search through the inverted index. Falls back to the substring
+        scan only when no word prefix matches (e.g. a fragment from the middle of a word).
+        """
+        movie_ids, total = self.search_index.search(query, limit, offset)
+        if total:
+            return [self.by_id[movieId] for movieId in movie_ids], total
+        records = self.search(query)
+        return records[offset:offset + limit], len(records)
+
+    def genre_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (movieIds ascending, genre bitmasks) as int64 arrays, rebuilt only when the catalog changes.
+        """
+        version, movie_ids, masks = self._genre_arrays
+        if version != self.version:
+            movie_ids = np.fromiter(self.by_id.keys(), dtype=np.int64, count=len(self.by_id))
+            masks = np.fromiter((record.genre_mask for record in self.by_id.values()),
+                                dtype=np.int64, count=len(self.by_id))
+            self._genre_arrays = (self.version, movie_ids, masks)
+        return movie_ids, masks
+
+    def movie_list(self) -> List[dict]:
+        if self._movie_list is None:
+            self._movie_list = [record.as_dict() for record in self.by_id.values()]
+        return self._movie_list
+
+
+movie_catalog = MovieCatalog()
@@ -0,0 +1,296 @@
+'''
+영화 제목/장르 기반 콘텐츠 벡터와 IVF 근사 최근접 이웃(ANN) 색인
+
+python content_index.py            # 현재 DB 카탈로그로 벡터/색인을 미리 만들어 둔다 (오프라인 빌드)
+
+- 특징: 장르 토큰, 제목 단어, 개봉 연대 -> TF-IDF 가중치를 feature hashing으로 CONTENT_DIM 차원에 넣고 L2 정규화
+- 벡터는 float32 .npy 파일로 저장하고 np.load(mmap_mode='r')로 메모리 매핑해서 쓴다
+- IVF: spherical k-means로 sqrt(N)개 리스트를 만들고, 질의 벡터와 가까운 CONTENT_NPROBE개 리스트만 훑는다
+  (CONTENT_EXACT_MAX편 이하의 작은 카탈로그는 전체 행렬 곱이 더 빠르므로 전체 탐색)
+'''
+import asyncio
+import logging
+import math
+import os
+import re
+import time
+import zlib
+from typing import Collection, Dict, List, Optional, Tuple
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+from catalog import movie_catalog
+from movie_stats import get_mean_ratings
+from search_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CONTENT_VECTORS_PATH = os.getenv("CONTENT_VECTORS_PATH", os.path.join(BASE_DIR, "content_vectors.npy"))
+CONTENT_INDEX_PATH = os.getenv("CONTENT_INDEX_PATH", os.path.join(BASE_DIR, "content_index.npz"))
+CONTENT_DIM = int(os.getenv("CONTENT_DIM", "256"))       # hashing 차원
+CONTENT_LISTS = int(os.getenv("CONTENT_LISTS", "0"))     # IVF 리스트 수, 0이면 sqrt(영화 수)
+CONTENT_NPROBE = int(os.getenv("CONTENT_NPROBE", "8"))   # 질의마다 훑을 리스트 수
+CONTENT_EXACT_MAX = int(os.getenv("CONTENT_EXACT_MAX", "10000"))  # 이 수 이하면 IVF 대신 전체 탐색 (더 빠르고 정확)
+KMEANS_ITERATIONS = 10
+
+CONTENT_RECOMMENDER_ID = 4
+CONTENT_RECOMMENDER_NAME = 'Content-IVF-v1'
+
+_YEAR = re.compile(r"\((\d{4})\)\s*$")
+_STOP_WORDS = {"the", "a", "an", "of", "and", "in", "on", "to", "la", "le", "les", "el", "il", "de"}
+
+
+def movie_features(title: str, genre: str) -> List[str]:
+    features = [f"g:{g.lower()}" for g in genre.split("|") if g]
+    match = _YEAR.search(title)
+    if match:
+        features.append(f"d:{int(match.group(1)) // 10 * 10}")
+        title = title[:match.start()]
+    features.extend(f"w:{word}" for word in tokenize(title) if len(word) > 1 and word not in _STOP_WORDS)
+    return list(dict.fromkeys(features))
+
+
+def _bucket(feature: str, dim: int) -> Tuple[int, float]:
+    # Python hash()는 프로세스마다 달라지므로 crc32로 고정, 상위 비트로 부호를 정해 충돌 편향을 줄인다
+    h = zlib.crc32(feature.encode("utf-8"))
+    return h % dim, 1.0 if h & 0x80000000 else -1.0
+
+
+def build_vectors(records, dim: int = CONTENT_DIM) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    records: objects with movieId/title/genre. Returns (movie_ids, L2-normalized float32 matrix).
+    """
+    docs = [movie_features(record.title, record.genre) for record in records]
+    df: Dict[str, int] = {}
+    for features in docs:
+        for feature in features:
+            df[feature] = df.get(feature, 0) + 1
+    n = len(docs)
+    idf = {feature: math.log((1 + n) / (1 + count)) + 1.0 for feature, count in df.items()}
+    buckets = {feature: _bucket(feature, dim) for feature in df}
+
+    matrix = np.zeros((n, dim), dtype=np.float32)
+    for row, features in enumerate(docs):
+        for feature in features:
+            column, sign = buckets[feature]
+            matrix[row, column] += sign * idf[feature]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    movie_ids = np.fromiter((record.movieId for record in records), dtype=np.int64, count=n)
+    return movie_ids, matrix
+
+
+def spherical_kmeans(vectors: np.ndarray, n_lists: int, iterations: int = KMEANS_ITERATIONS,
+                     seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    n_lists = max(1, min(n_lists, n))
+    centroids = np.array(vectors[rng.choice(n, n_lists, replace=False)], dtype=np.float32)
+    assign = np.zeros(n, dtype=np.int32)
+    for _ in range(iterations):
+        assign = np.argmax(vectors @ centroids.T, axis=1).astype(np.int32)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        empty = norms[:, 0] == 0
+        # 빈 리스트는 임의의 벡터로 다시 시작
+        sums[empty] = vectors[rng.choice(n, int(empty.sum()))]
+        norms[empty] = 1.0
+        centroids = sums / norms
+    return centroids.astype(np.float32), assign
+
+
+def catalog_signature(records) -> int:
+    # 카탈로그 내용(movieId, 제목, 장르)이 바뀌면 저장된 벡터를 다시 만든다
+    checksum = 0
+    for record in records:
+        checksum = zlib.crc32(f"{record.movieId}\x00{record.title}\x00{record.genre}\n".encode("utf-8"), checksum)
+    return checksum
+
+
+class ContentIndex:
+    """
+    Hashed TF-IDF content vectors (memory-mapped .npy) with an IVF index over them.
+    search() probes the `nprobe` closest lists; brute_force() scans every movie.
+    """
+    def __init__(self, vectors_path: str = CONTENT_VECTORS_PATH, index_path: str = CONTENT_INDEX_PATH,
+                 dim: int = CONTENT_DIM, n_lists: int = CONTENT_LISTS, nprobe: int = CONTENT_NPROBE):
+        self.vectors_path = vectors_path
+        self.index_path = index_path
+        self.dim = dim
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.movie_ids: Optional[np.ndarray] = None  # 행 번호 -> movieId (정렬됨)
+        self.vectors: Optional[np.ndarray] = None    # (영화 수, dim) float32 memmap
+        self.centroids: Optional[np.ndarray] = None
+        self.list_items: Optional[np.ndarray] = None   # 리스트 순서로 정렬한 행 번호
+        self.list_offsets: Optional[np.ndarray] = None  # 리스트 l = list_items[offsets[l]:offsets[l + 1]]
+        self.signature: Optional[int] = None
+        self.catalog_version: Optional[int] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.vectors is not None
+
+    def build(self, records):
+        start = time.perf_counter()
+        records = sorted(records, key=lambda record: record.movieId)
+        movie_ids, matrix = build_vectors(records, self.dim)
+        n_lists = self.n_lists or max(1, int(math.sqrt(len(records))))
+        centroids, assign = spherical_kmeans(matrix, n_lists) if len(records) else (
+            np.zeros((0, self.dim), dtype=np.float32), np.zeros(0, dtype=np.int32))
+        list_items = np.argsort(assign, kind="stable").astype(np.int32)
+        list_offsets = np.searchsorted(assign[list_items], np.arange(len(centroids) + 1)).astype(np.int64)
+        signature = catalog_signature(records)
+
+        # 임시 파일에 쓰고 교체해서, 읽고 있던 memmap이 반쯤 쓴 파일을 보지 않게 한다
+        tmp_path = f"{self.vectors_path}.tmp.npy"
+        out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=matrix.shape)
+        out[:] = matrix
+        out.flush()
+        del out
+        os.replace(tmp_path, self.vectors_path)
+        np.savez(self.index_path, movie_ids=movie_ids, centroids=centroids, list_items=list_items,
+                 list_offsets=list_offsets, signature=np.array([signature], dtype=np.int64))
+        self.load(signature)
+        logger.info(f"content index built: {len(movie_ids)} movies, {len(centroids)} lists "
+                    f"in {time.perf_counter() - start:.2f}s")
+
+    def load(self, signature: int) -> bool:
+        if not (os.path.exists(self.vectors_path) and os.path.exists(self.index_path)):
+            return False
+        try:
+            with np.load(self.index_path) as index:
+                if int(index["signature"][0]) != signature:
+                    return False
+                vectors = np.load(self.vectors_path, mmap_mode="r")
+                if vectors.shape != (len(index["movie_ids"]), self.dim):
+                    return False
+                self.movie_ids = index["movie_ids"]
+                self.centroids = index["centroids"]
+                self.list_items = index["list_items"]
+                self.list_offsets = index["list_offsets"]
+            self.vectors = vectors
+            self.signature = signature
+            return True
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning(f"content index load failed: {e}")
+            return False
+
+    async def ensure_ready(self, db: AsyncSession):
+        await movie_catalog.ensure_loaded(db)
+        if self.ready and self.catalog_version == movie_catalog.version:
+            return
+        async with self._lock:
+            version = movie_catalog.version
+            if self.ready and self.catalog_version == version:
+                return
+            records = list(movie_catalog.by_id.values())
+            signature = catalog_signature(records)
+            if not self.load(signature):
+                await asyncio.to_thread(self.build, records)
+            self.catalog_version = version
+
+    def _rows(self, movie_ids: List[int]) -> np.ndarray:
+        ids = np.asarray(movie_ids, dtype=np.int64)
+        idx = np.clip(np.searchsorted(self.movie_ids, ids), 0, max(len(self.movie_ids) - 1, 0))
+        return idx[self.movie_ids[idx] == ids] if len(self.movie_ids) else idx[:0]
+
+    def query_vector(self, history: List[Tuple[int, float]]) -> Optional[np.ndarray]:
+        # 높게 평가한 영화일수록 가중치를 크게 둔 평균 벡터
+        rows, weights = [], []
+        for movieId, rating in history:
+            row = self._rows([movieId])
+            if len(row):
+                rows.append(row[0])
+                weights.append(max(rating - 2.5, 0.5))
+        if not rows:
+            return None
+        query = np.asarray(weights, dtype=np.float32) @ self.vectors[np.asarray(rows)]
+        norm = np.linalg.norm(query)
+        return query / norm if norm else None
+
+    @staticmethod
+    def _top_k(rows: np.ndarray, scores: np.ndarray, k: int, exclude: np.ndarray) -> List[int]:
+        if len(exclude):
+            keep = ~np.isin(rows, exclude)
+            rows, scores = rows[keep], scores[keep]
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        return rows[top[np.argsort(-scores[top], kind="stable")]].tolist()
+
+    def search(self, query: np.ndarray, k: int = 10, nprobe: Optional[int] = None,
+               exclude: Optional[np.ndarray] = None) -> List[int]:
+        """
+        Approximate top-k row numbers by cosine similarity, probing the closest IVF lists.
+        """
+        exclude = np.empty(0, dtype=np.int64) if exclude is None else exclude
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        centroid_scores = self.centroids @ query
+        probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe] if nprobe < len(centroid_scores) \
+            else np.arange(len(centroid_scores))
+        rows = np.concatenate([self.list_items[self.list_offsets[l]:self.list_offsets[l + 1]] for l in probe])
+        return self._top_k(rows, self.vectors[rows] @ query, k, exclude)
+
+    def brute_force(self, query: np.ndarray, k: int = 10, exclude: Optional[np.ndarray] = None) -> List[int]:
+        exclude = np.empty(0, dtype=np.int64) if exclude is None else exclude
+        return self._top_k(np.arange(len(self.movie_ids)), np.asarray(self.vectors @ query), k, exclude)
+
+    def similar_movies(self, history: List[Tuple[int, float]], k: int = 10,
+                       exclude: Optional[Collection[int]] = None) -> List[int]:
+        # history: (movieId, rating), exclude: 결과에서 뺄 movieId (없으면 history의 영화)
+        query = self.query_vector(history)
+        if query is None:
+            return []
+        exclude = self._rows(sorted(exclude) if exclude is not None else [movieId for movieId, _ in history])
+        if len(self.movie_ids) <= CONTENT_EXACT_MAX:
+            rows = self.brute_force(query, k, exclude)
+        else:
+            rows = self.search(query, k, exclude=exclude)
+        return self.movie_ids[rows].tolist()
+
+    async def recommend_from_history(self, rating_history: List[dict], db: AsyncSession, k: int = 10,
+                                     exclude: Optional[Collection[int]] = None) -> List[dict]:
+        """
+        rating_history: rows returned by get_rating_history or UserProfile.rating_history (movieId, rating, ...).
+        exclude: movieIds never to recommend, normally every movie the user rated (defaults to the history).
+        """
+        await self.ensure_ready(db)
+        movie_ids = self.similar_movies([(row["movieId"], row["rating"]) for row in rating_history], k, exclude)
+        mean_ratings = await get_mean_ratings(db, movie_ids)
+        timestamp_unix = time.time()
+        recommendations = []
+        for movieId in movie_ids:
+            movie = movie_catalog.get(movieId)
+            if movie is None:
+                continue
+            recommendations.append({
+                "movieId": movieId,
+                "rating": mean_ratings.get(movieId),
+                "title": movie.title,
+                "genre": movie.genre,
+                "timestamp": timestamp_unix
+            })
+        return recommendations
+
+
+content_index = ContentIndex()
+
+
+async def build_from_db():
+    from database import async_session_maker
+    async with async_session_maker() as db:
+        await movie_catalog.load(db)
+    start = time.perf_counter()
+    content_index.build(list(movie_catalog.by_id.values()))
+    print(f"content vectors: {CONTENT_VECTORS_PATH}, index: {CONTENT_INDEX_PATH}, "
+          f"{len(content_index.movie_ids)} movies in {time.perf_counter() - start:.2f}s")
+
+
+# 스크립트 실행
+if __name__ == "__main__":
+    asyncio.run(build_from_db())
@@ -1,7 +1,9 @@
 import asyncio
+from dataclasses import dataclass, field, replace
+from typing import Dict
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import MetaData, create_engine
+from sqlalchemy import MetaData, create_engine, event
 from sqlalchemy.orm import sessionmaker
 import logging
 import os
@@ -19,7 +21,7 @@ DATABASE_URL = "sqlite+aiosqlite:///./ott.db"  # 현재 디렉토리에 생성
 import os
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 print(f"backend base_dir: {BASE_DIR}")
-DATABASE_URL = f"sqlite+aiosqlite:///{os.path.join(BASE_DIR, 'ott.db')}"
+DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite+aiosqlite:///{os.path.join(BASE_DIR, 'ott.db')}")
 
 # MetaData 객체 생성  
 metadata = MetaData()
@@ -34,14 +36,142 @@ engine = create_engine(DATABASE_URL, echo=True)
 Session = sessionmaker(bind=engine, expire_on_commit=False)
 '''
 
+@dataclass
+class DatabaseSettings:
+    """
+    Engine options and per-connection SQLite pragmas for one deployment profile.
+    """
+    profile: str
+    echo: bool
+    pragmas: Dict[str, object] = field(default_factory=dict)
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 30.0
+
+
+# dev: 수정 전과 같은 동작 (SQL echo, SQLite 기본 설정)
+# prod: echo 끔, WAL 모드로 쓰기 중에도 읽기가 막히지 않게, 커넥션마다 캐시/mmap/busy_timeout 설정
+DB_PROFILES = {
+    "dev": DatabaseSettings(profile="dev", echo=True),
+    "prod": DatabaseSettings(
+        profile="prod",
+        echo=False,
+        pragmas={
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "cache_size": -65536,       # 64MB (음수는 KB 단위)
+            "mmap_size": 268435456,     # 256MB
+            "busy_timeout": 5000,       # ms, 쓰기 락 대기
+            "temp_store": "MEMORY",
+        },
+        pool_size=10,
+        max_overflow=20,
+    ),
+}
+
+
+def get_database_settings(profile: str = None) -> DatabaseSettings:
+    # DB_PROFILE 환경 변수로 선택, DB_ECHO로 echo만 따로 바꿀 수 있다
+    profile = profile or os.getenv("DB_PROFILE", "dev")
+    if profile not in DB_PROFILES:
+        raise ValueError(f"Unknown DB_PROFILE: {profile} (choose from {', '.join(DB_PROFILES)})")
+    settings = DB_PROFILES[profile]
+    if os.getenv("DB_ECHO") is not None:
+        settings = replace(settings, echo=os.getenv("DB_ECHO") == "1")
+    return settings
+
+
+def create_database_engine(url: str, settings: DatabaseSettings):
+    engine = create_async_engine(url,
+                                 echo=settings.echo,
+                                 pool_size=settings.pool_size,
+                                 max_overflow=settings.max_overflow,
+                                 pool_timeout=settings.pool_timeout)
+
+    if settings.pragmas:
+        @event.listens_for(engine.sync_engine, "connect")
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in settings.pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+            cursor.close()
+
+    return engine
+
+
+database_settings = get_database_settings()
+
 # 비동기 엔진 생성
-engine = create_async_engine(DATABASE_URL, echo=True)  # aiosqlite 사용
+engine = create_database_engine(DATABASE_URL, database_settings)  # aiosqlite 사용
 
 # 비동기 세션 생성
 async_session_maker = sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
 # Session = sessionmaker(bind=crm_engine, autocommit=False, autoflush=False, expire_on_commit=False)
 
 
+# 예전 recommendations 테이블은 (userId, movieId)가 키라서 같은 영화를 다시 추천하면 충돌했다.
+# runId 컬럼이 없으면 옮겨 두었다가 새 테이블을 만든 뒤, (userId, timestamp) 묶음을 run 하나로 옮긴다.
+_LEGACY_RECOMMENDATIONS = "recommendations_legacy"
+
+
+def _rename_legacy_recommendations(conn) -> bool:
+    columns = [row[1] for row in conn.exec_driver_sql("PRAGMA table_info(recommendations)")]
+    if not columns or "runId" in columns:
+        return False
+    conn.exec_driver_sql(f'ALTER TABLE recommendations RENAME TO "{_LEGACY_RECOMMENDATIONS}"')
+    return True
+
+
+def _copy_legacy_recommendations(conn):
+    run_id = "printf('legacy-%d-%s', userId, timestamp)"
+    # timestamp는 time.time() 문자열이거나 아주 예전 코드가 쓴 datetime 문자열이다
+    created_at = ("CASE WHEN timestamp GLOB '[0-9][0-9][0-9][0-9]-*' "
+                  "THEN CAST(strftime('%s', timestamp) AS REAL) ELSE CAST(timestamp AS REAL) END")
+    conn.exec_driver_sql(
+        f'INSERT INTO recommendation_runs ("runId", "userId", "recommenderId", "recommenderName", "createdAt", "itemCount") '
+        f'SELECT {run_id}, userId, max(recommenderId), max(recommenderName), {created_at}, count(*) '
+        f'FROM "{_LEGACY_RECOMMENDATIONS}" GROUP BY userId, timestamp')
+    conn.exec_driver_sql(
+        f'INSERT INTO recommendations ("runId", "movieId", "userId", rank, "meanRating", timestamp, '
+        f'"recommenderId", "recommenderName", feedback) '
+        f'SELECT {run_id}, movieId, userId, row_number() OVER (PARTITION BY userId, timestamp ORDER BY rowid) - 1, '
+        f'meanRating, timestamp, recommenderId, recommenderName, feedback FROM "{_LEGACY_RECOMMENDATIONS}"')
+    conn.exec_driver_sql(f'DROP TABLE "{_LEGACY_RECOMMENDATIONS}"')
+
+
+# genreMask 컬럼이 없던 movies 테이블에 컬럼을 더하고 기존 영화의 장르 문자열을 한 번 변환해 채운다
+def _add_movie_genre_mask(conn):
+    from genre_bits import genre_mask
+    columns = [row[1] for row in conn.exec_driver_sql("PRAGMA table_info(movies)")]
+    if not columns or "genreMask" in columns:
+        return
+    conn.exec_driver_sql('ALTER TABLE movies ADD COLUMN "genreMask" INTEGER')
+    rows = conn.exec_driver_sql('SELECT "movieId", genre FROM movies').all()
+    conn.exec_driver_sql('UPDATE movies SET "genreMask" = ? WHERE "movieId" = ?',
+                         [(genre_mask(genre), movieId) for movieId, genre in rows])
+
+
+# 없는 테이블과 인덱스만 만든다. 기존 ott.db에도 models.py에 추가된 인덱스가 생기도록
+# create_all과 별개로 인덱스를 checkfirst로 만든다.
+def _create_schema(conn):
+    from models import Base, OBSOLETE_INDEXES
+    migrate_recommendations = _rename_legacy_recommendations(conn)
+    Base.metadata.create_all(conn)
+    _add_movie_genre_mask(conn)
+    if migrate_recommendations:
+        _copy_legacy_recommendations(conn)
+    for name in OBSOLETE_INDEXES:
+        conn.exec_driver_sql(f'DROP INDEX IF EXISTS "{name}"')
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+async def init_db():
+    async with engine.begin() as conn:
+        await conn.run_sync(_create_schema)
+
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -0,0 +1,30 @@
+# 장르 비트마스크: MovieLens 장르 문자열("Animation|Children's|Comedy")을 정수 하나로 바꿔
+# 문자열 LIKE 대신 (mask & bits) 비교로 장르를 거른다. movies.genreMask 컬럼에 저장되므로
+# GENRES의 순서(= 비트 번호)는 바꾸지 말고 새 장르는 끝에만 추가한다.
+from typing import Iterable
+
+GENRES = ("Action", "Adventure", "Animation", "Children's", "Comedy", "Crime",
+          "Documentary", "Drama", "Fantasy", "Film-Noir", "Horror", "Musical",
+          "Mystery", "Romance", "Sci-Fi", "Thriller", "War", "Western",
+          # MovieLens 20M/latest에만 있는 장르
+          "IMAX", "(no genres listed)")
+GENRE_BITS = {genre: 1 << bit for bit, genre in enumerate(GENRES)}
+
+
+def genre_mask(genre: str) -> int:
+    """
+    Bitmask of a pipe-delimited genre string. Genres outside GENRES are not encoded.
+    """
+    mask = 0
+    for name in genre.split("|") if genre else ():
+        mask |= GENRE_BITS.get(name, 0)
+    return mask
+
+
+def genres_mask(names: Iterable[str]) -> int:
+    # 이미 나뉜 장르 이름 목록, 모르는 장르가 있으면 KeyError
+    mask = 0
+    for name in names:
+        mask |= GENRE_BITS[name]
+    return mask
+
@@ -1,20 +1,166 @@
-from database import database
-from models import movies
-
-async def init_test_data():
-    await database.connect()
-    
-    # 테스트 데이터 추가
-    query = movies.insert().values([
-        {"title": "Toy Story", "genre": "Animation"},
-        {"title": "Matrix", "genre": "Action"},
-        {"title": "Inception", "genre": "Sci-Fi"}
-    ])
-    
-    await database.execute(query)
-    await database.disconnect()
+'''
+MovieLens-1M (.dat) 파일을 ott.db에 적재하는 스크립트
+
+python init_data.py --data-dir ../ml-1m
+python init_data.py --data-dir ../ml-1m --db ./ott.db --chunk-size 100000 --truncate
+
+users.dat / movies.dat / ratings.dat를 한 줄씩 읽어 chunk 단위로 executemany 한다.
+테이블마다 하나의 큰 트랜잭션으로 넣고, 보조 인덱스는 적재가 끝난 뒤에 만든다.
+'''
+import argparse
+import os
+import sqlite3
+import time
+from itertools import islice
+from typing import Callable, Iterator, Tuple
+from sqlalchemy import create_engine
+from sqlalchemy.schema import CreateIndex
+from database import DATABASE_URL
+from models import (Base, Users, Movies, Ratings, MovieStats, UserProfiles, RecommendationRuns,
+                    Recommendations, RecommendJobs, RecommendCache)
+from genre_bits import genre_mask
+
+DAT_ENCODING = "latin-1"  # movies.dat에 ISO-8859-1 제목이 있다
+DAT_SEPARATOR = "::"
+
+
+def sqlite_path_from_url(url: str) -> str:
+    return url.split(":///", 1)[1]
+
+
+def parse_user(fields):
+    return int(fields[0]), fields[1], int(fields[2]), fields[3], fields[4]
+
+
+def parse_movie(fields):
+    return int(fields[0]), fields[1], fields[2], genre_mask(fields[2])
+
+
+def parse_rating(fields):
+    return int(fields[0]), int(fields[1]), float(fields[2]), int(fields[3])
+
+
+# (파일 이름, 테이블, INSERT 문, 파서)
+DAT_FILES = [
+    ("users.dat", Users.__table__,
+     'INSERT OR REPLACE INTO users ("userId", gender, age, occupation, "zipCode") VALUES (?, ?, ?, ?, ?)',
+     parse_user),
+    ("movies.dat", Movies.__table__,
+     'INSERT OR REPLACE INTO movies ("movieId", title, genre, "genreMask") VALUES (?, ?, ?, ?)',
+     parse_movie),
+    ("ratings.dat", Ratings.__table__,
+     'INSERT OR REPLACE INTO ratings ("userId", "movieId", rating, timestamp) VALUES (?, ?, ?, ?)',
+     parse_rating),
+]
+
+# --truncate 때 원본 테이블보다 먼저 비우는 테이블 (movie_stats는 적재 후 항상 다시 만든다)
+DERIVED_TABLES = (Recommendations, RecommendationRuns, RecommendJobs, RecommendCache, UserProfiles)
+
+DEFAULT_RECOMMENDERS = [
+    (2, 'LLM-Gemini-Prompt-v1', 1, '2025-01-01', 'Gemini prompt based recommender'),
+    (3, 'ItemCF-Cosine-v1', 1, '2025-01-01', 'Item-item cosine collaborative filtering'),
+    (4, 'Content-IVF-v1', 1, '2025-01-01', 'Title/genre TF-IDF vectors with an IVF nearest-neighbour index'),
+    (5, 'Fallback-GenrePopular-v1', 1, '2025-01-01', 'Genre affinity + popularity ranking, served when the LLM misses its budget'),
+]
+
+
+def read_dat(path: str, parser: Callable) -> Iterator[Tuple]:
+    with open(path, encoding=DAT_ENCODING) as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if line:
+                yield parser(line.split(DAT_SEPARATOR))
+
+
+def set_load_pragmas(conn: sqlite3.Connection):
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-262144")  # 256MB
+    conn.execute("PRAGMA foreign_keys=OFF")
+
+
+def load_file(conn: sqlite3.Connection, path: str, sql: str, parser: Callable, chunk_size: int) -> int:
+    rows = read_dat(path, parser)
+    total = 0
+    conn.execute("BEGIN")
+    try:
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            conn.executemany(sql, chunk)
+            total += len(chunk)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return total
+
+
+def load_movielens(data_dir: str, db_path: str, chunk_size: int = 100_000, truncate: bool = False):
+    # 스키마 생성 후 보조 인덱스는 지워두고 적재가 끝나면 다시 만든다
+    sync_engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(sync_engine)
+    tables = [table for _, table, _, _ in DAT_FILES]
+    indexes = [index for table in tables for index in table.indexes]
+    index_sql = [str(CreateIndex(index).compile(sync_engine)) for index in indexes]
+    sync_engine.dispose()
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    set_load_pragmas(conn)
+    for index in indexes:
+        conn.execute(f'DROP INDEX IF EXISTS "{index.name}"')
+    if truncate:
+        # 유저/영화 id를 가리키는 추천 결과, 작업, 프롬프트 캐시, 프로필도 같이 지운다 (남으면 없는 id를 응답한다)
+        conn.execute("BEGIN")
+        for model in DERIVED_TABLES:
+            conn.execute(f'DELETE FROM "{model.__tablename__}"')
+        for table in reversed(tables):
+            conn.execute(f'DELETE FROM "{table.name}"')
+        conn.execute("COMMIT")
+
+    report = {}
+    for file_name, table, sql, parser in DAT_FILES:
+        path = os.path.join(data_dir, file_name)
+        if not os.path.exists(path):
+            print(f"skip {file_name}: not found in {data_dir}")
+            continue
+        start = time.perf_counter()
+        rows = load_file(conn, path, sql, parser, chunk_size)
+        elapsed = time.perf_counter() - start
+        report[table.name] = {"rows": rows, "seconds": round(elapsed, 2),
+                              "rows_per_sec": int(rows / elapsed) if elapsed else rows}
+        print(f"{file_name}: {rows} rows in {elapsed:.2f}s ({report[table.name]['rows_per_sec']} rows/sec)")
+
+    start = time.perf_counter()
+    conn.execute("BEGIN")
+    for sql in index_sql:
+        conn.execute(sql)
+    # 평균 평점 집계와 기본 추천기 정보도 같이 채운다
+    conn.execute(f'DELETE FROM "{MovieStats.__tablename__}"')
+    # 유저 프로필은 ratings에서 만든 캐시라 다시 적재하면 낡는다, 다음 조회 때 새로 만든다
+    conn.execute(f'DELETE FROM "{UserProfiles.__tablename__}"')
+    conn.execute(f'INSERT INTO "{MovieStats.__tablename__}" ("movieId", "ratingCount", "ratingSum") '
+                 'SELECT "movieId", COUNT(*), SUM(rating) FROM ratings GROUP BY "movieId"')
+    conn.executemany("INSERT OR IGNORE INTO recommenders (id, model_name, is_active, start_date, description) "
+                     "VALUES (?, ?, ?, ?, ?)", DEFAULT_RECOMMENDERS)
+    conn.execute("COMMIT")
+    conn.execute("ANALYZE")
+    print(f"indexes, movie_stats built and user_profiles cleared in {time.perf_counter() - start:.2f}s")
+
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.close()
+    return report
+
 
 # 스크립트 실행
 if __name__ == "__main__":
-    import asyncio
-    asyncio.run(init_test_data()) 
\ No newline at end of file
+    arg_parser = argparse.ArgumentParser(description="Load MovieLens-1M .dat files into ott.db")
+    arg_parser.add_argument("--data-dir", required=True, help="users.dat / movies.dat / ratings.dat 폴더")
+    arg_parser.add_argument("--db", default=sqlite_path_from_url(DATABASE_URL), help="SQLite 파일 경로")
+    arg_parser.add_argument("--chunk-size", type=int, default=100_000)
+    arg_parser.add_argument("--truncate", action="store_true", help="적재 전에 기존 행 삭제 (추천 결과/작업/캐시/유저 프로필 포함)")
+    args = arg_parser.parse_args()
+
+    load_movielens(args.data_dir, args.db, args.chunk_size, args.truncate)
@@ -0,0 +1,203 @@
+# NumPy/SciPy sparse 기반 item-item 협업 필터링 추천기
+# LLM이 느릴 때 쓸 수 있는 빠른 추천기이자 비교용 baseline
+import asyncio
+import logging
+import os
+import time
+from typing import List, Optional
+import numpy as np
+import scipy.sparse as sp
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Ratings
+from catalog import movie_catalog
+from movie_stats import get_mean_ratings
+from ratings_reader import read_columns
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ITEM_CF_CACHE_PATH = os.getenv("ITEM_CF_CACHE_PATH", os.path.join(BASE_DIR, "item_cf.npz"))
+ITEM_CF_NEIGHBORS = int(os.getenv("ITEM_CF_NEIGHBORS", "50"))  # 영화별로 남길 유사 영화 수
+ITEM_CF_BLOCK = 512  # 유사도 계산 시 한 번에 처리할 영화 수
+# ratings가 바뀌었는지 (행 수, 최대 timestamp) 확인하고 바뀌었으면 다시 만드는 주기 (초), 0이면 재시작 전까지 그대로
+ITEM_CF_REFRESH_INTERVAL = float(os.getenv("ITEM_CF_REFRESH_INTERVAL", "3600"))
+
+ITEM_CF_RECOMMENDER_ID = 3
+ITEM_CF_RECOMMENDER_NAME = 'ItemCF-Cosine-v1'
+
+
+class ItemItemRecommender:
+    """
+    Cosine item-item similarity pruned to the top ITEM_CF_NEIGHBORS per movie.
+    Scoring a user is one sparse mat-vec: sim_T @ (user ratings - user mean).
+    """
+    def __init__(self, cache_path: str = ITEM_CF_CACHE_PATH, neighbors: int = ITEM_CF_NEIGHBORS):
+        self.cache_path = cache_path
+        self.neighbors = neighbors
+        self.movie_ids: Optional[np.ndarray] = None  # 행렬 인덱스 -> movieId (정렬됨)
+        self.sim_T: Optional[sp.csr_matrix] = None
+        self.signature: Optional[np.ndarray] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.sim_T is not None
+
+    async def ratings_signature(self, db: AsyncSession) -> np.ndarray:
+        # ratings 테이블이 바뀌었는지 확인하는 용도 (행 수, 최대 timestamp)
+        row = (await db.execute(select(func.count(), func.max(Ratings.timestamp)).select_from(Ratings))).one()
+        return np.array([row[0] or 0, row[1] or 0], dtype=np.int64)
+
+    async def ensure_ready(self, db: AsyncSession):
+        if self.ready:
+            return
+        async with self._lock:
+            if self.ready:
+                return
+            signature = await self.ratings_signature(db)
+            if not self.load_cache(signature):
+                await self.build(db, signature)
+
+    async def refresh(self, db: AsyncSession) -> bool:
+        """
+        Rebuild if ratings changed since the model was built. Requests keep using the old model
+        until the new one is swapped in. Returns True if a rebuild ran.
+        """
+        if not self.ready:
+            return False  # 아직 만든 적 없으면 첫 요청(ensure_ready)에서 만든다
+        async with self._lock:
+            signature = await self.ratings_signature(db)
+            if np.array_equal(signature, self.signature):
+                return False
+            await self.build(db, signature)
+            return True
+
+    async def refresh_loop(self, session_maker, interval: float = ITEM_CF_REFRESH_INTERVAL):
+        # /api/ratings로 들어온 평점을 주기적으로 모델에 반영한다, 실패해도 다음 주기에 다시 시도
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with session_maker() as db:
+                    await self.refresh(db)
+            except Exception as e:
+                logger.error(f"item-cf refresh error: {str(e)}")
+
+    async def build(self, db: AsyncSession, signature: Optional[np.ndarray] = None):
+        start = time.perf_counter()
+        if signature is None:
+            signature = await self.ratings_signature(db)
+        # ratings 읽기/배열 변환과 유사도 계산은 모두 이벤트 루프 밖(스레드)에서 실행
+        users, movies, ratings = await read_columns((Ratings.userId, Ratings.movieId, Ratings.rating),
+                                                    (np.int64, np.int64, np.float32))
+        movie_ids, sim_T = await asyncio.to_thread(self._compute, users, movies, ratings)
+        self.movie_ids, self.sim_T, self.signature = movie_ids, sim_T, signature
+        self.save_cache()
+        logger.info(f"item-cf built: {len(movie_ids)} movies, {sim_T.nnz} similarities "
+                    f"in {time.perf_counter() - start:.2f}s")
+
+    def _compute(self, users: np.ndarray, movies: np.ndarray, ratings: np.ndarray):
+        movie_ids, item_idx = np.unique(movies, return_inverse=True)
+        _, user_idx = np.unique(users, return_inverse=True)
+        n_items = len(movie_ids)
+        X = sp.csc_matrix((ratings, (user_idx, item_idx)), shape=(user_idx.max() + 1 if len(users) else 0, n_items))
+
+        norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=0)).ravel())
+        norms[norms == 0] = 1.0
+        Xn = (X @ sp.diags(1.0 / norms)).tocsc().astype(np.float32)
+        XnT = Xn.T.tocsr()
+
+        k = min(self.neighbors, max(n_items - 1, 0))
+        rows, cols, vals = [], [], []
+        for start in range(0, n_items, ITEM_CF_BLOCK):
+            stop = min(start + ITEM_CF_BLOCK, n_items)
+            # (n_items x block) 유사도, 자기 자신은 제외
+            block = (XnT @ Xn[:, start:stop]).toarray()
+            block[np.arange(start, stop), np.arange(stop - start)] = 0.0
+            if k == 0:
+                continue
+            top = np.argpartition(-block, k - 1, axis=0)[:k]
+            top_vals = np.take_along_axis(block, top, axis=0)
+            keep = top_vals > 0
+            cols.append(np.broadcast_to(np.arange(start, stop), top.shape)[keep])
+            rows.append(top[keep])
+            vals.append(top_vals[keep])
+
+        if rows:
+            rows, cols, vals = np.concatenate(rows), np.concatenate(cols), np.concatenate(vals)
+        # sim[i, j]: j의 이웃 i에 대한 유사도 -> score = sim_T[j] @ r 이 되도록 전치 저장
+        sim = sp.csr_matrix((vals, (rows, cols)), shape=(n_items, n_items), dtype=np.float32)
+        return movie_ids, sim.T.tocsr()
+
+    def save_cache(self):
+        try:
+            np.savez(self.cache_path, movie_ids=self.movie_ids, data=self.sim_T.data,
+                     indices=self.sim_T.indices, indptr=self.sim_T.indptr, signature=self.signature)
+        except OSError as e:
+            logger.warning(f"item-cf cache save failed: {e}")
+
+    def load_cache(self, signature: np.ndarray) -> bool:
+        if not os.path.exists(self.cache_path):
+            return False
+        try:
+            with np.load(self.cache_path) as cache:
+                if not np.array_equal(cache["signature"], signature):
+                    return False
+                n_items = len(cache["movie_ids"])
+                self.movie_ids = cache["movie_ids"]
+                self.sim_T = sp.csr_matrix((cache["data"], cache["indices"], cache["indptr"]),
+                                           shape=(n_items, n_items))
+                self.signature = signature
+            return True
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning(f"item-cf cache load failed: {e}")
+            return False
+
+    def score(self, rated_movie_ids: np.ndarray, rated_values: np.ndarray, k: int = 10) -> List[int]:
+        if not len(rated_movie_ids):
+            return []
+        idx = np.searchsorted(self.movie_ids, rated_movie_ids)
+        idx = np.clip(idx, 0, len(self.movie_ids) - 1)
+        known = self.movie_ids[idx] == rated_movie_ids
+        user_vector = np.zeros(len(self.movie_ids), dtype=np.float32)
+        # 평균보다 낮게 준 영화와 비슷한 영화는 점수가 내려간다
+        centered = rated_values[known] - rated_values.mean()
+        user_vector[idx[known]] = centered if np.any(centered) else rated_values[known]
+
+        scores = self.sim_T @ user_vector
+        scores[idx[known]] = -np.inf
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        top = top[np.isfinite(scores[top])]
+        return self.movie_ids[top].tolist()
+
+    async def recommend(self, userId: int, db: AsyncSession, k: int = 10) -> List[dict]:
+        await self.ensure_ready(db)
+        await movie_catalog.ensure_loaded(db)
+        results = await db.execute(
+            select(Ratings.movieId, Ratings.rating).where(Ratings.userId == userId)
+        )
+        rows = results.all()
+        rated_ids = np.array([row.movieId for row in rows], dtype=np.int64)
+        rated_values = np.array([row.rating for row in rows], dtype=np.float32)
+
+        movie_ids = self.score(rated_ids, rated_values, k)
+        mean_ratings = await get_mean_ratings(db, movie_ids)
+        timestamp_unix = time.time()
+        recommendations = []
+        for movieId in movie_ids:
+            movie = movie_catalog.get(movieId)
+            if movie is None:
+                continue
+            recommendations.append({
+                "movieId": movieId,
+                "rating": mean_ratings.get(movieId),
+                "title": movie.title,
+                "genre": movie.genre,
+                "timestamp": timestamp_unix
+            })
+        return recommendations
+
+
+item_cf_recommender = ItemItemRecommender()
@@ -0,0 +1,57 @@
+# LLM 공급자 인터페이스
+# langchain_google_genai 같은 무거운 SDK는 모델을 실제로 만들 때 import한다 (main.py import 시점이 아니라).
+import os
+from abc import ABC, abstractmethod
+from typing import Dict, Type
+
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")
+
+
+class LLMProvider(ABC):
+    """
+    Builds the chat model used in the recommendation chain. Subclasses import their SDK
+    inside create_model() so that importing this module stays cheap.
+    """
+    name = "base"
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    def configure(self):
+        # 환경 변수 등 모델 생성 전에 필요한 설정
+        pass
+
+    @abstractmethod
+    def create_model(self):
+        """
+        Return a LangChain chat model (anything with ainvoke/astream).
+        """
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+
+    def configure(self):
+        # Credentials 관련 조치, 경로가 없으면 건드리지 않는다 (None을 넣으면 TypeError)
+        credentials_path = os.getenv("GEMINI_CREDENTIAL_PATH")
+        if credentials_path:
+            os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = credentials_path
+
+    def create_model(self):
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        self.configure()
+        # Gemini API Key, 없으면 SDK가 GOOGLE_API_KEY를 읽는다
+        api_key = os.getenv("GEMINI_API_KEY")
+        if api_key:
+            return ChatGoogleGenerativeAI(model=self.model_name, google_api_key=api_key)
+        return ChatGoogleGenerativeAI(model=self.model_name)
+
+
+PROVIDERS: Dict[str, Type[LLMProvider]] = {GeminiProvider.name: GeminiProvider}
+
+
+def get_provider(model_name: str, name: str = LLM_PROVIDER) -> LLMProvider:
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown LLM provider: {name} (available: {', '.join(PROVIDERS)})")
+    return PROVIDERS[name](model_name)
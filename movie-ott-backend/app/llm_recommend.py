@@ -1,16 +1,29 @@
 import os
 import time
 import asyncio
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
+import json
+import logging
+import threading
+from contextlib import asynccontextmanager
 from pydantic import BaseModel, Field
 #from database import engine, metadata, database, async_session, init_db
 from typing import List, Dict
 from database import database, async_session_maker
 from models import Users, Movies, Ratings, Recommendations
+from catalog import movie_catalog
+from movie_stats import get_mean_ratings
+from candidates import (generate_candidates, format_candidates, candidate_token_report, candidate_movie_info,
+                        popular_recommend_movies, FALLBACK_RECOMMENDER_ID, FALLBACK_RECOMMENDER_NAME)
+from item_cf import item_cf_recommender, ITEM_CF_RECOMMENDER_ID, ITEM_CF_RECOMMENDER_NAME
+from content_index import content_index, CONTENT_RECOMMENDER_ID, CONTENT_RECOMMENDER_NAME
+from recommend_cache import recommend_cache
+from user_profiles import user_profiles
+from recommendation_store import new_run_id, run_rows, upsert_runs
+from metrics import metrics, stage_timer, log_sampled, FIRST_RECOMMENDATION_LATENCY
+from llm_provider import get_provider
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, next_cursor
 from datetime import datetime
-from sqlalchemy import select, desc, func, insert
+from sqlalchemy import select, desc, func, insert, tuple_
 from sqlalchemy import Column, Integer, String, Float, DateTime, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -21,107 +34,258 @@ from dotenv import load_dotenv
 # .env 파일 로드
 load_dotenv()
 
-# Load LLM model
-# Gemini API Key  
-API_KEY = os.getenv("GEMINI_API_KEY")
-
-# Credentials 관련 조치
-credentials_path = os.getenv("GEMINI_CREDENTIAL_PATH")
-os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = credentials_path
-
-model_name = "gemini-1.5-flash"
-model = ChatGoogleGenerativeAI(model=model_name)
+model_name = os.getenv("LLM_MODEL", "gemini-1.5-flash")
+# 사전에 정의된 추천 모델 정보 (recommenders 테이블)
+LLM_RECOMMENDER_ID = 2
+LLM_RECOMMENDER_NAME = 'LLM-Gemini-Prompt-v1'
 
 # 원하는 데이터 구조를 정의합니다.
 class RecommendationJson(BaseModel):
-    items: str = Field(description="유저에 추천할 만한 영화들 목록")
+    items: List[str] = Field(description="유저에 추천할 만한 영화 제목 목록 (영화 리스트에 있는 제목 그대로)")
     explanation: str = Field(description="추천의 이유")
 
 
-# 파서를 설정하고 프롬프트 템플릿에 지시사항을 주입합니다.
-# 그러면 Topic 클래스의 템플릿에 맞는 형태로 JSON으로 반환.  
-parser = JsonOutputParser(pydantic_object=RecommendationJson)
+PROMPT_MESSAGES = [
+    ("system", "당신은 영화 추천 시스템 AI 어시스턴트 입니다. 주어진 영화 리스트 중에서 유저가 좋아할 만한 영화들을 10개 추천하고 그 이유를 간략하게 설명하세요."),
+    ("user", "#Format: {format_instructions}\n\n#Movie List: {movie_candidates}\n\n#Question: {question}"),
+]
 
-prompt = ChatPromptTemplate.from_messages(
-    [
-        ("system", "당신은 영화 추천 시스템 AI 어시스턴트 입니다. 주어진 영화 리스트 중에서 유저가 좋아할 만한 영화들을 10개 추천하고 그 이유를 간략하게 설명하세요."),
-        ("user", "#Format: {format_instructions}\n\n#Movie List: {movie_candidates}\n\n#Question: {question}"),
-    ]
-)
 
-prompt = prompt.partial(format_instructions=parser.get_format_instructions())
+def build_chain(model):
+    """
+    prompt | model | JsonOutputParser. langchain is imported here, not at module import.
+    """
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.output_parsers import JsonOutputParser
 
-chain = prompt | model | parser  # 체인을 구성합니다.
+    # 파서를 설정하고 프롬프트 템플릿에 지시사항을 주입합니다.
+    # 그러면 Topic 클래스의 템플릿에 맞는 형태로 JSON으로 반환.
+    parser = JsonOutputParser(pydantic_object=RecommendationJson)
+    prompt = ChatPromptTemplate.from_messages(PROMPT_MESSAGES)
+    prompt = prompt.partial(format_instructions=parser.get_format_instructions())
+    return prompt | model | parser  # 체인을 구성합니다.
 
-# APIs of LLM
 
+LLM_WARMUP = os.getenv("LLM_WARMUP", "1") == "1"  # 시작 직후 백그라운드에서 chain을 미리 만들지
 
-# 비동기 데이터베이스 의존성
-async def get_async_db():
-    async with async_session_maker() as session:
-        yield session
+# chain은 첫 추천 요청(또는 시작 후 백그라운드 warm-up)에서 만든다. 테스트에서는 직접 바꿔 끼울 수 있다.
+chain = None
+_chain_lock = threading.Lock()
 
-# 추천 가능한 영화 리스트 가져오기
 
-async def get_all_movie_list(db:  AsyncSession = Depends(get_async_db)):
-    try:
-        query = (
-            select(Movies.movieId, Movies.title, Movies.genre)
-            .select_from(Movies)
-        )
-  
-        results = await db.execute(query)
-        results = results.all()
+def get_chain():
+    global chain
+    if chain is None:
+        with _chain_lock:
+            if chain is None:
+                start = time.perf_counter()
+                chain = build_chain(get_provider(model_name).create_model())
+                logging.getLogger(__name__).info(f"LLM chain built in {time.perf_counter() - start:.2f}s")
+    return chain
 
-        #print(f"results: {results}")
-        results_as_dict = []
-        for row in results:
-            rating_dict = {
-                "movieId": row.movieId,
-                "title": row.title,
-                'genre': row.genre
-            }
-            results_as_dict.append(rating_dict)
 
-        #print(f"results: {results_as_dict}")
-        
-        if not results_as_dict:
-            return {"message": "No Movie list.",
-                'movieList': []} # 없으면 빈칸 리턴 
-        return {"message": "Movie list loaded successfully.",
-                'movieList': results_as_dict}
+# hedge 요청에 쓸 chain, LLM_HEDGE_MODEL이 없으면 기본 chain을 그대로 쓴다
+hedge_chain = None
+
+
+def get_hedge_chain():
+    global hedge_chain
+    if not LLM_HEDGE_MODEL or LLM_HEDGE_MODEL == model_name:
+        return get_chain()
+    if hedge_chain is None:
+        with _chain_lock:
+            if hedge_chain is None:
+                hedge_chain = build_chain(get_provider(LLM_HEDGE_MODEL).create_model())
+    return hedge_chain
+
+
+async def warm_up_chain():
+    # SDK import + 모델 생성은 동기 작업이라 스레드에서 실행해 이벤트 루프를 막지 않는다
+    try:
+        await asyncio.to_thread(get_chain)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        logging.getLogger(__name__).warning(f"LLM warm-up failed, will retry on first request: {e}")
 
-#all_movie_list = await get_all_movie_list()
-#movie_candidates = all_movie_list['movieList'][0:100]
-#movie_candidates = [movie['title'] for movie in movie_candidates]
-#movie_candidates = ', '.join(movie_candidates)
+# LLM 동시 호출 제한 설정
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))  # 동시에 실행되는 LLM 호출 수
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))  # 슬롯을 기다릴 수 있는 최대 요청 수
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))  # 대기 시간 + 호출 시간 (초)
 
-class MovieCandidateManager:
-    def __init__(self):
-        self.movie_candidates = None
 
-    async def initialize_candidates(self):
-        all_movie_list = await get_all_movie_list(next(get_async_db()))
-        if 'movieList' in all_movie_list and all_movie_list['movieList']:
-            self.movie_candidates = [movie['title'] for movie in all_movie_list['movieList'][0:100]]
-            print(f"Initialized Movie Candidates: {', '.join(self.movie_candidates)}")
-        else:
-            self.movie_candidates = []
-            print("No movies found to initialize candidates.")
+class LLMConcurrencyLimiter:
+    """
+    Bound the number of in-flight LLM calls and the number of callers waiting for a slot.
+    Requests beyond the queue depth get 503, requests over the timeout get 504.
+    """
+    def __init__(self, max_concurrency: int, max_queue: int, timeout: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @asynccontextmanager
+    async def slot(self, timeout: float = None):
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            raise HTTPException(status_code=503, detail="추천 요청이 많아 처리할 수 없습니다. 잠시 후 다시 시도해주세요")
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.timeout if timeout is None else timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="추천 대기 시간이 초과되었습니다")
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def _deadline(self, deadline: float = None) -> float:
+        # 호출마다의 timeout과 요청 전체 예산(deadline, loop.time() 기준) 중 먼저 오는 쪽
+        limit = asyncio.get_running_loop().time() + self.timeout
+        return limit if deadline is None else min(limit, deadline)
+
+    async def run(self, coro_factory, deadline: float = None):
+        loop = asyncio.get_running_loop()
+        deadline = self._deadline(deadline)
+        async with self.slot(timeout=max(deadline - loop.time(), 0)):
+            try:
+                return await asyncio.wait_for(coro_factory(), timeout=max(deadline - loop.time(), 0))
+            except asyncio.TimeoutError:
+                raise HTTPException(status_code=504, detail="추천 생성 시간이 초과되었습니다")
+
+    async def stream(self, stream_factory, deadline: float = None):
+        # 스트리밍 호출은 마지막 chunk까지 슬롯을 잡고, 대기 + 전체 생성 시간에 같은 timeout을 적용한다
+        loop = asyncio.get_running_loop()
+        deadline = self._deadline(deadline)
+        async with self.slot(timeout=max(deadline - loop.time(), 0)):
+            iterator = stream_factory().__aiter__()
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(iterator.__anext__(), timeout=max(deadline - loop.time(), 0))
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError:
+                    raise HTTPException(status_code=504, detail="추천 생성 시간이 초과되었습니다")
+                yield chunk
+
+    @property
+    def has_spare_slot(self) -> bool:
+        return not self._semaphore.locked()
+
+    def stats(self):
+        return {"max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "in_flight": self.in_flight,
+                "waiting": self.waiting}
+
+
+llm_limiter = LLMConcurrencyLimiter(LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE, LLM_TIMEOUT)
+metrics.gauge("llm_in_flight", "LLM calls currently running", lambda: llm_limiter.in_flight)
+metrics.gauge("llm_waiting", "Requests waiting for an LLM slot", lambda: llm_limiter.waiting)
+
+logger = logging.getLogger(__name__)
+
+# 추천 요청 하나의 지연 시간 예산. 예산 안에 쓸 만한 LLM 답이 없으면 로컬 추천(fallback)으로 응답한다.
+RECOMMEND_BUDGET = float(os.getenv("RECOMMEND_BUDGET", "10"))  # 요청 시작부터 응답까지 (초)
+RECOMMEND_FALLBACK_RESERVE = float(os.getenv("RECOMMEND_FALLBACK_RESERVE", "0.5"))  # 예산 중 fallback + 저장 몫 (초)
+RECOMMEND_FALLBACK = os.getenv("RECOMMEND_FALLBACK", "1") == "1"  # 0이면 fallback 대신 503/504
+LLM_HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", "0"))  # 첫 호출이 이만큼 늦으면 두 번째 호출 (초), 0이면 끔
+LLM_HEDGE_MODEL = os.getenv("LLM_HEDGE_MODEL", "")  # hedge 호출에 쓸 모델, 비우면 LLM_MODEL
+LLM_PARSE_RETRIES = int(os.getenv("LLM_PARSE_RETRIES", "1"))  # JSON 파싱 실패 시 다시 부르는 횟수
+
+LLM_HEDGES = metrics.counter("llm_hedged_requests_total", "Hedged second LLM calls started")
+LLM_RETRIES = metrics.counter("llm_parse_retries_total", "LLM calls retried after unparseable output")
+RECOMMEND_FALLBACKS = metrics.counter("recommend_fallback_total", "Recommendations served by the fallback ranking",
+                                      ("reason",))
+
+
+class LLMUnavailable(Exception):
+    """
+    No usable LLM answer within the budget. reason: timeout, overloaded, parse_error, llm_error, no_match.
+    """
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
 
-    def get_candidates(self):
-        if self.movie_candidates is not None:
-            print(f"Using existing Movie Candidates: {', '.join(self.movie_candidates)}")
-            return self.movie_candidates
-        else:
-            print("Movie candidates have not been initialized yet.")
-            return []
 
-manager = MovieCandidateManager()
+def is_valid_recommendation(response) -> bool:
+    return isinstance(response, dict) and bool(completed_items(response.get('items'), final=True))
+
+
+async def invoke_with_budget(inputs: dict, deadline: float):
+    """
+    chain.ainvoke under llm_limiter, bounded by `deadline` (event loop time). If the first call is slower than
+    LLM_HEDGE_DELAY and a slot is free, a second call is started and the first valid answer wins.
+    Unparseable answers are retried up to LLM_PARSE_RETRIES times. Raises LLMUnavailable.
+    """
+    from langchain_core.exceptions import OutputParserException
+
+    loop = asyncio.get_running_loop()
+    llm_chain = chain if chain is not None else await asyncio.to_thread(get_chain)
+    hedge_at = loop.time() + LLM_HEDGE_DELAY if LLM_HEDGE_DELAY > 0 else None
+    retries = LLM_PARSE_RETRIES
+    reason = "timeout"
+    tasks = set()
+
+    def launch(target_chain):
+        tasks.add(asyncio.create_task(llm_limiter.run(lambda: target_chain.ainvoke(inputs), deadline=deadline)))
+
+    launch(llm_chain)
+    try:
+        while tasks:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                reason = "timeout"
+                break
+            wait = remaining if hedge_at is None else min(remaining, max(hedge_at - loop.time(), 0))
+            done, tasks = await asyncio.wait(tasks, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                error = task.exception()
+                if error is None and is_valid_recommendation(task.result()):
+                    return task.result()
+                if error is None or isinstance(error, OutputParserException):
+                    reason = "parse_error"
+                    if retries > 0:
+                        retries -= 1
+                        LLM_RETRIES.inc()
+                        launch(llm_chain)
+                elif isinstance(error, HTTPException):
+                    reason = "timeout" if error.status_code == 504 else "overloaded"
+                else:
+                    reason = "llm_error"
+                    logger.warning(f"LLM call failed: {error!r}")
+            if hedge_at is not None and loop.time() >= hedge_at:
+                hedge_at = None
+                # 다른 요청이 기다리는 슬롯을 뺏지 않도록 빈 슬롯이 있을 때만
+                if tasks and llm_limiter.has_spare_slot:
+                    LLM_HEDGES.inc()
+                    launch(llm_chain if not LLM_HEDGE_MODEL else await asyncio.to_thread(get_hedge_chain))
+        raise LLMUnavailable(reason)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+# JsonOutputParser가 붙은 chain을 astream하면 지금까지 파싱된 partial JSON(dict)이 누적 형태로 나온다
+async def astream_chain(inputs: dict, deadline: float = None):
+    llm_chain = chain if chain is not None else await asyncio.to_thread(get_chain)
+    async for partial in llm_limiter.stream(lambda: llm_chain.astream(inputs), deadline=deadline):
+        yield partial
+
+# APIs of LLM
 
 
+# 비동기 데이터베이스 의존성
+async def get_async_db():
+    async with async_session_maker() as session:
+        yield session
+
 # 유저의 rating history 정보 입력 
 target_template = {'introduction': '사용자가 높은 평점을 준 영화들은 다음과 같습니다.',
                    'rating_template': '\n{item}: {rating}'}
@@ -130,10 +294,14 @@ Base = declarative_base()
 
 
 # 특정 유저의 rating history를 불러온다 
-async def get_rating_history(userId: int, db:  AsyncSession = Depends(get_async_db)):
+async def get_rating_history(userId: int, db:  AsyncSession = Depends(get_async_db),
+                             limit: int = DEFAULT_PAGE_SIZE, cursor: str = None):
+    # (rating, timestamp, movieId) 내림차순 keyset 페이지, ix_ratings_userId_rating_timestamp 인덱스 순서 그대로 읽는다
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    after = decode_cursor(cursor, 3)
     try:
         '''
-        # 평점이 높은 10개만 리턴하고 영화 정보도 가져온다. 
+        # 평점이 높은 순으로 limit개(기본 10개)만 리턴하고 영화 정보도 가져온다. 
         '''
         query = (
             select(Ratings.userId, 
@@ -146,12 +314,16 @@ async def get_rating_history(userId: int, db:  AsyncSession = Depends(get_async_
             .select_from(Ratings)
             .join(Movies, Ratings.movieId == Movies.movieId)
             .where(Ratings.userId == userId)
-            .order_by(desc(Ratings.rating))
-            .limit(10)
+            .order_by(desc(Ratings.rating), desc(Ratings.timestamp), desc(Ratings.movieId))
+            .limit(limit + 1)
         )
+        if after is not None:
+            query = query.where(tuple_(Ratings.rating, Ratings.timestamp, Ratings.movieId) < tuple_(*after))
   
         results = await db.execute(query)
         rating_history = results.all()
+        cursor = next_cursor(rating_history, limit, lambda row: (row.rating, row.timestamp, row.movieId))
+        rating_history = rating_history[:limit]
 
         results_as_dict = []
         for row in rating_history:
@@ -169,50 +341,42 @@ async def get_rating_history(userId: int, db:  AsyncSession = Depends(get_async_
         
         if not results_as_dict:
             return {"message": "No Rating history.",
-                'rating_history': []} # 없으면 빈칸 리턴 
+                'rating_history': [],
+                'nextCursor': None} # 없으면 빈칸 리턴 
         return {"message": "Rating history loaded successfully.",
-                'rating_history': results_as_dict}
+                'rating_history': results_as_dict,
+                'nextCursor': cursor}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # 영화 리스트에 있는 영화들의 정보들을 가져온다 
 async def get_movie_info(movieList: list, db:  AsyncSession = Depends(get_async_db)):
     try:
-        # 영화의 평균 rating을 구하는 서브쿼리
-        avg_rating_subquery = (
-            select(Ratings.movieId, func.round(func.avg(Ratings.rating), 1).label("meanRating"))
-            .group_by(Ratings.movieId)
-            .subquery()
-        )
+        await movie_catalog.ensure_loaded(db)
+        # 연도 누락/관사 위치/문장 부호가 달라도 찾도록 정규화 + fuzzy 매칭, LLM이 준 순서 유지
+        titles = completed_items(movieList, final=True)
+        resolved = movie_catalog.resolve_titles(titles)
+        if len(resolved) < len(titles):
+            logger.info(f"unresolved or repeated recommended titles: {len(titles) - len(resolved)} of {len(titles)}")
+        movie_ids = [movie.movieId for movie, _ in resolved]
 
-        query = (
-            select(
-                   Movies.movieId,
-                   Movies.title,
-                   Movies.genre,
-                   avg_rating_subquery.c.meanRating # 평균 평점 컬럼 추가 
-                   )
-            .select_from(Movies)
-            .join(avg_rating_subquery, Movies.movieId == avg_rating_subquery.c.movieId, isouter=True)
-            .where(Movies.title.in_(movieList))
-        )
-  
-        results = await db.execute(query)
-        results = results.all()
+        # 평균 평점은 movie_stats 집계 테이블에서 추천된 영화 수만큼만 읽는다
+        mean_ratings = await get_mean_ratings(db, movie_ids)
 
         #print(f"results: {results}")
         timestamp_unix = time.time()
         results_as_dict = []
-        for row in results:
+        for movie, match in resolved:
             rating_dict = {
-                "movieId": row.movieId,
-                "rating": row.meanRating,
-                "title": row.title,
-                "genre": row.genre,
-                "timestamp": timestamp_unix
+                "movieId": movie.movieId,
+                "rating": mean_ratings.get(movie.movieId),
+                "title": movie.title,
+                "genre": movie.genre,
+                "timestamp": timestamp_unix,
+                "matchConfidence": match.confidence
             }
             results_as_dict.append(rating_dict)
-        print(f'movide info result: {results_as_dict}')
+        log_sampled(logger, "movie info result: %s", results_as_dict)
         
         if not results_as_dict:
             return {"message": "No Informations in DB.",
@@ -291,62 +455,299 @@ async def insert_recommend(recommendations, userId, db: AsyncSession):
 # ORM 방식
 async def insert_recommend(recommendations: List[dict], 
                            userId: int, 
-                           db: AsyncSession = Depends(get_async_db)):
+                           db: AsyncSession = Depends(get_async_db),
+                           recommenderId: int = LLM_RECOMMENDER_ID,
+                           recommenderName: str = LLM_RECOMMENDER_NAME,
+                           runId: str = None):
+    # 추천 목록 하나 = run 하나, 같은 runId로 다시 저장하면 덮어쓴다 (upsert)
     try:
-        # 사전에 정의된 추천 모델 정보 
-        recommenderId = 2
-        recommenderName = 'LLM-Gemini-Prompt-v1'
-
-        bulk_insert_data = []
-        print(f"recommendations in insert rec: {recommendations}")
-        for movie in recommendations:
-            recommended_movie = {
-                "userId": userId,
-                "movieId": movie['movieId'],
-                "meanRating": movie['rating'],
-                "timestamp": movie['timestamp'],
-                "recommenderId": recommenderId,
-                "recommenderName": recommenderName
-            }
-            bulk_insert_data.append(recommended_movie)
+        log_sampled(logger, "recommendations in insert rec: %s", recommendations)
+        if not recommendations:
+            return {"message": "No recommendations to add"}
 
-        insert_stmt = insert(Recommendations).values(bulk_insert_data)
-        await db.execute(insert_stmt)  # 세션에 모델 인스턴스 추가
+        run, items = run_rows(runId or new_run_id(), userId, recommendations, recommenderId, recommenderName)
+        await upsert_runs(db, [run], items)
         await db.commit()  # 변경 사항 커밋
 
-        return {"message": "Recommendations added successfully"}
+        return {"message": "Recommendations added successfully", "runId": run["runId"]}
     
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def content_recommend_movies(userId: int, db: AsyncSession) -> List[dict]:
+    # 유저가 높게 평가한 영화들(유저 프로필의 평점 상위)과 제목/장르 벡터가 가까운 영화, 평가한 영화는 모두 뺀다
+    profile = await user_profiles.get(userId, db)
+    return await content_index.recommend_from_history(profile.rating_history(), db, exclude=profile.rated)
+
 
+# LLM 없이 바로 결과를 내는 추천기: 이름 -> (영화 목록 함수, recommenderId, recommenderName)
+LOCAL_RECOMMENDERS = {
+    'item-cf': (item_cf_recommender.recommend, ITEM_CF_RECOMMENDER_ID, ITEM_CF_RECOMMENDER_NAME),
+    'content': (content_recommend_movies, CONTENT_RECOMMENDER_ID, CONTENT_RECOMMENDER_NAME),
+    'popular': (popular_recommend_movies, FALLBACK_RECOMMENDER_ID, FALLBACK_RECOMMENDER_NAME),
+}
+
+# 요청에서 고를 수 있는 추천기
+RECOMMENDERS = ('llm', *LOCAL_RECOMMENDERS)
+
+
+async def local_recommend_movies(recommender: str, userId: int, db: AsyncSession) -> List[dict]:
+    recommend_movies = LOCAL_RECOMMENDERS[recommender][0]
+    with stage_timer(recommender.replace('-', '_')):
+        return await recommend_movies(userId, db)
+
+
+async def store_local_recommendations(recommender: str, movie_info: List[dict], userId: int, db: AsyncSession,
+                                      runId: str):
+    _, recommenderId, recommenderName = LOCAL_RECOMMENDERS[recommender]
+    with stage_timer("insert_recommend"):
+        await insert_recommend(movie_info, userId, db,
+                               recommenderId=recommenderId,
+                               recommenderName=recommenderName,
+                               runId=runId)
+
+
+async def local_recommend(recommender: str, userId: int, db: AsyncSession, runId: str):
+    movie_info = await local_recommend_movies(recommender, userId, db)
+    if not movie_info:
+        return {"message": "No Informations in DB.",
+                'movieInfo': []}
+    await store_local_recommendations(recommender, movie_info, userId, db, runId)
+    return {"message": "Movie info loaded successfully.",
+            'movieInfo': movie_info,
+            'runId': runId,
+            'recommenderName': LOCAL_RECOMMENDERS[recommender][2]}
+
+
+async def fallback_movie_info(candidates, reason: str, db: AsyncSession) -> List[dict]:
+    # 이미 계산한 후보 순위(장르 선호도 + 인기도) 앞부분을 그대로 쓴다, 평균 평점 조회 한 번이면 끝난다
+    if not RECOMMEND_FALLBACK:
+        if reason == "timeout":
+            raise HTTPException(status_code=504, detail="추천 생성 시간이 초과되었습니다")
+        raise HTTPException(status_code=503, detail="추천을 생성할 수 없습니다. 잠시 후 다시 시도해주세요")
+    RECOMMEND_FALLBACKS.inc(reason)
+    logger.warning(f"Serving fallback recommendations ({reason})")
+    with stage_timer("fallback"):
+        return await candidate_movie_info(candidates, db)
 
 
 async def recommend_func(userId: int, db: AsyncSession = Depends(get_async_db)):
+    recommender = getattr(userId, 'recommender', None) or 'llm'
+    if recommender not in RECOMMENDERS:
+        raise HTTPException(status_code=400, detail=f"지원하지 않는 추천기입니다: {recommender}")
     userId = int(userId.userId)
-    #print(f"userId: {userId}")
-    rating_history = await get_rating_history(userId, db)
-    #print(f"rating_history: {rating_history['message']}")
-    filled_template = fill_template(target_template, rating_history)
-    #print(f'filled_template: {filled_template}')
-
-    #movie_candidates = manager.get_candidates()
-    movie_candidates = await get_all_movie_list(db)
-    if movie_candidates['movieList'] is None:
-        return {"message": "Movie candidates have not been initialized."}
-    else:
-        movie_candidates = movie_candidates['movieList']
-        #print(f"movie_candidates: {movie_candidates}")
-
-    recommended = chain.invoke({"movie_candidates": movie_candidates,
-                                "question": filled_template})
-    
-    print(f"recommended: {recommended}")
-    movieList = recommended['items']
-    recommendations = await get_movie_info(movieList, db)
-    print(f"recommendations with info added: {recommendations['message']}")
-    message = await insert_recommend(recommendations['movieInfo'], userId, db)
+    runId = new_run_id()  # 이번 호출의 추천 결과는 모두 이 run으로 저장된다
+    # 요청 전체 예산, fallback과 저장에 쓸 시간은 LLM 호출에서 빼 둔다
+    llm_deadline = asyncio.get_running_loop().time() + RECOMMEND_BUDGET - RECOMMEND_FALLBACK_RESERVE
+    if recommender in LOCAL_RECOMMENDERS:
+        return await local_recommend(recommender, userId, db, runId)
+
+    # 단계별 소요 시간은 recommend_stage_duration_seconds 히스토그램으로 /metrics에 노출된다
+    # 평점 상위 영화는 유저 프로필에서 읽는다, ratings/movies 조인 없이
+    with stage_timer("rating_history"):
+        profile = await user_profiles.get(userId, db)
+    with stage_timer("fill_template"):
+        filled_template = fill_template(target_template, {'rating_history': profile.rating_history()})
+
+    # 전체 카탈로그 대신 장르 선호도/인기도로 거른 상위 N개만 프롬프트에 넣는다
+    with stage_timer("candidates"):
+        candidates = await generate_candidates(userId, db)
+        if not candidates:
+            return {"message": "Movie candidates have not been initialized."}
+        movie_candidates = format_candidates(candidates)
+        token_report = candidate_token_report(movie_candidates)
+
+    # 프롬프트가 같으면 모델을 다시 부르지 않는다
+    cache_key = recommend_cache.make_key(filled_template, movie_candidates, model_name)
+    with stage_timer("cache_lookup"):
+        recommended = await recommend_cache.get(cache_key, db)
+    cache_hit = recommended is not None
+    try:
+        if not cache_hit:
+            with stage_timer("llm_call"):
+                recommended = await invoke_with_budget({"movie_candidates": movie_candidates,
+                                                        "question": filled_template}, llm_deadline)
+
+        log_sampled(logger, "recommended: %s", recommended)
+        movieList = recommended['items']
+        with stage_timer("movie_info"):
+            recommendations = await get_movie_info(movieList, db)
+        if not recommendations['movieInfo']:
+            raise LLMUnavailable("no_match")  # 카탈로그에 없는 제목만 돌아온 경우
+    except LLMUnavailable as e:
+        # fallback 결과는 캐시하지 않는다, 다음 요청에서 다시 LLM을 시도한다
+        movie_info = await fallback_movie_info(candidates, e.reason, db)
+        await store_local_recommendations('popular', movie_info, userId, db, runId)
+        return {"message": "Movie info loaded successfully.",
+                'movieInfo': movie_info,
+                'runId': runId,
+                'recommenderName': FALLBACK_RECOMMENDER_NAME,
+                'fallback': e.reason,
+                'promptTokens': token_report,
+                'cached': False}
+    if not cache_hit:
+        await recommend_cache.set(cache_key, recommended, model_name, db)
+
+    movie_info = recommendations['movieInfo']
+    # 캐시에서 나온 같은 추천도 새 run으로 저장해야 /api/recommended가 최신 요청의 결과를 보여준다
+    with stage_timer("insert_recommend"):
+        message = await insert_recommend(movie_info, userId, db, runId=runId)
+    recommendations['runId'] = runId
+    recommendations['recommenderName'] = LLM_RECOMMENDER_NAME
+    recommendations['fallback'] = None
+    recommendations['promptTokens'] = token_report
+    recommendations['cached'] = cache_hit
     return recommendations
 
+
+
+def completed_items(items, final: bool = False) -> List[str]:
+    """
+    Titles from a partial `items` value that can no longer change.
+    Until the stream ends the last element may still be growing, so it is held back.
+    """
+    if isinstance(items, str):
+        # 스키마상 items는 문자열일 수도 있다 ("제목1, 제목2, ...")
+        items = [item.strip() for item in items.split(',')]
+    if not isinstance(items, list):
+        return []
+    if not final:
+        items = items[:-1]
+    return [item for item in items if isinstance(item, str) and item.strip()]
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def enrich_titles(titles: List[str], seen: set, db: AsyncSession) -> List[dict]:
+    # 새로 완성된 제목만 movieId/평균 평점을 붙인다, 같은 영화가 두 번 나오면 한 번만 보낸다
+    resolved = [(movie, match) for movie, match in movie_catalog.resolve_titles(titles)
+                if movie.movieId not in seen]
+    if not resolved:
+        return []
+    mean_ratings = await get_mean_ratings(db, [movie.movieId for movie, _ in resolved])
+    timestamp_unix = time.time()
+    enriched = []
+    for movie, match in resolved:
+        seen.add(movie.movieId)
+        enriched.append({"movieId": movie.movieId,
+                         "rating": mean_ratings.get(movie.movieId),
+                         "title": movie.title,
+                         "genre": movie.genre,
+                         "timestamp": timestamp_unix,
+                         "matchConfidence": match.confidence})
+    return enriched
+
+
+async def recommend_stream(userId, db: AsyncSession):
+    """
+    Server-Sent Events version of recommend_func. Each recommended movie is sent as a
+    `recommendation` event as soon as its title is complete in the partial JSON; the whole
+    batch is stored once the model is done, then a `done` event carries the summary.
+    """
+    recommender = getattr(userId, 'recommender', None) or 'llm'
+    userId = int(userId.userId)
+    runId = new_run_id()
+    start = time.perf_counter()
+    llm_deadline = asyncio.get_running_loop().time() + RECOMMEND_BUDGET - RECOMMEND_FALLBACK_RESERVE
+    movie_info: List[dict] = []
+    seen: set = set()
+    token_report = None
+    cache_hit = False
+
+    def emit(movie: dict) -> str:
+        if not movie_info:
+            FIRST_RECOMMENDATION_LATENCY.observe(time.perf_counter() - start, recommender)
+        movie_info.append(movie)
+        return sse_event("recommendation", movie)
+
+    try:
+        if recommender in LOCAL_RECOMMENDERS:
+            for movie in await local_recommend_movies(recommender, userId, db):
+                yield emit(movie)
+            await store_local_recommendations(recommender, movie_info, userId, db, runId)
+            yield sse_event("done", {"count": len(movie_info), "cached": False, "runId": runId,
+                                     "recommenderName": LOCAL_RECOMMENDERS[recommender][2]})
+            return
+
+        with stage_timer("rating_history"):
+            profile = await user_profiles.get(userId, db)
+        with stage_timer("fill_template"):
+            filled_template = fill_template(target_template, {'rating_history': profile.rating_history()})
+        with stage_timer("candidates"):
+            candidates = await generate_candidates(userId, db)
+            if not candidates:
+                yield sse_event("error", {"detail": "Movie candidates have not been initialized."})
+                return
+            movie_candidates = format_candidates(candidates)
+            token_report = candidate_token_report(movie_candidates)
+
+        cache_key = recommend_cache.make_key(filled_template, movie_candidates, model_name)
+        with stage_timer("cache_lookup"):
+            recommended = await recommend_cache.get(cache_key, db)
+        cache_hit = recommended is not None
+        if cache_hit:
+            titles = completed_items(recommended.get('items'), final=True)
+            for movie in await enrich_titles(titles, seen, db):
+                yield emit(movie)
+        else:
+            recommended = None
+            fallback_reason = None
+            try:
+                with stage_timer("llm_call"):
+                    async for partial in astream_chain({"movie_candidates": movie_candidates,
+                                                        "question": filled_template}, deadline=llm_deadline):
+                        if not isinstance(partial, dict):
+                            continue
+                        recommended = partial
+                        titles = completed_items(partial.get('items'))
+                        for movie in await enrich_titles(titles, seen, db):
+                            yield emit(movie)
+            except HTTPException as e:
+                # 아직 아무것도 보내지 않았으면 fallback으로, 일부를 보냈으면 error 이벤트로 끝낸다
+                if movie_info:
+                    raise
+                fallback_reason = "timeout" if e.status_code == 504 else "overloaded"
+            except Exception as e:
+                if movie_info:
+                    raise HTTPException(status_code=500, detail=str(e))
+                logger.warning(f"LLM stream failed: {e!r}")
+                fallback_reason = "parse_error" if type(e).__name__ == "OutputParserException" else "llm_error"
+            if fallback_reason is None:
+                if recommended is None:
+                    fallback_reason = "parse_error"
+                else:
+                    # 스트림이 끝나면 마지막 항목도 완성된 것
+                    for movie in await enrich_titles(completed_items(recommended.get('items'), final=True),
+                                                     seen, db):
+                        yield emit(movie)
+                    if not movie_info:
+                        fallback_reason = "no_match"
+            if fallback_reason is not None:
+                for movie in await fallback_movie_info(candidates, fallback_reason, db):
+                    yield emit(movie)
+                await store_local_recommendations('popular', movie_info, userId, db, runId)
+                yield sse_event("done", {"count": len(movie_info),
+                                         "promptTokens": token_report,
+                                         "cached": False,
+                                         "runId": runId,
+                                         "recommenderName": FALLBACK_RECOMMENDER_NAME,
+                                         "fallback": fallback_reason})
+                return
+            await recommend_cache.set(cache_key, recommended, model_name, db)
+
+        log_sampled(logger, "streamed recommendations: %s", movie_info)
+        with stage_timer("insert_recommend"):
+            await insert_recommend(movie_info, userId, db, runId=runId)
+        yield sse_event("done", {"count": len(movie_info),
+                                 "promptTokens": token_report,
+                                 "cached": cache_hit,
+                                 "runId": runId,
+                                 "recommenderName": LLM_RECOMMENDER_NAME,
+                                 "fallback": None})
+    except HTTPException as e:
+        # 응답 헤더가 이미 나갔으므로 상태 코드 대신 error 이벤트로 알린다
+        yield sse_event("error", {"status_code": e.status_code, "detail": e.detail})
@@ -1,19 +1,37 @@
 # FastAPI로 엔드포인트 작성  
 
+import asyncio
+import json
+import logging
+import time
 from typing import List, Dict
 from datetime import datetime
 from pydantic import BaseModel, Field
-from sqlalchemy import select, desc, func, insert, delete
+from sqlalchemy import select, desc, func, insert, delete, tuple_
 from sqlalchemy.orm import aliased, Session
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from database import async_session_maker
+from fastapi.responses import StreamingResponse, JSONResponse
+from database import async_session_maker, init_db
 from models import Users, Movies, Ratings, Recommendations
 from schemas import RatingBase
 import schemas
-from llm_recommend import recommend_func, manager
+from llm_recommend import recommend_func, recommend_stream, warm_up_chain, RECOMMENDERS, LLM_WARMUP
+from catalog import movie_catalog
+from movie_stats import init_movie_stats
+from rating_writer import rating_buffer, save_ratings, MAX_BULK_RATINGS
+from recommendation_store import latest_run_id, compaction_loop, RECOMMENDATION_COMPACT_INTERVAL
+from recommend_cache import recommend_cache
+from user_profiles import user_profiles
+from popularity import popularity_index, POPULARITY_TOP_K, POPULARITY_SNAPSHOT_INTERVAL
+from item_cf import item_cf_recommender, ITEM_CF_REFRESH_INTERVAL
+from genre_bits import GENRE_BITS
+from movie_browse import parse_genres, browse_movies
+from recommend_jobs import recommend_jobs, job_status, RECOMMEND_JOB_WORKERS, DONE, FAILED
+from metrics import metrics, REQUEST_LATENCY, log_sampled
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, next_cursor
 
 
 '''SQLAlchemy의 ORM 방식 사용  
@@ -38,8 +56,26 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # 모든 메서드 허용
     allow_headers=["*"],  # 모든 헤더 허용
+    expose_headers=["X-Total-Count", "X-Next-Cursor", "X-Recommendation-Run", "Location", "Retry-After"],  # 페이지 정보 헤더를 브라우저에서 읽을 수 있게
 )
 
+logger = logging.getLogger(__name__)
+
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    # route 템플릿(/api/search 등) 단위로 기록해 쿼리 문자열/경로 값마다 시계열이 늘어나지 않게 한다
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        REQUEST_LATENCY.observe(time.perf_counter() - start, request.method,
+                                route.path if route is not None else "unmatched", str(status))
+
 
 
 # 비동기 데이터베이스 의존성
@@ -47,17 +83,48 @@ async def get_async_db():
     async with async_session_maker() as session:
         yield session
 
-'''
+
 @app.on_event("startup")
 async def startup_event():
     try:
+        await init_db()
         async with async_session_maker() as db:
-            await manager.initialize_candidates(db)
-        print("Database connection established and movie candidates initialized")
+            await movie_catalog.load(db)
+            await init_movie_stats(db)
+            await recommend_cache.prune(db)
+        logger.info(f"Database connection established and movie catalog loaded: {len(movie_catalog)} movies")
     except Exception as e:
-        print(f"Startup error: {str(e)}")
+        logger.exception(f"Startup error: {str(e)}")
         raise e
-'''
+    # LLM SDK import/모델 생성은 기다리지 않는다, /와 /api/search는 바로 응답 가능
+    if LLM_WARMUP:
+        app.state.llm_warmup = asyncio.create_task(warm_up_chain())
+    # 유저별 보존 개수를 넘은 오래된 추천 run을 주기적으로 지운다
+    if RECOMMENDATION_COMPACT_INTERVAL > 0:
+        app.state.recommendation_compaction = asyncio.create_task(compaction_loop(async_session_maker))
+    # 인기/트렌딩 배열: 스냅샷이 있으면 바로, 없으면 ratings에서 한 번 만든다
+    app.state.popularity_warmup = asyncio.create_task(popularity_index.warm_up(async_session_maker))
+    if POPULARITY_SNAPSHOT_INTERVAL > 0:
+        app.state.popularity_snapshot = asyncio.create_task(popularity_index.snapshot_loop())
+    # item-cf 모델은 ratings가 바뀌었으면 주기적으로 다시 만든다
+    if ITEM_CF_REFRESH_INTERVAL > 0:
+        app.state.item_cf_refresh = asyncio.create_task(item_cf_recommender.refresh_loop(async_session_maker))
+    # POST /api/recommend?mode=job 작업을 처리하는 worker들
+    if RECOMMEND_JOB_WORKERS > 0:
+        recommend_jobs.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # group commit 대기 중인 평점을 저장하고 끝낸다
+    await rating_buffer.close()
+    await recommend_jobs.close()
+    for name in ("recommendation_compaction", "popularity_snapshot", "item_cf_refresh"):
+        task = getattr(app.state, name, None)
+        if task is not None:
+            task.cancel()
+    if popularity_index.dirty:
+        popularity_index.save_snapshot()
 
     
 @app.get("/")
@@ -66,30 +133,20 @@ def read_root():
 
 
 @app.get("/api/search", response_model=List[dict])
-async def search_movies(query: str, db: AsyncSession = Depends(get_async_db)):
+async def search_movies(query: str,
+                        response: Response,
+                        limit: int = Query(50, ge=1, le=500),
+                        offset: int = Query(0, ge=0),
+                        db: AsyncSession = Depends(get_async_db)):
     if not query:
         raise HTTPException(status_code=400, detail="검색어를 입력해주세요")
     
     try:
-        # ILIKE를 사용하여 대소문자 구분 없이 검색
-        search_term = f"%{query}%"
-        query = select(Movies).select_from(Movies).where(
-            Movies.title.ilike(search_term) |  # 제목 검색
-            Movies.genre.ilike(search_term)    # 장르 검색
-        )
-        
-        results = await db.execute(query)
-        movies = results.scalars().all()
-        print(f"movies: {movies}")
-        # Record 객체를 딕셔너리로 변환
-        results_as_dict = []
-        for movie in movies:
-            movie_dict = {
-                "movieId": movie.movieId,
-                "title": movie.title,
-                "genre": movie.genre
-            }
-            results_as_dict.append(movie_dict)
+        # 메모리 역색인에서 제목/장르 단어 접두사 검색, 점수순 정렬 후 limit/offset 페이지만 반환
+        await movie_catalog.ensure_loaded(db)
+        movies, total = movie_catalog.search_page(query, limit, offset)
+        response.headers["X-Total-Count"] = str(total)
+        results_as_dict = [movie.as_dict() for movie in movies]
         
         if not results_as_dict:
             return [] # 없으면 빈칸 리턴 
@@ -97,60 +154,186 @@ async def search_movies(query: str, db: AsyncSession = Depends(get_async_db)):
         return results_as_dict
         
     except Exception as e:
-        print(f"Search error: {str(e)}")  # 서버 로그에 에러 출력
+        logger.error(f"Search error: {str(e)}")  # 서버 로그에 에러 출력
         raise HTTPException(status_code=500, detail="검색 중 오류가 발생했습니다")
 
 
+async def movie_ranking(kind: str, genre: str, limit: int, db: AsyncSession) -> List[dict]:
+    # 메모리 top-K에서 바로 읽는다, DB는 준비가 안 됐을 때만
+    await popularity_index.ensure_ready(db)
+    if genre is not None and genre not in GENRE_BITS:
+        raise HTTPException(status_code=400, detail=f"없는 장르입니다: {genre}")
+    return popularity_index.ranking(kind, genre, limit)
+
+
+@app.get("/api/popular", response_model=List[dict])
+async def get_popular(genre: str = None,
+                      limit: int = Query(10, ge=1, le=POPULARITY_TOP_K),
+                      db: AsyncSession = Depends(get_async_db)):
+    # 베이즈 평균 평점 순 (평점 수가 적은 영화는 전체 평균 쪽으로 당겨진다)
+    return await movie_ranking("popular", genre, limit, db)
+
+
+@app.get("/api/trending", response_model=List[dict])
+async def get_trending(genre: str = None,
+                       limit: int = Query(10, ge=1, le=POPULARITY_TOP_K),
+                       db: AsyncSession = Depends(get_async_db)):
+    # 최근 평점이 많은 순, 오래된 평점일수록 반감기에 따라 덜 센다
+    return await movie_ranking("trending", genre, limit, db)
+
+
+@app.get("/api/movies", response_model=List[dict])
+async def browse_movie_list(response: Response,
+                            genres: str = None,
+                            match: str = Query('any', pattern='^(any|all)$'),
+                            sort: str = Query('popularity', pattern='^(popularity|rating)$'),
+                            limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                            cursor: str = None,
+                            db: AsyncSession = Depends(get_async_db)):
+    # genres=Action,Comedy: match=any면 하나라도, all이면 모두 가진 영화. 장르 문자열은 보지 않고 비트마스크만 비교한다
+    # 정렬: popularity = 평점 수, rating = 평균 평점 (내림차순). 전체 개수는 X-Total-Count, 다음 페이지는 X-Next-Cursor
+    wanted = parse_genres(genres)
+    after = decode_cursor(cursor, 2)
+    await movie_catalog.ensure_loaded(db)
+    await popularity_index.ensure_ready(db)
+    movies, total, page_cursor = browse_movies(wanted, match, sort, limit, after)
+    response.headers["X-Total-Count"] = str(total)
+    if page_cursor:
+        response.headers["X-Next-Cursor"] = page_cursor
+    return movies
+
+
 class UserId(BaseModel):
     userId: str
+    recommender: str = 'llm'  # 'llm', 'item-cf', 'content', 'popular'
 
-from llm_recommend import get_rating_history, fill_template, chain, get_movie_info, insert_recommend
+from llm_recommend import get_rating_history, fill_template, get_movie_info, insert_recommend
 
 @app.post('/api/rating_history')
-async def rate_history(user_id: UserId, db: AsyncSession = Depends(get_async_db)):
-    return await get_rating_history(user_id.userId)
+async def rate_history(user_id: UserId, db: AsyncSession = Depends(get_async_db),
+                       limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                       cursor: str = None):
+    return await get_rating_history(int(user_id.userId), db, limit=limit, cursor=cursor)
 
 
 @app.post('/api/recommend')
-async def create_recommend(user_id: UserId, db: AsyncSession = Depends(get_async_db)):
-    return await recommend_func(user_id, db)
+async def create_recommend(user_id: UserId, db: AsyncSession = Depends(get_async_db),
+                           mode: str = Query('sync', pattern='^(sync|job)$')):
+    if mode == 'sync':
+        return await recommend_func(user_id, db)
+    # mode=job: 작업만 등록하고 바로 202, 결과는 GET /api/recommend/jobs/{jobId}/result
+    if user_id.recommender not in RECOMMENDERS:
+        raise HTTPException(status_code=400, detail=f"지원하지 않는 추천기입니다: {user_id.recommender}")
+    job, coalesced = await recommend_jobs.submit(int(user_id.userId), user_id.recommender)
+    return JSONResponse(status_code=202,
+                        content={"message": "Recommendation job queued",
+                                 "coalesced": coalesced,  # 진행 중인 같은 유저의 작업에 합쳐졌는지
+                                 **job_status(job)},
+                        headers={"Location": f"/api/recommend/jobs/{job['jobId']}"})
+
+
+@app.get('/api/recommend/jobs')
+async def get_recommend_job_stats():
+    return recommend_jobs.stats()
+
+
+async def find_job(jobId: str) -> dict:
+    job = await recommend_jobs.queue.get(jobId)
+    if job is None:
+        raise HTTPException(status_code=404, detail="추천 작업을 찾을 수 없습니다")
+    return job
+
+
+@app.get('/api/recommend/jobs/{jobId}')
+async def get_recommend_job(jobId: str):
+    return job_status(await find_job(jobId))
+
+
+@app.get('/api/recommend/jobs/{jobId}/result')
+async def get_recommend_job_result(jobId: str):
+    job = await find_job(jobId)
+    if job["status"] == DONE:
+        return json.loads(job["result"])
+    if job["status"] == FAILED:
+        raise HTTPException(status_code=job["errorStatus"] or 500, detail=job["error"])
+    # 아직 끝나지 않았으면 상태만 202로
+    return JSONResponse(status_code=202, content=job_status(job),
+                        headers={"Retry-After": "1", "Location": f"/api/recommend/jobs/{jobId}"})
+
+
+async def stream_recommendations(user_id: UserId):
+    # 스트림이 끝날 때까지 세션이 살아 있어야 하므로 의존성 대신 제너레이터 안에서 연다
+    async with async_session_maker() as db:
+        async for event in recommend_stream(user_id, db):
+            yield event
+
+
+@app.post('/api/recommend/stream')
+async def create_recommend_stream(user_id: UserId):
+    # text/event-stream: 추천 영화가 하나씩 recommendation 이벤트로 오고 마지막에 done 이벤트
+    if user_id.recommender not in RECOMMENDERS:
+        raise HTTPException(status_code=400, detail=f"지원하지 않는 추천기입니다: {user_id.recommender}")
+    return StreamingResponse(stream_recommendations(user_id),
+                             media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get('/metrics')
+async def get_metrics():
+    # Prometheus text exposition format
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get('/api/recommend/cache')
+async def get_recommend_cache_stats():
+    return recommend_cache.stats()
+
+
+@app.get('/api/user_profiles/cache')
+async def get_user_profile_cache_stats():
+    return user_profiles.stats()
 
 
 @app.get('/api/recommended', response_model=List[dict])
-async def get_recommend(userId: str, db: AsyncSession = Depends(get_async_db)):
+async def get_recommend(userId: str, response: Response, db: AsyncSession = Depends(get_async_db),
+                        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                        cursor: str = None):
     if not userId:
         raise HTTPException(status_code=400, detail="검색어를 입력해주세요")
+    # 가장 최근 run의 추천만 (rank 순) 보여준다. cursor는 (runId, rank)라서 중간에 새 run이 생겨도
+    # 같은 run의 다음 페이지를 이어서 읽는다. 다음 페이지 cursor는 X-Next-Cursor 헤더로 준다
+    after = decode_cursor(cursor, 2)
     
     try:
         userId = int(userId)
-        # recommendations 테이블의 meanRating 컬럼에 대한 별칭 생성, AS 역할 
-        '''rating_alias = aliased(recommendations.c.meanRating, name='rating')
-        위와 같이 aliased를 Column 객체에 씌우면 
-        아래 에러가 발생한다.
-        Search error: Neither 'Column' object nor 'Comparator' object has an attribute 'mapper'
-        아래 코드가 올바른 코드 '''
-        rating_alias = Recommendations.meanRating.label("rating")
-
-        # CTE 정의
-        recommended_movies_cte = (
-            select(Recommendations.movieId, Recommendations.meanRating.label("rating"))
-            .select_from(Recommendations)
-            .where(Recommendations.userId == userId) # userId로 필터링
-            .cte("recommended_movies")
-        )
+        runId = after[0] if after is not None else await latest_run_id(db, userId)
+        if runId is None:
+            return [] # 추천 기록이 없으면 빈칸 리턴
+        response.headers["X-Recommendation-Run"] = runId
 
+        # 기본 키 (runId, movieId) 범위만 읽는다, run 하나는 추천 개수(k)만큼이라 작다
         query = (select(
                    Movies.movieId,
                    Movies.title,
-                   rating_alias, # 평균 평점 컬럼 추가 
-                   Movies.genre
+                   Movies.genre,
+                   Recommendations.rank
                    )
-            .select_from(Movies)
-            .join(recommended_movies_cte, Movies.movieId == recommended_movies_cte.c.movieId, isouter=False)
+            .select_from(Recommendations)
+            .join(Movies, Movies.movieId == Recommendations.movieId)
+            .where(Recommendations.runId == runId)
+            .where(Recommendations.userId == userId) # 다른 유저의 run을 cursor로 읽지 못하게
+            .order_by(Recommendations.rank)
+            .limit(limit + 1)
         )
+        if after is not None:
+            query = query.where(Recommendations.rank > after[1])
         
         results = await db.execute(query)
         movies = results.all()
+        page_cursor = next_cursor(movies, limit, lambda movie: (runId, movie.rank))
+        if page_cursor:
+            response.headers["X-Next-Cursor"] = page_cursor
+        movies = movies[:limit]
         '''
         쿼리 결과를 가져올 때 results.scalars().all()을 사용하면 
         선택한 컬럼 중 첫 번째 컬럼의 값들만 스칼라 형태로 리스트에 담기게 됩니다. 
@@ -167,7 +350,7 @@ async def get_recommend(userId: str, db: AsyncSession = Depends(get_async_db)):
                 "genre": movie.genre
             }
             results_as_dict.append(movie_dict)
-        print(f"recommended movies result dict shaped: {results_as_dict}")
+        log_sampled(logger, "recommended movies result dict shaped: %s", results_as_dict)
         
         if not results_as_dict:
             return [] # 없으면 빈칸 리턴 
@@ -175,7 +358,7 @@ async def get_recommend(userId: str, db: AsyncSession = Depends(get_async_db)):
         return results_as_dict
         
     except Exception as e:
-        print(f"Search error: {str(e)}")  # 서버 로그에 에러 출력
+        logger.error(f"Search error: {str(e)}")  # 서버 로그에 에러 출력
         raise HTTPException(status_code=500, detail="검색 중 오류가 발생했습니다")
     
 
@@ -200,17 +383,30 @@ async def create_rating(rating: RatingBase, db: AsyncSession = Depends(get_async
     else:
         raise HTTPException(status_code=200, detail='Right object')
     '''
+    # 같은 영화를 다시 매기면 기존 평점을 바꾼다 (upsert), 응답은 COMMIT 이후에 보낸다
     try:
-        query = insert(Ratings).values(
-            userId=rating.userId,
-            movieId=rating.movieId,
-            rating=rating.rating,
-            timestamp=rating.timestamp
-        )
-        await db.execute(query)
-        await db.commit()
+        if rating_buffer.enabled:
+            # 짧은 시간 안에 들어온 단건 요청들을 한 트랜잭션으로 묶어서 쓴다
+            return await rating_buffer.submit(rating)
+        # 평균 평점 집계도 같은 트랜잭션에서 갱신
+        await save_ratings(db, [rating])
         return {"message": "Rating added successfully"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/ratings/bulk")
+async def create_ratings_bulk(ratings: List[RatingBase], db: AsyncSession = Depends(get_async_db)):
+    if not ratings:
+        raise HTTPException(status_code=400, detail="평점 목록이 비어 있습니다")
+    if len(ratings) > MAX_BULK_RATINGS:
+        raise HTTPException(status_code=400, detail=f"한 번에 최대 {MAX_BULK_RATINGS}개까지 저장할 수 있습니다")
+    try:
+        # 전체가 한 트랜잭션, COMMIT 한 번
+        counts = await save_ratings(db, ratings)
+        return {"message": "Ratings saved successfully", **counts}
     except Exception as e:
-        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
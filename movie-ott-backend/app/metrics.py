@@ -0,0 +1,149 @@
+# 요청/단계별 지연 시간 계측과 Prometheus 텍스트 포맷 /metrics
+# 외부 라이브러리 없이 고정 bucket 히스토그램만 메모리에 누적한다 (프로세스 단위).
+import logging
+import os
+import random
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+# 초 단위 bucket 상한, LLM 호출까지 들어가도록 60초까지 둔다
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))  # 상세 결과 로그를 남길 요청 비율
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram keyed by a tuple of label values.
+    """
+    def __init__(self, name: str, description: str, label_names: Tuple[str, ...],
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series: Dict[Tuple[str, ...], list] = {}  # labels -> [bucket별 count..., sum, count]
+
+    def observe(self, value: float, *labels: str):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def _label_text(self, labels: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{self._label_text(labels, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{self._label_text(labels, le)} {series[-1]}")
+            lines.append(f"{self.name}_sum{self._label_text(labels)} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{self._label_text(labels)} {series[-1]}")
+        return lines
+
+    def snapshot(self) -> Dict[Tuple[str, ...], dict]:
+        return {labels: {"count": series[-1], "sum": series[-2]} for labels, series in self._series.items()}
+
+
+class Counter:
+    """
+    Monotonic counter keyed by a tuple of label values.
+    """
+    def __init__(self, name: str, description: str, label_names: Tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            pairs = ",".join(f'{name}="{_escape(label)}"' for name, label in zip(self.label_names, labels))
+            lines.append(f"{self.name}{{{pairs}}} {value}" if pairs else f"{self.name} {value}")
+        return lines
+
+    def snapshot(self) -> Dict[Tuple[str, ...], float]:
+        return dict(self._values)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[str, Counter] = {}
+        self.gauges: Dict[str, tuple] = {}  # name -> (설명, 값을 돌려주는 함수)
+
+    def histogram(self, name: str, description: str, label_names: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        if name not in self.histograms:
+            self.histograms[name] = Histogram(name, description, label_names, buckets)
+        return self.histograms[name]
+
+    def counter(self, name: str, description: str, label_names: Tuple[str, ...] = ()) -> Counter:
+        if name not in self.counters:
+            self.counters[name] = Counter(name, description, label_names)
+        return self.counters[name]
+
+    def gauge(self, name: str, description: str, read):
+        # 값은 /metrics를 읽을 때 계산한다 (예: LLM 대기열 길이)
+        self.gauges[name] = (description, read)
+
+    def render(self) -> str:
+        lines = []
+        for histogram in self.histograms.values():
+            lines.extend(histogram.render())
+        for counter in self.counters.values():
+            lines.extend(counter.render())
+        for name, (description, read) in self.gauges.items():
+            lines.extend([f"# HELP {name} {description}", f"# TYPE {name} gauge", f"{name} {read()}"])
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+REQUEST_LATENCY = metrics.histogram("http_request_duration_seconds",
+                                    "HTTP request latency by route", ("method", "route", "status"))
+STAGE_LATENCY = metrics.histogram("recommend_stage_duration_seconds",
+                                  "Latency of each /api/recommend stage", ("stage",))
+FIRST_RECOMMENDATION_LATENCY = metrics.histogram("recommend_first_item_seconds",
+                                                 "Time from a streaming request to its first recommendation",
+                                                 ("recommender",))
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """
+    with stage_timer("llm_call"): ...  -- records the block's wall time even if it raises.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - start, stage)
+
+
+def log_sampled(logger: logging.Logger, msg: str, *args, level: int = logging.DEBUG,
+                rate: float = LOG_SAMPLE_RATE):
+    # 레벨이 꺼져 있거나 샘플에 안 걸리면 포맷팅 없이 바로 반환, %-인자는 로그를 남길 때만 문자열로 만든다
+    if logger.isEnabledFor(level) and (rate >= 1.0 or random.random() < rate):
+        logger.log(level, msg, *args)
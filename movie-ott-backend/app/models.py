@@ -5,7 +5,7 @@ async와 await가 가능하다.
 반면에 database는 비동기식이다. 
 '''
 
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, Index, text
 from sqlalchemy.orm import (
     DeclarativeBase,
     mapped_column,
@@ -30,6 +30,7 @@ class Movies(Base):
     movieId: Mapped[int] = mapped_column(primary_key=True)
     title: Mapped[str]
     genre: Mapped[str]
+    genreMask: Mapped[int] = mapped_column(nullable=True)  # genre_bits.genre_mask(genre), NULL이면 읽을 때 계산
 
 class Ratings(Base):
     __tablename__ = "ratings"
@@ -39,12 +40,68 @@ class Ratings(Base):
     rating: Mapped[float]
     timestamp: Mapped[int]
 
+    # 유저별 높은 평점 순 keyset 페이지 (get_rating_history), 영화별 평점 집계용 보조 인덱스
+    __table_args__ = (
+        Index("ix_ratings_userId_rating_timestamp", "userId", "rating", "timestamp", "movieId"),
+        Index("ix_ratings_movieId_rating", "movieId", "rating"),
+    )
+
+
+# 영화별 평점 집계, /api/ratings 입력 시 함께 갱신된다
+class MovieStats(Base):
+    __tablename__ = "movie_stats"
+
+    movieId: Mapped[int] = mapped_column(ForeignKey("movies.movieId"), primary_key=True)
+    ratingCount: Mapped[int] = mapped_column(default=0)
+    ratingSum: Mapped[float] = mapped_column(default=0.0)
+
+
+class Recommenders(Base):
+    __tablename__ = "recommenders"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    model_name: Mapped[str] = mapped_column(unique=True)
+    is_active: Mapped[int]
+    start_date: Mapped[str]
+    end_date: Mapped[str] = mapped_column(nullable=True)
+    description: Mapped[str] = mapped_column(nullable=True)
+
+
+# LLM 추천 결과 캐시 (프롬프트 해시 -> 파싱된 LLM 응답 JSON)
+class RecommendCache(Base):
+    __tablename__ = "recommend_cache"
+
+    cacheKey: Mapped[str] = mapped_column(primary_key=True)
+    modelName: Mapped[str]
+    response: Mapped[str]
+    createdAt: Mapped[float]
+
+
+class RecommendationRuns(Base):
+    __tablename__ = "recommendation_runs"
+
+    # 추천 요청 한 번(recommend_func 호출, 배치의 유저 한 명)이 run 하나
+    runId: Mapped[str] = mapped_column(primary_key=True)
+    userId: Mapped[int] = mapped_column(ForeignKey("users.userId"))
+    recommenderId: Mapped[int] = mapped_column(ForeignKey("recommenders.id"))
+    recommenderName: Mapped[str] = mapped_column(ForeignKey("recommenders.model_name"))
+    createdAt: Mapped[float]  # unix time
+    itemCount: Mapped[int]
+
+    # 유저별 최신 run 조회 (/api/recommended), 유저별 보존 개수 compaction
+    __table_args__ = (
+        Index("ix_recommendation_runs_userId_createdAt", "userId", "createdAt"),
+    )
+
 
 class Recommendations(Base):
     __tablename__ = "recommendations"
 
-    userId: Mapped[int] = mapped_column(ForeignKey("users.userId"), primary_key=True)
+    # 같은 영화가 다른 run에 다시 추천될 수 있으므로 키는 (runId, movieId), 같은 run을 다시 쓰면 upsert
+    runId: Mapped[str] = mapped_column(ForeignKey("recommendation_runs.runId"), primary_key=True)
     movieId: Mapped[int] = mapped_column(ForeignKey("movies.movieId"), primary_key=True)
+    userId: Mapped[int] = mapped_column(ForeignKey("users.userId"))
+    rank: Mapped[int] = mapped_column(default=0)  # run 안에서 추천기가 준 순서
     meanRating: Mapped[float]
     timestamp: Mapped[str]
     recommenderId: Mapped[int] = mapped_column(ForeignKey("recommenders.id"))
@@ -52,6 +109,50 @@ class Recommendations(Base):
     feedback: Mapped[str] = mapped_column(nullable=True)  # feedback은 선택 사항이므로 nullable=True 설정
 
 
+class RecommendJobs(Base):
+    __tablename__ = "recommend_jobs"
+
+    # 비동기 추천 작업 (POST /api/recommend?mode=job), status: queued -> running -> done / failed
+    jobId: Mapped[str] = mapped_column(primary_key=True)
+    userId: Mapped[int] = mapped_column(ForeignKey("users.userId"))
+    recommender: Mapped[str]
+    status: Mapped[str]
+    attempts: Mapped[int] = mapped_column(default=0)
+    createdAt: Mapped[float]  # unix time
+    startedAt: Mapped[float] = mapped_column(nullable=True)
+    finishedAt: Mapped[float] = mapped_column(nullable=True)
+    result: Mapped[str] = mapped_column(nullable=True)  # recommend_func 응답 JSON
+    error: Mapped[str] = mapped_column(nullable=True)
+    errorStatus: Mapped[int] = mapped_column(nullable=True)
+
+    __table_args__ = (
+        # worker가 가장 오래된 queued 작업을 고를 때, 오래된 작업 정리
+        Index("ix_recommend_jobs_status_createdAt", "status", "createdAt"),
+        # 유저 + 추천기별로 진행 중인 작업은 하나만: 중복 요청은 같은 작업으로 합친다
+        Index("ux_recommend_jobs_active", "userId", "recommender", unique=True,
+              sqlite_where=text("status IN ('queued', 'running')")),
+    )
+
+
+# 유저별 프로필 (평점 상위 N개, 장르 선호도, 평점 수/합), 평점을 쓸 때마다 같은 트랜잭션에서 갱신된다
+class UserProfiles(Base):
+    __tablename__ = "user_profiles"
+
+    userId: Mapped[int] = mapped_column(ForeignKey("users.userId"), primary_key=True)
+    ratingCount: Mapped[int]
+    ratingSum: Mapped[float]
+    topRated: Mapped[str]  # JSON [[movieId, rating, timestamp], ...]
+    genreWeights: Mapped[str]  # JSON {장르: 평점/5 합}
+    ratedMovies: Mapped[bytes]  # 평가한 movieId 정렬 int32 배열
+    stale: Mapped[int] = mapped_column(default=0)  # 1이면 다음 조회 때 ratings에서 다시 만든다
+    updatedAt: Mapped[float]  # unix time
+
+
+# 위 인덱스들로 대체되어 (또는 recommendations가 run 단위로 바뀌어) init_db가 기존 DB에서 지우는 인덱스
+OBSOLETE_INDEXES = ("ix_ratings_userId_rating", "ix_recommendations_userId_timestamp",
+                    "ix_recommendations_userId_timestamp_movieId")
+
+
 
 
 '''
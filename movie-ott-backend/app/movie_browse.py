@@ -0,0 +1,99 @@
+# 장르 필터 + 정렬 영화 목록 (/api/movies)
+# 카탈로그의 장르 비트마스크 배열과 popularity_index의 영화별 평점 수/합 배열을 NumPy로 한 번에 비교한다.
+# 영화 수에 비례하는 일은 모두 벡터 연산이고, 정렬은 np.partition으로 고른 한 페이지 분량만 한다.
+from typing import List, Optional, Tuple
+import numpy as np
+from fastapi import HTTPException
+from catalog import movie_catalog
+from genre_bits import GENRE_BITS, genres_mask
+from popularity import popularity_index
+from pagination import encode_cursor
+
+
+def parse_genres(genres: Optional[str]) -> int:
+    # "Action,Comedy" -> 비트마스크, 모르는 장르는 400
+    names = [name.strip() for name in genres.split(",") if name.strip()] if genres else []
+    unknown = [name for name in names if name not in GENRE_BITS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"없는 장르입니다: {', '.join(unknown)}")
+    return genres_mask(names)
+
+
+def match_genres(masks: np.ndarray, wanted: int, match: str) -> np.ndarray:
+    # any: 장르 중 하나라도, all: 모든 장르를 가진 영화
+    if not wanted:
+        return np.ones(len(masks), dtype=bool)
+    if match == "all":
+        return (masks & wanted) == wanted
+    return (masks & wanted) != 0
+
+
+def browse_scores(movie_ids: np.ndarray, sort: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    (sort scores, rating counts, mean ratings) aligned with movie_ids. Sort is descending by
+    mean rating or rating count; movies without ratings have mean NaN and sort last by rating.
+    """
+    counts = np.zeros(len(movie_ids), dtype=np.int64)
+    sums = np.zeros(len(movie_ids), dtype=np.float64)
+    known = movie_ids < len(popularity_index.counts)
+    counts[known] = popularity_index.counts[movie_ids[known]]
+    sums[known] = popularity_index.sums[movie_ids[known]]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+    if sort == "popularity":
+        return counts.astype(np.float64), counts, means
+    return np.where(counts > 0, means, -1.0), counts, means
+
+
+def top_page(scores: np.ndarray, movie_ids: np.ndarray, k: int) -> np.ndarray:
+    """
+    Positions of the k best rows by (score, movieId) descending. movie_ids must be ascending,
+    so among rows tied at the cut-off score the last ones have the largest movieIds.
+    """
+    if len(scores) > k:
+        threshold = np.partition(scores, len(scores) - k)[len(scores) - k]
+        above = np.flatnonzero(scores > threshold)
+        ties = np.flatnonzero(scores == threshold)[::-1][:k - len(above)]
+        rows = np.concatenate([above, ties])
+    else:
+        rows = np.arange(len(scores))
+    order = np.lexsort((-movie_ids[rows], -scores[rows]))
+    return rows[order]
+
+
+def browse_movies(wanted: int, match: str, sort: str, limit: int,
+                  after: Optional[tuple]) -> Tuple[List[dict], int, Optional[str]]:
+    """
+    One page of movies matching the genre filter, sorted by `sort`. Returns (rows, total matches, next cursor).
+    `after` is the decoded cursor (score, movieId) of the last row on the previous page.
+    """
+    movie_ids, masks = movie_catalog.genre_arrays()
+    selected = match_genres(masks, wanted, match)
+    movie_ids = movie_ids[selected]
+    scores, counts, means = browse_scores(movie_ids, sort)
+    total = len(movie_ids)
+    if after is not None:
+        # keyset: 이전 페이지 마지막 행 (score, movieId)보다 뒤인 행만
+        score, movieId = after
+        if not all(isinstance(value, (int, float)) for value in after):
+            raise HTTPException(status_code=400, detail="잘못된 cursor 값입니다")
+        rest = (scores < score) | ((scores == score) & (movie_ids < movieId))
+        movie_ids, scores, counts, means = movie_ids[rest], scores[rest], counts[rest], means[rest]
+
+    rows = top_page(scores, movie_ids, limit + 1)
+    cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        cursor = encode_cursor((float(scores[last]), int(movie_ids[last])))
+        rows = rows[:limit]
+
+    movies = []
+    for row in rows:
+        record = movie_catalog.get(int(movie_ids[row]))
+        count = int(counts[row])
+        movies.append({"movieId": record.movieId,
+                       "title": record.title,
+                       "genre": record.genre,
+                       "rating": round(float(means[row]), 1) if count else None,
+                       "ratingCount": count})
+    return movies, total, cursor
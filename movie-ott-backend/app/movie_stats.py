@@ -0,0 +1,60 @@
+# 영화별 평점 개수/합계를 movie_stats 테이블에 유지한다.
+# 평균 평점 조회 시 ratings 전체를 GROUP BY 하지 않고 추천된 영화 수(k)만큼만 읽는다.
+from typing import Dict, List, Tuple
+from sqlalchemy import select, func, delete, insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Ratings, MovieStats
+
+
+async def init_movie_stats(db: AsyncSession):
+    # 비어 있으면 ratings에서 한 번 채운다 (테이블은 database.init_db에서 생성)
+    has_stats = (await db.execute(select(MovieStats.movieId).limit(1))).first()
+    if has_stats is None:
+        await rebuild_movie_stats(db)
+
+
+async def rebuild_movie_stats(db: AsyncSession):
+    await db.execute(delete(MovieStats))
+    await db.execute(
+        insert(MovieStats).from_select(
+            ["movieId", "ratingCount", "ratingSum"],
+            select(Ratings.movieId, func.count(), func.sum(Ratings.rating)).group_by(Ratings.movieId)
+        )
+    )
+    await db.commit()
+
+
+async def apply_rating_deltas(db: AsyncSession, deltas: Dict[int, Tuple[int, float]]):
+    """
+    Add rating changes {movieId: (count_delta, sum_delta)} to movie_stats in one executemany.
+    Runs in the caller's transaction so the aggregates are committed together with the ratings.
+    """
+    if not deltas:
+        return
+    stmt = sqlite_insert(MovieStats)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[MovieStats.movieId],
+        set_={"ratingCount": MovieStats.ratingCount + stmt.excluded.ratingCount,
+              "ratingSum": MovieStats.ratingSum + stmt.excluded.ratingSum}
+    )
+    await db.execute(stmt, [{"movieId": movieId, "ratingCount": count, "ratingSum": total}
+                            for movieId, (count, total) in deltas.items()])
+
+
+async def get_mean_ratings(db: AsyncSession, movie_ids: List[int]) -> Dict[int, float]:
+    if not movie_ids:
+        return {}
+    query = (
+        select(MovieStats.movieId,
+               func.round(MovieStats.ratingSum / MovieStats.ratingCount, 1).label("meanRating"))
+        .where(MovieStats.movieId.in_(movie_ids))
+        .where(MovieStats.ratingCount > 0)
+    )
+    results = await db.execute(query)
+    return {row.movieId: row.meanRating for row in results.all()}
+
+
+async def get_rating_counts(db: AsyncSession) -> Dict[int, int]:
+    results = await db.execute(select(MovieStats.movieId, MovieStats.ratingCount))
+    return {row.movieId: row.ratingCount for row in results.all()}
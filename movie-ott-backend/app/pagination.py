@@ -0,0 +1,36 @@
+# keyset(cursor) 페이지네이션 공용 함수
+# cursor는 마지막으로 돌려준 행의 정렬 키 값을 base64로 감싼 문자열이다. OFFSET과 달리 깊은 페이지도
+# 인덱스에서 바로 이어서 읽으므로 첫 페이지와 비용이 같고, 중간에 행이 추가되어도 중복/누락이 없다.
+import base64
+import json
+import os
+from typing import Optional, Sequence, Tuple
+from fastapi import HTTPException
+
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "10"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "100"))  # 응답 크기 상한
+
+
+def encode_cursor(values: Sequence) -> str:
+    raw = json.dumps(list(values), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], n_fields: int) -> Optional[Tuple]:
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, UnicodeDecodeError):
+        values = None
+    if not isinstance(values, list) or len(values) != n_fields:
+        raise HTTPException(status_code=400, detail="잘못된 cursor 값입니다")
+    return tuple(values)
+
+
+def next_cursor(rows: list, limit: int, key) -> Optional[str]:
+    # limit + 1개를 읽어서 다음 페이지가 있을 때만 cursor를 만든다
+    if len(rows) <= limit:
+        return None
+    return encode_cursor(key(rows[limit - 1]))
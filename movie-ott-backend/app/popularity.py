@@ -0,0 +1,319 @@
+# 인기/트렌딩 영화 순위: ratings를 매번 집계하지 않고 영화별 배열을 평점 이벤트마다 O(1)로 갱신한다.
+# - popular: 베이즈 평균 평점 (prior_count개의 전체 평균 평점을 더한 평균)
+# - trending: 평점 이벤트 수를 반감기 TRENDING_HALF_LIFE_DAYS로 감쇠한 점수
+# 순위는 전체/장르별 top-K 힙으로 유지하고, 배열은 npz 스냅샷으로 저장해 재시작 시 ratings를 다시 읽지 않는다.
+import asyncio
+import heapq
+import logging
+import math
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Ratings
+from catalog import movie_catalog
+from genre_bits import GENRE_BITS
+from ratings_reader import read_columns
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+POPULARITY_SNAPSHOT_PATH = os.getenv("POPULARITY_SNAPSHOT_PATH", os.path.join(BASE_DIR, "popularity.npz"))
+POPULARITY_SNAPSHOT_INTERVAL = float(os.getenv("POPULARITY_SNAPSHOT_INTERVAL", "300"))  # 초, 바뀐 게 있을 때만 저장
+POPULARITY_TOP_K = int(os.getenv("POPULARITY_TOP_K", "100"))  # 순위마다 유지하는 영화 수 (= limit 최댓값)
+POPULAR_PRIOR_COUNT = float(os.getenv("POPULAR_PRIOR_COUNT", "50"))  # 베이즈 평균에 더하는 가상 평점 수
+TRENDING_HALF_LIFE_DAYS = float(os.getenv("TRENDING_HALF_LIFE_DAYS", "7"))
+_REBASE_EXPONENT = 30.0  # 감쇠 기준 시각을 옮기기 전 exp()에 들어가는 최대 지수, float64 범위 안에서
+
+# 평점 이벤트: (userId, movieId, 새 평점, timestamp, 다시 매긴 경우 이전 (평점, timestamp) 아니면 None)
+RatingEvent = Tuple[int, int, float, int, Optional[Tuple[float, int]]]
+
+
+class TopK:
+    """
+    The k best movieIds by score. offer() keeps it exact as long as scores only go up;
+    when a member's score drops the set is marked stale and rebuilt from the arrays on the next read.
+    """
+    def __init__(self, k: int):
+        self.k = k
+        self.members: Dict[int, float] = {}
+        self.stale = True
+        self._heap: List[Tuple[float, int]] = []  # 최솟값이 맨 앞, 갱신 전 값은 꺼낼 때 버린다
+        self._ranked: Optional[List[int]] = None
+
+    def reset(self, movie_ids: Iterable[int], scores: Iterable[float]):
+        self.members = dict(zip(movie_ids, scores))
+        self._heap = [(score, movieId) for movieId, score in self.members.items()]
+        heapq.heapify(self._heap)
+        self.stale = False
+        self._ranked = None
+
+    def _push(self, movieId: int, score: float):
+        self.members[movieId] = score
+        heapq.heappush(self._heap, (score, movieId))
+        self._ranked = None
+        if len(self._heap) > 4 * self.k:
+            self._heap = [(s, m) for m, s in self.members.items()]
+            heapq.heapify(self._heap)
+
+    def _lowest(self) -> Tuple[float, int]:
+        while self.members.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0]
+
+    def offer(self, movieId: int, score: float, previous: float):
+        if self.stale:
+            return
+        if movieId in self.members:
+            if score < previous:
+                self.stale = True  # 밖에 있던 영화가 이제 더 높을 수 있다
+            else:
+                self._push(movieId, score)
+        elif len(self.members) < self.k:
+            self._push(movieId, score)
+        elif score > self._lowest()[0]:
+            lowest = heapq.heappop(self._heap)[1]
+            del self.members[lowest]
+            self._push(movieId, score)
+
+    def ranked(self) -> List[int]:
+        if self._ranked is None:
+            self._ranked = sorted(self.members, key=lambda movieId: (-self.members[movieId], movieId))
+        return self._ranked
+
+
+class PopularityIndex:
+    """
+    Per-movie rating count, rating sum and decayed activity in arrays indexed by movieId.
+    Decayed scores are stored relative to a reference time t0 (score * exp(-lambda * (t - t0))),
+    so an event adds one exp() term instead of decaying every movie.
+    """
+    def __init__(self, snapshot_path: str = POPULARITY_SNAPSHOT_PATH, top_k: int = POPULARITY_TOP_K,
+                 prior_count: float = POPULAR_PRIOR_COUNT, half_life_days: float = TRENDING_HALF_LIFE_DAYS):
+        self.snapshot_path = snapshot_path
+        self.top_k = top_k
+        self.prior_count = prior_count
+        self.decay_rate = math.log(2) / (half_life_days * 86400)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.sums = np.zeros(0, dtype=np.float64)
+        self.activity = np.zeros(0, dtype=np.float64)  # t0 기준 감쇠 점수
+        self.t0 = 0.0
+        self.clock = 0.0  # 지금까지 본 가장 늦은 평점 timestamp, trending 점수는 이 시각 기준
+        self.prior_mean = 0.0  # 스냅샷 주기마다만 바꾼다, 힙 안의 점수와 같은 기준이어야 해서
+        self.signature: Optional[np.ndarray] = None  # (ratings 행 수, 최대 timestamp)
+        self.dirty = False
+        self._tops: Dict[Tuple[str, Optional[str]], TopK] = {}
+        self._building = False
+        self._events_during_build = 0
+        self._lock = asyncio.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.signature is not None
+
+    async def ratings_signature(self, db: AsyncSession) -> np.ndarray:
+        row = (await db.execute(select(func.count(), func.max(Ratings.timestamp)).select_from(Ratings))).one()
+        return np.array([row[0] or 0, row[1] or 0], dtype=np.int64)
+
+    async def ensure_ready(self, db: AsyncSession):
+        if self.ready:
+            return
+        async with self._lock:
+            if self.ready:
+                return
+            await movie_catalog.ensure_loaded(db)
+            signature = await self.ratings_signature(db)
+            if not self.load_snapshot(signature):
+                await self.build(db)
+
+    async def build(self, db: AsyncSession):
+        start = time.perf_counter()
+        max_movie_id = max(movie_catalog.by_id, default=0)
+        self._building = True
+        try:
+            # 읽는 도중 커밋된 평점은 배열에 들어갔는지 알 수 없으니 그동안 이벤트가 있었으면 다시 읽는다
+            for _ in range(3):
+                self._events_during_build = 0
+                signature = await self.ratings_signature(db)
+                # 읽기, 배열 변환, 집계는 스레드에서, 빌드 중에도 이벤트 루프는 요청을 처리한다
+                columns = await read_columns((Ratings.movieId, Ratings.rating, Ratings.timestamp),
+                                             (np.int64, np.float64, np.float64))
+                arrays = await asyncio.to_thread(self._aggregate, *columns, max_movie_id)
+                if self._events_during_build == 0:
+                    break
+        finally:
+            self._building = False
+
+        self.counts, self.sums, self.activity, self.t0 = arrays
+        self.clock = self.t0
+        self.signature = signature
+        self.refresh_prior()
+        self.dirty = True
+        logger.info(f"popularity built from {len(columns[0])} ratings in {time.perf_counter() - start:.2f}s")
+
+    def _aggregate(self, movies: np.ndarray, ratings: np.ndarray, timestamps: np.ndarray, max_movie_id: int):
+        # (counts, sums, activity, t0), activity는 가장 늦은 평점 시각 t0 기준 감쇠 점수
+        size = int(max(movies.max(initial=0), max_movie_id)) + 1
+        t0 = float(timestamps.max(initial=0))
+        counts = np.bincount(movies, minlength=size).astype(np.int64)
+        sums = np.bincount(movies, weights=ratings, minlength=size)
+        activity = np.bincount(movies, weights=np.exp(self.decay_rate * (timestamps - t0)), minlength=size)
+        return counts, sums, activity, t0
+
+    def save_snapshot(self):
+        try:
+            np.savez(self.snapshot_path, counts=self.counts, sums=self.sums, activity=self.activity,
+                     clock=np.array([self.t0, self.clock]), signature=self.signature)
+            self.dirty = False
+        except OSError as e:
+            logger.warning(f"popularity snapshot save failed: {e}")
+
+    def load_snapshot(self, signature: np.ndarray) -> bool:
+        if not os.path.exists(self.snapshot_path):
+            return False
+        try:
+            with np.load(self.snapshot_path) as snapshot:
+                if not np.array_equal(snapshot["signature"], signature):
+                    return False
+                self.counts = snapshot["counts"]
+                self.sums = snapshot["sums"]
+                self.activity = snapshot["activity"]
+                self.t0, self.clock = (float(value) for value in snapshot["clock"])
+                self.signature = signature
+            self.refresh_prior()
+            return True
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning(f"popularity snapshot load failed: {e}")
+            return False
+
+    def refresh_prior(self):
+        # 전체 평균 평점이 바뀌면 모든 베이즈 평균이 조금씩 움직이므로 순위를 전부 다시 만든다
+        total = self.counts.sum()
+        self.prior_mean = float(self.sums.sum() / total) if total else 0.0
+        for top in self._tops.values():
+            top.stale = True
+
+    def _grow(self, movieId: int):
+        size = max(movieId + 1, 2 * len(self.counts))
+        self.counts = np.pad(self.counts, (0, size - len(self.counts)))
+        self.sums = np.pad(self.sums, (0, size - len(self.sums)))
+        self.activity = np.pad(self.activity, (0, size - len(self.activity)))
+
+    def _bayesian(self, movieId: int) -> float:
+        return ((self.prior_count * self.prior_mean + self.sums[movieId])
+                / (self.prior_count + self.counts[movieId]))
+
+    def record(self, events: List[RatingEvent]):
+        """
+        Apply committed rating events. A new rating adds to the count, sum and activity;
+        a re-rate changes the sum and moves its activity term to the new timestamp,
+        so the arrays always equal a rebuild from the ratings table.
+        """
+        if not self.ready:
+            if self._building:
+                self._events_during_build += len(events)
+            return
+        for _, movieId, rating, timestamp, previous in events:
+            if movieId >= len(self.counts):
+                self._grow(movieId)
+            if timestamp > self.clock:
+                self.clock = float(timestamp)
+                self.signature[1] = max(self.signature[1], int(timestamp))
+            if self.decay_rate * (timestamp - self.t0) > _REBASE_EXPONENT:
+                # 기준 시각을 옮겨도 모든 영화가 같은 비율로 줄어 순위는 그대로, 힙의 점수만 다시 만든다
+                self.activity *= math.exp(-self.decay_rate * (timestamp - self.t0))
+                self.t0 = float(timestamp)
+                for (kind, _), top in self._tops.items():
+                    if kind == "trending":
+                        top.stale = True
+
+            old_popular, old_activity = self._bayesian(movieId), self.activity[movieId]
+            if previous is None:
+                self.counts[movieId] += 1
+                self.sums[movieId] += rating
+                self.signature[0] += 1
+            else:
+                previous_rating, previous_timestamp = previous
+                self.sums[movieId] += rating - previous_rating
+                self.activity[movieId] -= math.exp(self.decay_rate * (previous_timestamp - self.t0))
+            self.activity[movieId] += math.exp(self.decay_rate * (timestamp - self.t0))
+
+            record = movie_catalog.get(movieId)
+            genres = record.genres if record is not None else ()
+            new_popular, new_activity = self._bayesian(movieId), self.activity[movieId]
+            for genre in (None, *genres):
+                if ("popular", genre) in self._tops:
+                    self._tops[("popular", genre)].offer(movieId, new_popular, old_popular)
+                if ("trending", genre) in self._tops:
+                    self._tops[("trending", genre)].offer(movieId, new_activity, old_activity)
+        self.dirty = True
+
+    def _genre_mask(self, genre: Optional[str]) -> Optional[np.ndarray]:
+        # movieId로 인덱싱한 bool 마스크, 카탈로그의 장르 비트마스크 배열에서 한 번에 만든다
+        movie_ids, masks = movie_catalog.genre_arrays()
+        if len(movie_ids) and movie_ids[-1] >= len(self.counts):
+            self._grow(int(movie_ids[-1]))
+        if genre is not None:
+            bit = GENRE_BITS.get(genre)
+            if bit is None:
+                return None
+            movie_ids = movie_ids[(masks & bit) != 0]
+        selected = np.zeros(len(self.counts), dtype=bool)
+        selected[movie_ids] = True
+        return selected
+
+    def _rebuild_top(self, kind: str, genre: Optional[str]) -> TopK:
+        top = self._tops.setdefault((kind, genre), TopK(self.top_k))
+        mask = self._genre_mask(genre)
+        if kind == "popular":
+            scores = (self.prior_count * self.prior_mean + self.sums) / (self.prior_count + self.counts)
+        else:
+            scores = self.activity
+        candidates = np.flatnonzero(mask) if mask is not None else np.zeros(0, dtype=np.int64)
+        if kind == "trending":
+            candidates = candidates[scores[candidates] > 0]
+        if len(candidates) > self.top_k:
+            best = np.argpartition(-scores[candidates], self.top_k - 1)[:self.top_k]
+            candidates = candidates[best]
+        top.reset(candidates.tolist(), scores[candidates].tolist())
+        return top
+
+    def ranking(self, kind: str, genre: Optional[str] = None, limit: int = 10) -> List[dict]:
+        top = self._tops.get((kind, genre))
+        if top is None or top.stale:
+            top = self._rebuild_top(kind, genre)
+        decay = math.exp(-self.decay_rate * (self.clock - self.t0))
+        movies = []
+        for movieId in top.ranked()[:limit]:
+            record = movie_catalog.get(movieId)
+            if record is None:
+                continue
+            count = int(self.counts[movieId])
+            movies.append({"movieId": movieId,
+                           "title": record.title,
+                           "genre": record.genre,
+                           "rating": round(float(self.sums[movieId]) / count, 1) if count else None,
+                           "ratingCount": count,
+                           "bayesianRating": round(float(self._bayesian(movieId)), 3),
+                           "trendScore": round(float(self.activity[movieId]) * decay, 4)})
+        return movies
+
+    async def warm_up(self, session_maker):
+        # 스냅샷이 없으면 ratings 전체를 읽으므로 시작을 막지 않게 백그라운드에서
+        try:
+            async with session_maker() as db:
+                await self.ensure_ready(db)
+        except Exception as e:
+            logger.warning(f"popularity warm-up failed, will retry on first request: {e}")
+
+    async def snapshot_loop(self, interval: float = POPULARITY_SNAPSHOT_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            if self.dirty:
+                self.refresh_prior()
+                self.save_snapshot()
+
+
+popularity_index = PopularityIndex()
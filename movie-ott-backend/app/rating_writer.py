@@ -0,0 +1,173 @@
+# 평점 쓰기: upsert + group commit
+# 한 트랜잭션에 여러 평점을 모아 COMMIT(fsync) 한 번으로 저장한다. 같은 (userId, movieId)를 다시 매기면
+# 기존 값을 바꾸고 movie_stats에는 개수 변화 없이 (새 평점 - 이전 평점)만 더한다.
+import asyncio
+import logging
+import os
+from typing import Dict, List, Tuple
+from fastapi import HTTPException
+from sqlalchemy import delete, insert, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import async_session_maker
+from models import Ratings
+from movie_stats import apply_rating_deltas
+from popularity import popularity_index
+from user_profiles import user_profiles
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+RATING_GROUP_COMMIT = os.getenv("RATING_GROUP_COMMIT", "0") == "1"  # /api/ratings 단건 요청을 모아서 쓸지
+RATING_FLUSH_MS = float(os.getenv("RATING_FLUSH_MS", "5"))  # 첫 요청 후 같은 묶음으로 기다리는 시간
+RATING_FLUSH_MAX = int(os.getenv("RATING_FLUSH_MAX", "1000"))  # 한 번에 COMMIT할 최대 평점 수
+RATING_BUFFER_MAX_PENDING = int(os.getenv("RATING_BUFFER_MAX_PENDING", "20000"))  # 넘으면 503
+MAX_BULK_RATINGS = int(os.getenv("MAX_BULK_RATINGS", "10000"))  # /api/ratings/bulk 한 요청의 최대 개수
+_LOOKUP_CHUNK = 400  # (userId, movieId) IN 목록 하나에 넣는 쌍 수, SQLite 변수 개수 제한 아래로
+
+RATING_BATCH_SIZE = metrics.histogram(
+    "rating_commit_batch_size", "Ratings written per COMMIT", (),
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000, 10000))
+
+
+async def upsert_ratings(db: AsyncSession, ratings: list, events: list = None) -> Dict[str, int]:
+    """
+    Insert or replace ratings and update movie_stats and user profiles in the caller's transaction (no commit).
+    Later entries for the same (userId, movieId) win. Returns inserted / updated counts.
+    If `events` is given, (userId, movieId, rating, timestamp, previous (rating, timestamp) or None)
+    is appended per row.
+    """
+    rows: Dict[Tuple[int, int], dict] = {}
+    for rating in ratings:
+        rows[(rating.userId, rating.movieId)] = {"userId": rating.userId, "movieId": rating.movieId,
+                                                 "rating": rating.rating, "timestamp": rating.timestamp}
+    if not rows:
+        return {"inserted": 0, "updated": 0}
+
+    # 이전 평점은 DELETE ... RETURNING으로 지우면서 읽는다. 첫 문장이 쓰기라 이 트랜잭션이 쓰기 락을 먼저 잡으므로
+    # 동시에 같은 평점을 바꾸는 요청이 있어도 movie_stats 차이 계산이 어긋나지 않는다.
+    previous: Dict[Tuple[int, int], Tuple[float, int]] = {}
+    keys = list(rows)
+    for start in range(0, len(keys), _LOOKUP_CHUNK):
+        results = await db.execute(
+            delete(Ratings)
+            .where(tuple_(Ratings.userId, Ratings.movieId).in_(keys[start:start + _LOOKUP_CHUNK]))
+            .returning(Ratings.userId, Ratings.movieId, Ratings.rating, Ratings.timestamp)
+        )
+        previous.update(((row.userId, row.movieId), (row.rating, row.timestamp)) for row in results.all())
+    await db.execute(insert(Ratings), list(rows.values()))
+
+    deltas: Dict[int, List] = {}
+    new_events = []
+    for key, row in rows.items():
+        delta = deltas.setdefault(row["movieId"], [0, 0.0])
+        if key in previous:
+            delta[1] += row["rating"] - previous[key][0]  # 다시 매긴 평점은 개수는 그대로, 합계만 차이만큼
+        else:
+            delta[0] += 1
+            delta[1] += row["rating"]
+        new_events.append((row["userId"], row["movieId"], row["rating"], row["timestamp"], previous.get(key)))
+    await apply_rating_deltas(db, {movieId: tuple(delta) for movieId, delta in deltas.items()})
+    await user_profiles.apply(db, new_events)
+    if events is not None:
+        events.extend(new_events)
+    return {"inserted": len(rows) - len(previous), "updated": len(previous)}
+
+
+async def save_ratings(db: AsyncSession, ratings: list) -> Dict[str, int]:
+    # 한 트랜잭션 = COMMIT 한 번, 실패하면 전부 되돌린다
+    events = []
+    try:
+        counts = await upsert_ratings(db, ratings, events)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        # 롤백된 평점이 반영됐을 수 있는 메모리 프로필은 버린다
+        user_profiles.discard(rating.userId for rating in ratings)
+        raise
+    # 커밋된 평점만 인기/트렌딩 배열에 반영한다
+    popularity_index.record(events)
+    RATING_BATCH_SIZE.observe(len(ratings))
+    return counts
+
+
+class RatingWriteBuffer:
+    """
+    Write-behind buffer for single-rating requests. Ratings submitted within RATING_FLUSH_MS of
+    each other are committed in one transaction; each caller's future resolves only after that
+    COMMIT, so the acknowledgment still means the rating is stored.
+    """
+    def __init__(self, flush_ms: float = RATING_FLUSH_MS, max_batch: int = RATING_FLUSH_MAX,
+                 max_pending: int = RATING_BUFFER_MAX_PENDING, enabled: bool = RATING_GROUP_COMMIT):
+        self.flush_ms = flush_ms
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.enabled = enabled
+        self.flushes = 0
+        self._closing = False
+        self._pending: List[Tuple[object, asyncio.Future]] = []
+        self._wakeup: asyncio.Event = None
+        self._task: asyncio.Task = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def submit(self, rating) -> dict:
+        if len(self._pending) >= self.max_pending:
+            raise HTTPException(status_code=503, detail="평점 저장 요청이 많아 처리할 수 없습니다. 잠시 후 다시 시도해주세요")
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((rating, future))
+        self._wakeup.set()
+        return await future
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            # 첫 요청 후 flush_ms 동안 (또는 max_batch가 찰 때까지) 더 모은다
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.flush_ms / 1000
+            while not self._closing and len(self._pending) < self.max_batch and loop.time() < deadline:
+                await asyncio.sleep(min(0.001, max(deadline - loop.time(), 0)))
+            while self._pending:
+                batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+                await self._flush(batch)
+            if self._closing:
+                return
+
+    async def _flush(self, batch: List[Tuple[object, asyncio.Future]]):
+        self.flushes += 1
+        try:
+            async with async_session_maker() as db:
+                await save_ratings(db, [rating for rating, _ in batch])
+        except Exception as e:
+            # 묶음 하나가 실패하면 한 건씩 다시 써서 문제 있는 요청만 실패시킨다
+            if len(batch) > 1:
+                logger.warning(f"Group commit of {len(batch)} ratings failed, retrying one by one: {e}")
+                for item in batch:
+                    await self._flush([item])
+                return
+            _, future = batch[0]
+            if not future.done():
+                future.set_exception(e)
+            return
+        for _, future in batch:
+            if not future.done():
+                future.set_result({"message": "Rating added successfully"})
+
+    async def close(self):
+        # 종료 시 진행 중인 COMMIT과 남은 평점을 마저 쓰고 끝낸다
+        if self._task is None or self._task.done():
+            return
+        self._closing = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+        self._closing = False
+
+
+rating_buffer = RatingWriteBuffer()
+metrics.gauge("rating_buffer_pending", "Ratings waiting for a group commit", lambda: rating_buffer.pending)
@@ -0,0 +1,38 @@
+# ratings 전체를 NumPy 배열로 읽기 (인기 순위, item-item CF 빌드용)
+# AsyncSession으로 .all()을 하면 수백만 개 Row를 만들고 배열로 바꾸는 일이 이벤트 루프에서 돌아
+# 그동안 요청을 처리하지 못한다. 같은 DB 파일에 별도 sqlite3 연결을 열어 읽기와 변환을 모두 스레드에서 한다.
+import asyncio
+import os
+import sqlite3
+from typing import List, Sequence
+import numpy as np
+from sqlalchemy import select
+from database import engine
+
+RATINGS_READ_CHUNK = int(os.getenv("RATINGS_READ_CHUNK", "10000"))  # fetchmany 한 번에 읽는 행 수, 클수록 GIL을 오래 잡는다
+
+
+def _read_columns(sql: str, dtypes: Sequence, chunk: int) -> List[np.ndarray]:
+    parts = [[] for _ in dtypes]
+    conn = sqlite3.connect(engine.url.database)
+    try:
+        cursor = conn.execute(sql)
+        while True:
+            rows = cursor.fetchmany(chunk)
+            if not rows:
+                break
+            block = np.array(rows, dtype=np.float64)
+            for i, dtype in enumerate(dtypes):
+                parts[i].append(block[:, i].astype(dtype))
+    finally:
+        conn.close()
+    return [np.concatenate(part) if part else np.empty(0, dtype=dtype) for part, dtype in zip(parts, dtypes)]
+
+
+async def read_columns(columns: Sequence, dtypes: Sequence, chunk: int = RATINGS_READ_CHUNK) -> List[np.ndarray]:
+    """
+    The given numeric columns of every row as NumPy arrays (one per column, in order).
+    Reads committed data on its own connection in a worker thread, outside any session's transaction.
+    """
+    sql = str(select(*columns).compile(dialect=engine.dialect))
+    return await asyncio.to_thread(_read_columns, sql, dtypes, chunk)
@@ -0,0 +1,113 @@
+# LLM 추천 결과 캐시
+# 같은 프롬프트(평점 히스토리 + 후보 목록 + 모델)면 모델을 다시 부르지 않고 저장된 응답을 쓴다.
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import RecommendCache
+
+RECOMMEND_CACHE_SIZE = int(os.getenv("RECOMMEND_CACHE_SIZE", "1024"))  # 메모리 LRU 최대 항목 수
+RECOMMEND_CACHE_TTL = float(os.getenv("RECOMMEND_CACHE_TTL", "86400"))  # 초
+RECOMMEND_CACHE_PERSIST = os.getenv("RECOMMEND_CACHE_PERSIST", "1") == "1"  # SQLite에도 저장할지
+
+
+class RecommendationResultCache:
+    """
+    LRU + TTL cache of parsed LLM responses, optionally backed by the recommend_cache table
+    so entries survive restarts and are shared between workers.
+    """
+    def __init__(self, max_entries: int = RECOMMEND_CACHE_SIZE, ttl: float = RECOMMEND_CACHE_TTL,
+                 persist: bool = RECOMMEND_CACHE_PERSIST):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.persist = persist
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (저장 시각, 응답)
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(filled_template: str, movie_candidates: str, model_name: str) -> str:
+        digest = hashlib.sha256()
+        for part in (model_name, filled_template, movie_candidates):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\x00")
+        return digest.hexdigest()
+
+    def _remember(self, key: str, created_at: float, value: dict):
+        self._entries[key] = (created_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get(self, key: str, db: AsyncSession) -> Optional[dict]:
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            created_at, value = entry
+            if now - created_at <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+
+        if self.persist:
+            row = (await db.execute(
+                select(RecommendCache.response, RecommendCache.createdAt)
+                .where(RecommendCache.cacheKey == key)
+                .where(RecommendCache.createdAt >= now - self.ttl)
+            )).first()
+            if row is not None:
+                value = json.loads(row.response)
+                self._remember(key, row.createdAt, value)
+                self.hits += 1
+                self.persistent_hits += 1
+                return value
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: dict, model_name: str, db: AsyncSession):
+        created_at = time.time()
+        self._remember(key, created_at, value)
+        if self.persist:
+            stmt = sqlite_insert(RecommendCache).values(cacheKey=key, modelName=model_name,
+                                                        response=json.dumps(value, ensure_ascii=False),
+                                                        createdAt=created_at)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[RecommendCache.cacheKey],
+                set_={"response": stmt.excluded.response, "createdAt": stmt.excluded.createdAt}
+            )
+            await db.execute(stmt)
+            await db.commit()
+
+    async def prune(self, db: AsyncSession):
+        # 시작 시 만료된 영구 캐시 행 정리
+        if self.persist:
+            await db.execute(delete(RecommendCache).where(RecommendCache.createdAt < time.time() - self.ttl))
+            await db.commit()
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "persist": self.persist,
+                "hits": self.hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0}
+
+
+recommend_cache = RecommendationResultCache()
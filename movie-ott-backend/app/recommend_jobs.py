@@ -0,0 +1,347 @@
+# 비동기 추천 작업: POST /api/recommend?mode=job은 작업을 큐에 넣고 202 + jobId로 바로 응답하고,
+# 프로세스 안의 worker들이 recommend_func를 실행해 결과를 저장한다. 클라이언트는 GET으로 상태/결과를 읽는다.
+# 큐는 JobQueue 인터페이스로 바꿔 끼울 수 있고, 기본 구현은 SQLite 테이블(recommend_jobs)이다.
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from abc import ABC, abstractmethod
+from types import SimpleNamespace
+from typing import Dict, Optional, Tuple, Type
+from fastapi import HTTPException
+from sqlalchemy import select, update, delete, func, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from database import async_session_maker
+from models import RecommendJobs
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+RECOMMEND_JOB_QUEUE = os.getenv("RECOMMEND_JOB_QUEUE", "sqlite")
+RECOMMEND_JOB_WORKERS = int(os.getenv("RECOMMEND_JOB_WORKERS", "4"))  # 이 프로세스의 worker 수, 0이면 실행 안 함
+# 다른 프로세스가 넣은 작업을 확인하는 주기 (초), 이 프로세스에서 넣은 작업은 바로 깨운다
+RECOMMEND_JOB_POLL = float(os.getenv("RECOMMEND_JOB_POLL", "5"))
+RECOMMEND_JOB_LEASE = float(os.getenv("RECOMMEND_JOB_LEASE", "300"))  # running이 이보다 오래되면 죽은 worker로 본다 (초)
+RECOMMEND_JOB_MAX_ATTEMPTS = int(os.getenv("RECOMMEND_JOB_MAX_ATTEMPTS", "3"))
+RECOMMEND_JOB_RETENTION = float(os.getenv("RECOMMEND_JOB_RETENTION", "86400"))  # 끝난 작업을 보관하는 시간 (초)
+RECOMMEND_JOB_MAINTENANCE_INTERVAL = float(os.getenv("RECOMMEND_JOB_MAINTENANCE_INTERVAL", "60"))
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+# 진행 중인 작업, ux_recommend_jobs_active 부분 유니크 인덱스의 조건과 같다
+ACTIVE = text("status IN ('queued', 'running')")
+
+JOB_OUTCOMES = metrics.counter("recommend_jobs_total", "Recommendation jobs by outcome", ("outcome",))
+
+jobs = RecommendJobs.__table__
+
+
+class JobQueue(ABC):
+    """
+    Storage for recommendation jobs. Jobs are plain dicts with the recommend_jobs columns.
+    enqueue() returns the in-flight job for the same user and recommender instead of a new one.
+    """
+    name = "base"
+
+    @abstractmethod
+    async def enqueue(self, userId: int, recommender: str) -> Tuple[dict, bool]:
+        """
+        Add a queued job, or return (in-flight job, True) if one exists for the user and recommender.
+        """
+
+    @abstractmethod
+    async def claim(self) -> Optional[dict]:
+        """
+        Mark the oldest queued job running and return it, or None if the queue is empty.
+        """
+
+    @abstractmethod
+    async def complete(self, jobId: str, result: dict):
+        """
+        Store the result of a running job and mark it done.
+        """
+
+    @abstractmethod
+    async def fail(self, jobId: str, error: str, status_code: int):
+        """
+        Mark a job failed with an error message and the HTTP status to report.
+        """
+
+    @abstractmethod
+    async def requeue(self, jobId: str):
+        """
+        Put a running job back in the queue (its worker was stopped).
+        """
+
+    @abstractmethod
+    async def get(self, jobId: str) -> Optional[dict]:
+        """
+        The job with this id, or None.
+        """
+
+    @abstractmethod
+    async def depth(self) -> int:
+        """
+        Number of queued jobs.
+        """
+
+    async def maintain(self, lease: float, max_attempts: int, retention: float) -> Dict[str, int]:
+        # 오래 running인 작업 되살리기, 끝난 지 오래된 작업 지우기
+        return {}
+
+
+class SQLiteJobQueue(JobQueue):
+    """
+    Jobs in the recommend_jobs table, shared by every worker process on the same database file.
+    A job is claimed with a single UPDATE ... RETURNING, so two workers never run the same job;
+    polling an empty queue is a read-only SELECT and never takes the write lock.
+    """
+    name = "sqlite"
+
+    def __init__(self, session_maker=async_session_maker):
+        self.session_maker = session_maker
+
+    async def enqueue(self, userId: int, recommender: str) -> Tuple[dict, bool]:
+        async with self.session_maker() as db:
+            for _ in range(3):
+                job = {"jobId": uuid.uuid4().hex, "userId": userId, "recommender": recommender,
+                       "status": QUEUED, "attempts": 0, "createdAt": time.time()}
+                # 진행 중인 같은 작업이 있으면 부분 유니크 인덱스에 걸려 아무것도 넣지 않는다
+                results = await db.execute(sqlite_insert(jobs).values(**job).on_conflict_do_nothing())
+                if results.rowcount:
+                    await db.commit()
+                    return job, False
+                active = (await db.execute(
+                    select(jobs).where(jobs.c.userId == userId, jobs.c.recommender == recommender, ACTIVE)
+                )).mappings().first()
+                await db.commit()
+                if active is not None:
+                    return dict(active), True
+                # 그 사이에 진행 중이던 작업이 끝났다, 다시 넣는다
+            raise HTTPException(status_code=503, detail="추천 작업을 등록할 수 없습니다. 잠시 후 다시 시도해주세요")
+
+    async def claim(self) -> Optional[dict]:
+        oldest = select(jobs.c.jobId).where(jobs.c.status == QUEUED).order_by(jobs.c.createdAt).limit(1)
+        async with self.session_maker() as db:
+            for _ in range(3):
+                # 큐가 비어 있으면 읽기만 하고 끝낸다, 쓰기 락은 가져갈 작업이 있을 때만 잡는다
+                jobId = (await db.execute(oldest)).scalar()
+                await db.commit()
+                if jobId is None:
+                    return None
+                results = await db.execute(
+                    update(jobs)
+                    .where(jobs.c.jobId == jobId, jobs.c.status == QUEUED)
+                    # 쓰기 락을 기다리는 사이에 들어온 작업일 수 있으니 createdAt보다 앞서지 않게
+                    .values(status=RUNNING, startedAt=func.max(jobs.c.createdAt, time.time()),
+                            attempts=jobs.c.attempts + 1)
+                    .returning(*jobs.c)
+                )
+                job = results.mappings().first()
+                await db.commit()
+                if job is not None:
+                    return dict(job)
+                # 다른 worker가 먼저 가져갔다, 다음 작업을 본다
+        return None
+
+    async def _finish(self, jobId: str, **values):
+        async with self.session_maker() as db:
+            await db.execute(update(jobs).where(jobs.c.jobId == jobId).values(finishedAt=time.time(), **values))
+            await db.commit()
+
+    async def complete(self, jobId: str, result: dict):
+        await self._finish(jobId, status=DONE, result=json.dumps(result, ensure_ascii=False))
+
+    async def fail(self, jobId: str, error: str, status_code: int):
+        await self._finish(jobId, status=FAILED, error=error, errorStatus=status_code)
+
+    async def requeue(self, jobId: str):
+        async with self.session_maker() as db:
+            await db.execute(update(jobs).where(jobs.c.jobId == jobId, jobs.c.status == RUNNING)
+                             .values(status=QUEUED, startedAt=None))
+            await db.commit()
+
+    async def get(self, jobId: str) -> Optional[dict]:
+        async with self.session_maker() as db:
+            job = (await db.execute(select(jobs).where(jobs.c.jobId == jobId))).mappings().first()
+        return dict(job) if job is not None else None
+
+    async def depth(self) -> int:
+        async with self.session_maker() as db:
+            return (await db.execute(select(func.count()).where(jobs.c.status == QUEUED))).scalar()
+
+    async def maintain(self, lease: float, max_attempts: int, retention: float) -> Dict[str, int]:
+        now = time.time()
+        stale = (jobs.c.status == RUNNING) & (jobs.c.startedAt < now - lease)
+        async with self.session_maker() as db:
+            failed = await db.execute(
+                update(jobs).where(stale, jobs.c.attempts >= max_attempts)
+                .values(status=FAILED, finishedAt=now, error="작업 시간이 초과되었습니다", errorStatus=504))
+            requeued = await db.execute(update(jobs).where(stale).values(status=QUEUED, startedAt=None))
+            pruned = await db.execute(delete(jobs).where(jobs.c.status.in_((DONE, FAILED)),
+                                                         jobs.c.createdAt < now - retention))
+            await db.commit()
+        return {"failed": failed.rowcount, "requeued": requeued.rowcount, "pruned": pruned.rowcount}
+
+
+JOB_QUEUES: Dict[str, Type[JobQueue]] = {SQLiteJobQueue.name: SQLiteJobQueue}
+
+
+def get_job_queue(name: str = RECOMMEND_JOB_QUEUE) -> JobQueue:
+    if name not in JOB_QUEUES:
+        raise ValueError(f"Unknown recommendation job queue: {name} (available: {', '.join(JOB_QUEUES)})")
+    return JOB_QUEUES[name]()
+
+
+def job_status(job: dict) -> dict:
+    # 응답용, 결과 본문은 /result에서만 준다
+    return {"jobId": job["jobId"],
+            "userId": job["userId"],
+            "recommender": job["recommender"],
+            "status": job["status"],
+            "attempts": job["attempts"],
+            "createdAt": job["createdAt"],
+            "startedAt": job.get("startedAt"),
+            "finishedAt": job.get("finishedAt"),
+            "error": job.get("error")}
+
+
+class RecommendJobWorkers:
+    """
+    Pool of in-process async workers that claim jobs from the queue and run recommend_func.
+    Enqueueing wakes an idle worker right away; jobs added by other processes are picked up
+    within RECOMMEND_JOB_POLL seconds.
+    """
+    def __init__(self, queue: JobQueue, n_workers: int = RECOMMEND_JOB_WORKERS,
+                 poll_interval: float = RECOMMEND_JOB_POLL, session_maker=async_session_maker):
+        self.queue = queue
+        self.n_workers = n_workers
+        self.poll_interval = poll_interval
+        self.session_maker = session_maker
+        self.busy = 0
+        self.queue_depth = 0  # 마지막으로 센 queued 작업 수
+        self._wakeup: asyncio.Event = None
+        self._tasks = []
+
+    @property
+    def utilization(self) -> float:
+        return self.busy / self.n_workers if self.n_workers else 0.0
+
+    async def submit(self, userId: int, recommender: str) -> Tuple[dict, bool]:
+        job, coalesced = await self.queue.enqueue(userId, recommender)
+        JOB_OUTCOMES.inc("coalesced" if coalesced else "queued")
+        if self._wakeup is not None:
+            self._wakeup.set()
+        await self._refresh_depth()
+        return job, coalesced
+
+    async def _refresh_depth(self):
+        # 게이지용 값이라 실패해도 마지막 값을 그대로 둔다
+        try:
+            self.queue_depth = await self.queue.depth()
+        except Exception as e:
+            logger.error(f"Recommendation job queue depth error: {str(e)}")
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        for _ in range(self.n_workers):
+            self._spawn(self._work)
+        self._spawn(self._maintain)
+
+    def _spawn(self, loop_fn):
+        task = asyncio.create_task(loop_fn())
+        task.add_done_callback(lambda done: self._restart(done, loop_fn))
+        self._tasks.append(task)
+
+    def _restart(self, task: asyncio.Task, loop_fn):
+        # 루프 안에서 잡지 못한 예외로 worker가 죽으면 새로 띄운다, close()로 취소된 것은 그대로 둔다
+        if task in self._tasks:
+            self._tasks.remove(task)
+        if task.cancelled():
+            return
+        logger.error(f"Recommendation job {loop_fn.__name__} task died, restarting: {task.exception()!r}")
+        self._spawn(loop_fn)
+
+    async def close(self):
+        # 실행 중이던 작업은 queued로 되돌려 다른 worker(또는 재시작 후)가 이어서 한다
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _work(self):
+        # 큐 오류(SQLITE_BUSY 등)가 나도 worker는 로그만 남기고 다음 작업으로 넘어간다
+        while True:
+            try:
+                job = await self.queue.claim()
+            except Exception as e:
+                logger.error(f"Recommendation job claim error: {str(e)}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+            self.busy += 1
+            try:
+                await self._run(job)
+            except Exception as e:
+                # 결과를 저장하지 못한 작업은 running으로 남고, lease가 지나면 maintain이 다시 queued로 돌린다
+                logger.error(f"Recommendation job {job['jobId']} could not be saved: {str(e)}")
+            finally:
+                self.busy -= 1
+            await self._refresh_depth()
+
+    async def _run(self, job: dict):
+        from llm_recommend import recommend_func
+
+        request = SimpleNamespace(userId=str(job["userId"]), recommender=job["recommender"])
+        try:
+            async with self.session_maker() as db:
+                result = await recommend_func(request, db)
+        except asyncio.CancelledError:
+            try:
+                await self.queue.requeue(job["jobId"])
+            except Exception as e:
+                logger.error(f"Recommendation job {job['jobId']} requeue error: {str(e)}")
+            raise
+        except HTTPException as e:
+            JOB_OUTCOMES.inc(FAILED)
+            await self.queue.fail(job["jobId"], str(e.detail), e.status_code)
+        except Exception as e:
+            logger.exception(f"Recommendation job {job['jobId']} failed: {str(e)}")
+            JOB_OUTCOMES.inc(FAILED)
+            await self.queue.fail(job["jobId"], "추천 생성 중 오류가 발생했습니다", 500)
+        else:
+            JOB_OUTCOMES.inc(DONE)
+            await self.queue.complete(job["jobId"], result)
+
+    async def _maintain(self):
+        while True:
+            try:
+                counts = await self.queue.maintain(RECOMMEND_JOB_LEASE, RECOMMEND_JOB_MAX_ATTEMPTS,
+                                                   RECOMMEND_JOB_RETENTION)
+                if any(counts.values()):
+                    logger.info(f"Recommendation job maintenance: {counts}")
+                    self._wakeup.set()
+                await self._refresh_depth()
+            except Exception as e:
+                logger.error(f"Recommendation job maintenance error: {str(e)}")
+            await asyncio.sleep(RECOMMEND_JOB_MAINTENANCE_INTERVAL)
+
+    def stats(self):
+        return {"queue": self.queue.name,
+                "workers": self.n_workers,
+                "busy": self.busy,
+                "utilization": round(self.utilization, 3),
+                "queued": self.queue_depth}
+
+
+recommend_jobs = RecommendJobWorkers(get_job_queue())
+metrics.gauge("recommend_job_queue_depth", "Recommendation jobs waiting for a worker", lambda: recommend_jobs.queue_depth)
+metrics.gauge("recommend_job_workers_busy", "Recommendation job workers running a job", lambda: recommend_jobs.busy)
+metrics.gauge("recommend_job_worker_utilization", "Share of recommendation job workers that are busy",
+              lambda: recommend_jobs.utilization)
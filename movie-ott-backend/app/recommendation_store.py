@@ -0,0 +1,121 @@
+# 추천 결과 저장: run 단위 upsert, 유저별 최신 run 조회, 오래된 run 정리(compaction)
+# 추천 요청 한 번마다 runId를 하나 만들고, 같은 runId를 다시 쓰면 그 run의 이전 항목을 지우고 새로 넣는다.
+import asyncio
+import logging
+import os
+import time
+import uuid
+from typing import List, Optional
+from sqlalchemy import select, desc, delete, func, or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import RecommendationRuns, Recommendations
+
+logger = logging.getLogger(__name__)
+
+RECOMMENDATION_RUNS_KEEP = int(os.getenv("RECOMMENDATION_RUNS_KEEP", "10"))  # 유저별로 남길 최근 run 수
+RECOMMENDATION_RETENTION_DAYS = float(os.getenv("RECOMMENDATION_RETENTION_DAYS", "0"))  # 0이면 기간 제한 없음
+RECOMMENDATION_COMPACT_INTERVAL = float(os.getenv("RECOMMENDATION_COMPACT_INTERVAL", "3600"))  # 초, 0이면 끔
+COMPACT_CHUNK = 500  # 트랜잭션 하나에서 지우는 run 수, 쓰기 락을 오래 잡지 않도록
+
+
+def new_run_id() -> str:
+    return uuid.uuid4().hex
+
+
+def run_rows(runId: str, userId: int, movies: List[dict], recommenderId: int, recommenderName: str,
+             created_at: float = None):
+    """
+    (run row, item rows) for one recommendation run. movies are dicts with movieId and rating.
+    """
+    created_at = time.time() if created_at is None else created_at
+    run = {"runId": runId, "userId": userId, "recommenderId": recommenderId,
+           "recommenderName": recommenderName, "createdAt": created_at, "itemCount": len(movies)}
+    items = [{"runId": runId,
+              "movieId": movie['movieId'],
+              "userId": userId,
+              "rank": rank,
+              "meanRating": movie['rating'] if movie['rating'] is not None else 0.0,  # 평점이 없는 영화는 0.0
+              "timestamp": str(movie.get('timestamp', created_at)),
+              "recommenderId": recommenderId,
+              "recommenderName": recommenderName}
+             for rank, movie in enumerate(movies)]
+    return run, items
+
+
+async def upsert_runs(db: AsyncSession, runs: List[dict], items: List[dict]):
+    """
+    Bulk upsert of runs and their items in the caller's transaction (no commit).
+    Writing the same runId again replaces its items instead of failing or mixing old and new movies.
+    """
+    # 다시 쓰는 run은 이전 항목을 먼저 지운다 (batch_recommend --resume은 runId를 다시 만든다)
+    run_ids = list({run["runId"] for run in runs} | {item["runId"] for item in items})
+    for start in range(0, len(run_ids), COMPACT_CHUNK):
+        await db.execute(delete(Recommendations)
+                         .where(Recommendations.runId.in_(run_ids[start:start + COMPACT_CHUNK])))
+    if runs:
+        stmt = sqlite_insert(RecommendationRuns)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[RecommendationRuns.runId],
+            set_={"itemCount": stmt.excluded.itemCount, "createdAt": stmt.excluded.createdAt}
+        )
+        await db.execute(stmt, runs)
+    if items:
+        stmt = sqlite_insert(Recommendations)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Recommendations.runId, Recommendations.movieId],
+            set_={"rank": stmt.excluded.rank, "meanRating": stmt.excluded.meanRating,
+                  "timestamp": stmt.excluded.timestamp}
+        )
+        await db.execute(stmt, items)
+
+
+async def latest_run_id(db: AsyncSession, userId: int) -> Optional[str]:
+    # ix_recommendation_runs_userId_createdAt에서 한 행만 읽는다
+    results = await db.execute(
+        select(RecommendationRuns.runId)
+        .where(RecommendationRuns.userId == userId)
+        .order_by(desc(RecommendationRuns.createdAt))
+        .limit(1)
+    )
+    return results.scalar()
+
+
+async def compact_recommendations(db: AsyncSession, keep: int = RECOMMENDATION_RUNS_KEEP,
+                                  retention_days: float = RECOMMENDATION_RETENTION_DAYS) -> int:
+    """
+    Delete runs beyond the newest `keep` per user, and runs older than `retention_days`
+    (the latest run of a user is always kept). Returns the number of runs removed.
+    """
+    newest_first = func.row_number().over(partition_by=RecommendationRuns.userId,
+                                          order_by=desc(RecommendationRuns.createdAt)).label("position")
+    ranked = select(RecommendationRuns.runId, RecommendationRuns.createdAt, newest_first).subquery()
+    expired = ranked.c.position > keep
+    if retention_days > 0:
+        cutoff = time.time() - retention_days * 86400
+        expired = or_(expired, (ranked.c.createdAt < cutoff) & (ranked.c.position > 1))
+
+    removed = 0
+    while True:
+        results = await db.execute(select(ranked.c.runId).where(expired).limit(COMPACT_CHUNK))
+        run_ids = results.scalars().all()
+        if not run_ids:
+            return removed
+        await db.execute(delete(Recommendations).where(Recommendations.runId.in_(run_ids)))
+        await db.execute(delete(RecommendationRuns).where(RecommendationRuns.runId.in_(run_ids)))
+        await db.commit()
+        removed += len(run_ids)
+
+
+async def compaction_loop(session_maker, interval: float = RECOMMENDATION_COMPACT_INTERVAL):
+    # 서버가 떠 있는 동안 주기적으로 정리한다, 실패해도 다음 주기에 다시 시도
+    while True:
+        try:
+            async with session_maker() as db:
+                start = time.perf_counter()
+                removed = await compact_recommendations(db)
+            if removed:
+                logger.info(f"Compacted {removed} old recommendation runs in {time.perf_counter() - start:.2f}s")
+        except Exception as e:
+            logger.error(f"Recommendation compaction error: {str(e)}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,88 @@
+# /api/search용 메모리 역색인
+# 제목/장르를 단어로 쪼개 정렬된 단어 목록에서 접두사 검색(type-ahead)을 하고 점수로 정렬한다.
+import heapq
+import re
+from bisect import bisect_left
+from typing import Dict, List, Tuple
+
+_WORD = re.compile(r"[^\W_]+")
+
+TITLE_WEIGHT = 2.0
+GENRE_WEIGHT = 1.0
+PREFIX_PENALTY = 0.7  # 단어 전체가 아닌 접두사로만 맞았을 때
+
+
+def tokenize(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+
+class MovieSearchIndex:
+    """
+    Inverted index term -> {movieId: weight} with a sorted term list for prefix lookup.
+    Every query word is matched as a prefix; all words must match (AND).
+    """
+    def __init__(self):
+        self.postings: Dict[str, Dict[int, float]] = {}
+        self.terms: List[str] = []
+        self.titles: Dict[int, str] = {}
+        self.doc_terms: Dict[int, Tuple[str, ...]] = {}
+
+    def _doc_terms(self, title: str, genre: str) -> Dict[str, float]:
+        weights: Dict[str, float] = {}
+        for term in tokenize(title):
+            weights[term] = max(weights.get(term, 0.0), TITLE_WEIGHT)
+        for term in tokenize(genre.replace("|", " ")):
+            weights[term] = max(weights.get(term, 0.0), GENRE_WEIGHT)
+        return weights
+
+    def build(self, movies):
+        self.postings, self.terms, self.titles, self.doc_terms = {}, [], {}, {}
+        for movie in movies:
+            self.titles[movie.movieId] = movie.title
+            weights = self._doc_terms(movie.title, movie.genre)
+            self.doc_terms[movie.movieId] = tuple(weights)
+            for term, weight in weights.items():
+                self.postings.setdefault(term, {})[movie.movieId] = weight
+        self.terms = sorted(self.postings)
+
+    def _prefix_terms(self, prefix: str) -> List[str]:
+        start = bisect_left(self.terms, prefix)
+        end = start
+        while end < len(self.terms) and self.terms[end].startswith(prefix):
+            end += 1
+        return self.terms[start:end]
+
+    def search(self, query: str, limit: int = 50, offset: int = 0) -> Tuple[List[int], int]:
+        """
+        Returns (movieIds for the requested page, total number of matches).
+        """
+        words = tokenize(query)
+        if not words:
+            return [], 0
+
+        scores: Dict[int, float] = None
+        for word in words:
+            word_scores: Dict[int, float] = {}
+            for term in self._prefix_terms(word):
+                factor = 1.0 if term == word else PREFIX_PENALTY
+                for movieId, weight in self.postings[term].items():
+                    score = weight * factor
+                    if score > word_scores.get(movieId, 0.0):
+                        word_scores[movieId] = score
+            if scores is None:
+                scores = word_scores
+            else:
+                scores = {movieId: score + word_scores[movieId]
+                          for movieId, score in scores.items() if movieId in word_scores}
+            if not scores:
+                return [], 0
+
+        titles = self.titles
+        key = lambda movieId: (-scores[movieId], len(titles[movieId]), movieId)
+        end = offset + limit
+        if end * 4 < len(scores):
+            # 앞쪽 페이지만 필요하면 전체 정렬 대신 heap으로 상위 end개만 뽑는다
+            ranked = heapq.nsmallest(end, scores, key=key)
+        else:
+            ranked = sorted(scores, key=key)
+        return ranked[offset:end], len(scores)
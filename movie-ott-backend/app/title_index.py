@@ -0,0 +1,210 @@
+# LLM이 돌려준 영화 제목 -> movieId 변환용 메모리 색인
+# 정규화한 제목으로 먼저 정확 일치를 찾고, 없으면 trigram 후보 + 편집 거리 비율로 가장 가까운 제목을 고른다.
+import os
+import re
+import heapq
+import unicodedata
+from collections import Counter
+from difflib import SequenceMatcher
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+TITLE_MATCH_THRESHOLD = float(os.getenv("TITLE_MATCH_THRESHOLD", "0.75"))  # 이보다 낮은 fuzzy 매치는 버린다
+FUZZY_CANDIDATES = 5  # 편집 거리까지 계산할 trigram 상위 후보 수
+COMMON_TRIGRAM_RATIO = 0.05  # 전체 제목의 5% 넘게 들어있는 trigram은 후보를 거의 못 줄이므로 건너뛴다
+AMBIGUOUS_CONFIDENCE = 0.5
+MIN_DELETE_KEY_LEN = 4  # 이보다 짧은 제목은 한 글자 삭제 색인에 넣지 않는다 (충돌이 너무 많다)
+
+# MovieLens는 "Matrix, The (1999)", "Associé, L' (1982)"처럼 관사를 뒤로 보낸다
+_ARTICLES = ("the", "a", "an", "les", "la", "le", "l'", "il", "lo", "gli", "das", "der", "die", "den", "det",
+             "el", "los", "las", "un", "une", "una")
+_TRAILING_ARTICLE = re.compile(r"^(.*),\s*(" + "|".join(re.escape(a) for a in _ARTICLES) + r")$")
+_LEADING_ARTICLE = re.compile(r"^(?:the|a|an)\s+")  # "Die Hard"의 die는 지우면 안 되므로 영어 관사만
+_YEAR = re.compile(r"\(\s*(\d{4})\s*\)\s*$")
+_PARENS = re.compile(r"\(([^()]*)\)")
+_NON_WORD = re.compile(r"[^0-9a-z']+")
+
+
+class TitleMatch(NamedTuple):
+    movieId: int
+    confidence: float  # 1.0 = 제목+연도 정확 일치
+    method: str        # 'exact' | 'normalized' | 'fuzzy'
+
+
+def _fold(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(ch for ch in text if not unicodedata.combining(ch)).replace("&", " and ")
+
+
+def _key(text: str) -> str:
+    # 관사 위치/유무, 문장 부호, 대소문자, 악센트 차이를 없앤 비교용 키
+    text = text.strip()
+    match = _TRAILING_ARTICLE.match(text)
+    if match:
+        article, rest = match.group(2), match.group(1)
+        text = f"{article}{rest}" if article.endswith("'") else f"{article} {rest}"
+    text = _NON_WORD.sub(" ", text).strip()
+    text = _LEADING_ARTICLE.sub("", text)
+    return " ".join(text.replace("'", "").split())
+
+
+def normalize_title(title: str) -> Tuple[str, Optional[int], List[str]]:
+    """
+    "City of Lost Children, The (Cité des enfants perdus, La) (1995)"
+      -> ("city of lost children", 1995, ["la cite des enfants perdus"])
+    Returns (key, year, alternate-title keys).
+    """
+    text = _fold(title)
+    year = None
+    match = _YEAR.search(text)
+    if match:
+        year = int(match.group(1))
+        text = text[:match.start()]
+    aliases = [_key(alias.replace("a.k.a.", "")) for alias in _PARENS.findall(text)]
+    text = _PARENS.sub(" ", text)
+    return _key(text), year, [alias for alias in aliases if alias]
+
+
+def _trigrams(key: str) -> set:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _deletes(key: str) -> set:
+    # 한 글자씩 지운 변형들, 질의와 제목 양쪽에서 만들면 편집 거리 1(삽입/삭제/치환/인접 교환)이 해시 조회로 잡힌다
+    return {key[:i] + key[i + 1:] for i in range(len(key))}
+
+
+class TitleResolver:
+    """
+    Normalized-title hash lookup, then a one-edit deletion index (SymSpell style), then a
+    trigram / edit-distance fallback for bigger differences.
+    resolve() maps a batch of free-form titles to movieIds with a confidence per title.
+    """
+    def __init__(self, threshold: float = TITLE_MATCH_THRESHOLD):
+        self.threshold = threshold
+        self.exact: Dict[str, int] = {}                        # 원래 제목 -> movieId
+        self.by_key: Dict[str, List[Tuple[int, Optional[int]]]] = {}  # 키 -> [(movieId, year)]
+        self.trigrams: Dict[str, set] = {}                     # trigram -> {키}
+        self.deletes: Dict[str, set] = {}                      # 한 글자 지운 키 -> {키}
+        self.doc_keys: Dict[int, Tuple[str, Tuple[str, ...]]] = {}    # movieId -> (원래 제목, 키들)
+
+    def build(self, movies):
+        self.exact, self.by_key, self.trigrams, self.deletes, self.doc_keys = {}, {}, {}, {}, {}
+        for movie in movies:
+            self.add(movie.movieId, movie.title)
+
+    def add(self, movieId: int, title: str):
+        if movieId in self.doc_keys:
+            self.remove(movieId)
+        key, year, aliases = normalize_title(title)
+        keys = tuple(dict.fromkeys(k for k in [key, *aliases] if k))
+        self.exact[title] = movieId
+        self.doc_keys[movieId] = (title, keys)
+        for k in keys:
+            entries = self.by_key.setdefault(k, [])
+            entries.append((movieId, year))
+            if len(entries) == 1:
+                for gram in _trigrams(k):
+                    self.trigrams.setdefault(gram, set()).add(k)
+                if len(k) >= MIN_DELETE_KEY_LEN:
+                    for variant in _deletes(k):
+                        self.deletes.setdefault(variant, set()).add(k)
+
+    def remove(self, movieId: int):
+        title, keys = self.doc_keys.pop(movieId, (None, ()))
+        if title is not None and self.exact.get(title) == movieId:
+            del self.exact[title]
+        for k in keys:
+            entries = [entry for entry in self.by_key.get(k, []) if entry[0] != movieId]
+            if entries:
+                self.by_key[k] = entries
+                continue
+            self.by_key.pop(k, None)
+            for postings, variants in ((self.trigrams, _trigrams(k)), (self.deletes, _deletes(k))):
+                for variant in variants:
+                    keys_with_variant = postings.get(variant)
+                    if keys_with_variant is not None:
+                        keys_with_variant.discard(k)
+                        if not keys_with_variant:
+                            del postings[variant]
+
+    @staticmethod
+    def _pick(entries: List[Tuple[int, Optional[int]]], year: Optional[int]) -> Tuple[int, bool]:
+        # 같은 키의 리메이크가 여러 개면 연도가 맞는 것, 없으면 가장 오래된 movieId
+        for movieId, entry_year in entries:
+            if year is not None and entry_year == year:
+                return movieId, True
+        return entries[0][0], False
+
+    def _edit1_candidates(self, key: str) -> set:
+        candidates = set(self.deletes.get(key, ()))  # 질의에서 한 글자가 빠진 경우
+        for variant in _deletes(key):
+            if variant in self.by_key:               # 질의에 한 글자가 더 들어간 경우
+                candidates.add(variant)
+            candidates.update(self.deletes.get(variant, ()))  # 치환 / 인접 교환
+        return candidates
+
+    def _trigram_candidates(self, key: str) -> List[str]:
+        grams = _trigrams(key)
+        common = COMMON_TRIGRAM_RATIO * len(self.by_key)
+        postings = [self.trigrams[gram] for gram in grams if gram in self.trigrams]
+        rare = [keys for keys in postings if len(keys) <= common]
+        shared = Counter()
+        for keys in (rare if len(rare) >= 3 else postings):
+            shared.update(keys)
+        if not shared:
+            return []
+        # 공유 trigram이 가장 많은 후보의 절반도 안 되는 키는 Dice 계수를 계산하지 않는다
+        floor = max(shared.values()) / 2
+        return heapq.nlargest(FUZZY_CANDIDATES, (k for k, count in shared.items() if count >= floor),
+                              key=lambda k: 2 * shared[k] / (len(grams) + len(k) + 1))
+
+    def _fuzzy(self, key: str, year: Optional[int]) -> Optional[TitleMatch]:
+        # 오타 한 글자는 삭제 색인으로 바로 찾고, 못 찾으면 trigram 후보 상위 몇 개의 편집 거리 비율을 본다
+        candidates = self._edit1_candidates(key) or self._trigram_candidates(key)
+        best = None
+        for candidate in candidates:
+            ratio = SequenceMatcher(None, key, candidate, autojunk=False).ratio()
+            movieId, year_match = self._pick(self.by_key[candidate], year)
+            score = (ratio, year_match)
+            if best is None or score > best[0]:
+                best = (score, movieId)
+        if best is None:
+            return None
+        (ratio, year_match), movieId = best
+        if ratio < self.threshold:
+            return None
+        confidence = ratio if year is None or year_match else ratio * 0.95
+        return TitleMatch(movieId, round(confidence, 3), "fuzzy")
+
+    def resolve_one(self, title: str) -> Optional[TitleMatch]:
+        movieId = self.exact.get(title)
+        if movieId is not None:
+            return TitleMatch(movieId, 1.0, "exact")
+        key, year, _ = normalize_title(title)
+        if not key:
+            return None
+        entries = self.by_key.get(key)
+        if entries:
+            movieId, year_match = self._pick(entries, year)
+            if year_match:
+                confidence = 1.0
+            elif len(entries) > 1:
+                confidence = AMBIGUOUS_CONFIDENCE  # 같은 제목의 다른 연도 영화 중 하나를 고른 경우
+            else:
+                # 연도가 없거나 다르면 같은 이름의 다른 영화일 수 있어 조금 낮춘다
+                confidence = 0.95 if year is None else 0.85
+            return TitleMatch(movieId, confidence, "normalized")
+        return self._fuzzy(key, year)
+
+    def resolve(self, titles: List[str]) -> List[Optional[TitleMatch]]:
+        """
+        One result per input title, in order (None when nothing is close enough).
+        """
+        cache: Dict[str, Optional[TitleMatch]] = {}
+        results = []
+        for title in titles:
+            if title not in cache:
+                cache[title] = self.resolve_one(title) if isinstance(title, str) else None
+            results.append(cache[title])
+        return results
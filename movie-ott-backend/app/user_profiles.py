@@ -0,0 +1,296 @@
+# 유저 프로필: 추천 프롬프트와 후보 필터링에 필요한 유저 정보를 ratings 조인 없이 O(1)로 읽는다.
+# - 평점 상위 USER_PROFILE_TOP_N개 (get_rating_history 첫 페이지와 같은 순서)
+# - 장르 선호도 (장르별 평점/5 합), 평점 수/합, 평가한 movieId 집합
+# 평점 쓰기 트랜잭션 안에서 이벤트마다 증분 갱신되고, 메모리 LRU + user_profiles 테이블에 유지된다.
+import heapq
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import async_session_maker
+from models import Ratings, UserProfiles
+from catalog import movie_catalog
+from popularity import RatingEvent
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+USER_PROFILE_TOP_N = int(os.getenv("USER_PROFILE_TOP_N", "10"))  # 프롬프트에 넣는 평점 상위 영화 수
+USER_PROFILE_CACHE_SIZE = int(os.getenv("USER_PROFILE_CACHE_SIZE", "10000"))  # 메모리 LRU 최대 유저 수
+USER_PROFILE_PERSIST = os.getenv("USER_PROFILE_PERSIST", "1") == "1"  # user_profiles 테이블에도 저장할지
+_LOOKUP_CHUNK = 500  # userId IN 목록 하나에 넣는 개수, SQLite 변수 개수 제한 아래로
+_BUILD_ATTEMPTS = 3
+
+
+class UserProfile:
+    """
+    One user's rating summary. `top` is a min-heap of (rating, timestamp, movieId) holding the
+    user's top_n ratings; it stays exact under inserts and raised re-rates, and is marked stale
+    when a member is re-rated lower while other ratings exist outside the heap.
+    """
+    __slots__ = ("userId", "top_n", "count", "total", "top", "genre_weights", "rated", "stale",
+                 "_history", "_affinity")
+
+    def __init__(self, userId: int, top_n: int = USER_PROFILE_TOP_N):
+        self.userId = userId
+        self.top_n = top_n
+        self.count = 0
+        self.total = 0.0
+        self.top: List[Tuple[float, int, int]] = []
+        self.genre_weights: Dict[str, float] = {}
+        self.rated: set = set()
+        self.stale = False
+        self._history = (-1, None)  # (catalog version, rating_history 목록)
+        self._affinity = None
+
+    @classmethod
+    def from_ratings(cls, userId: int, rows: Iterable[tuple], top_n: int = USER_PROFILE_TOP_N) -> "UserProfile":
+        # rows: (movieId, rating, timestamp)
+        profile = cls(userId, top_n)
+        for movieId, rating, timestamp in rows:
+            profile.apply(movieId, rating, timestamp, None)
+        return profile
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    def apply(self, movieId: int, rating: float, timestamp: int, previous: Optional[Tuple[float, int]]):
+        self._history = (-1, None)
+        self._affinity = None
+        record = movie_catalog.get(movieId)
+        genres = record.genres if record is not None else ()
+        if previous is None:
+            self.count += 1
+            self.total += rating
+            self.rated.add(movieId)
+            weight = rating / 5
+        else:
+            self.total += rating - previous[0]
+            weight = (rating - previous[0]) / 5
+        for genre in genres:
+            self.genre_weights[genre] = self.genre_weights.get(genre, 0.0) + weight
+
+        key = (rating, timestamp, movieId)
+        for i, entry in enumerate(self.top):
+            if entry[2] == movieId:
+                if key < entry and self.count > len(self.top):
+                    # 힙 밖에 있던 평점이 새 값보다 높을 수 있다, 다음 조회 때 ratings에서 다시 만든다
+                    self.stale = True
+                self.top[i] = key
+                heapq.heapify(self.top)
+                return
+        if len(self.top) < self.top_n:
+            heapq.heappush(self.top, key)
+        elif key > self.top[0]:
+            heapq.heapreplace(self.top, key)
+
+    def top_rated(self) -> List[Tuple[float, int, int]]:
+        # (rating, timestamp, movieId) 내림차순, get_rating_history와 같은 순서
+        return sorted(self.top, reverse=True)
+
+    def rating_history(self) -> List[dict]:
+        """
+        Top-rated movies as get_rating_history rows, built from the catalog and cached until the profile changes.
+        """
+        version, history = self._history
+        if version == movie_catalog.version and history is not None:
+            return history
+        history = []
+        for rating, timestamp, movieId in self.top_rated():
+            record = movie_catalog.get(movieId)
+            if record is None:
+                continue
+            history.append({"userId": self.userId, "movieId": movieId, "rating": rating,
+                            "title": record.title, "genre": record.genre, "timestamp": timestamp})
+        self._history = (movie_catalog.version, history)
+        return history
+
+    def genre_affinity(self) -> Dict[str, float]:
+        # candidates.genre_affinity와 같은 값: 최댓값 1로 정규화
+        if self._affinity is None:
+            top = max(self.genre_weights.values(), default=0.0)
+            self._affinity = ({genre: value / top for genre, value in self.genre_weights.items()}
+                              if top > 0 else {})
+        return self._affinity
+
+    def to_row(self) -> dict:
+        return {"userId": self.userId,
+                "ratingCount": self.count,
+                "ratingSum": self.total,
+                "topRated": json.dumps([[movieId, rating, timestamp] for rating, timestamp, movieId in self.top]),
+                "genreWeights": json.dumps(self.genre_weights, ensure_ascii=False),
+                "ratedMovies": np.array(sorted(self.rated), dtype=np.int32).tobytes(),
+                "stale": int(self.stale),
+                "updatedAt": time.time()}
+
+    @classmethod
+    def from_row(cls, row, top_n: int = USER_PROFILE_TOP_N) -> "UserProfile":
+        profile = cls(row.userId, top_n)
+        profile.count = row.ratingCount
+        profile.total = row.ratingSum
+        profile.top = [(rating, timestamp, movieId) for movieId, rating, timestamp in json.loads(row.topRated)]
+        heapq.heapify(profile.top)
+        profile.genre_weights = json.loads(row.genreWeights)
+        profile.rated = set(np.frombuffer(row.ratedMovies, dtype=np.int32).tolist())
+        # 저장된 뒤 USER_PROFILE_TOP_N이 커졌으면 힙이 모자라다
+        profile.stale = bool(row.stale) or (len(profile.top) < min(top_n, profile.count))
+        return profile
+
+
+class UserProfileStore:
+    """
+    LRU of UserProfile objects backed by the user_profiles table. get() falls back to the
+    table, then to one indexed read of the user's ratings; apply() keeps both layers in step
+    with rating writes inside the writer's transaction.
+    """
+    def __init__(self, max_entries: int = USER_PROFILE_CACHE_SIZE, top_n: int = USER_PROFILE_TOP_N,
+                 persist: bool = USER_PROFILE_PERSIST):
+        self.max_entries = max_entries
+        self.top_n = top_n
+        self.persist = persist
+        self._entries: "OrderedDict[int, UserProfile]" = OrderedDict()
+        # 만드는 중인 유저 -> 그동안 평점이 바뀌었는지 표시할 목록, 바뀌었으면 다시 만든다
+        self._building: Dict[int, List[list]] = {}
+        self.hits = 0
+        self.persistent_hits = 0
+        self.builds = 0
+        self.evictions = 0
+        self.updates = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remember(self, profile: UserProfile):
+        self._entries[profile.userId] = profile
+        self._entries.move_to_end(profile.userId)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get(self, userId: int, db: AsyncSession) -> UserProfile:
+        profile = self._entries.get(userId)
+        if profile is not None and not profile.stale:
+            self._entries.move_to_end(userId)
+            self.hits += 1
+            return profile
+
+        if self.persist and profile is None:
+            row = (await db.execute(select(UserProfiles).where(UserProfiles.userId == userId))).scalar_one_or_none()
+            if row is not None:
+                profile = UserProfile.from_row(row, self.top_n)
+                if not profile.stale:
+                    self._remember(profile)
+                    self.hits += 1
+                    self.persistent_hits += 1
+                    return profile
+        return await self._build(userId, db)
+
+    async def _build(self, userId: int, db: AsyncSession) -> UserProfile:
+        # ix_ratings_userId_rating_timestamp만 읽는다 (커버링 인덱스)
+        self.builds += 1
+        await movie_catalog.ensure_loaded(db)  # 장르 선호도에 영화 장르가 필요하다
+        for _ in range(_BUILD_ATTEMPTS):
+            changed = [False]
+            self._building.setdefault(userId, []).append(changed)
+            try:
+                results = await db.execute(
+                    select(Ratings.movieId, Ratings.rating, Ratings.timestamp).where(Ratings.userId == userId)
+                )
+                profile = UserProfile.from_ratings(userId, results.all(), self.top_n)
+                self._remember(profile)
+                if self.persist:
+                    await self._save(profile)
+            finally:
+                markers = self._building[userId]
+                markers.remove(changed)
+                if not markers:
+                    del self._building[userId]
+            if not changed[0]:
+                return profile
+        # 계속 평점이 들어오는 유저: 마지막 결과를 쓰되 다음 조회 때 다시 만든다
+        profile.stale = True
+        return profile
+
+    async def _save(self, profile: UserProfile):
+        # 요청 세션과 별개로 바로 커밋한다, 추천 요청이 LLM 호출 동안 쓰기 락을 잡지 않게
+        try:
+            async with async_session_maker() as session:
+                await self._upsert(session, [profile])
+                await session.commit()
+        except Exception as e:
+            logger.warning(f"user profile save failed for user {profile.userId}: {e}")
+
+    @staticmethod
+    async def _upsert(db: AsyncSession, profiles: List[UserProfile]):
+        stmt = sqlite_insert(UserProfiles)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserProfiles.userId],
+            set_={column: stmt.excluded[column] for column in ("ratingCount", "ratingSum", "topRated",
+                                                               "genreWeights", "ratedMovies", "stale", "updatedAt")}
+        )
+        await db.execute(stmt, [profile.to_row() for profile in profiles])
+
+    async def apply(self, db: AsyncSession, events: List[RatingEvent]):
+        """
+        Apply rating events in the writer's transaction (no commit). Only users that already have
+        a profile in memory or in user_profiles are updated; others are built on first read.
+        Call discard() with the same userIds if the transaction rolls back.
+        """
+        by_user: Dict[int, List[RatingEvent]] = {}
+        for event in events:
+            by_user.setdefault(event[0], []).append(event)
+        for userId in by_user:
+            for changed in self._building.get(userId, ()):
+                changed[0] = True
+
+        profiles = {userId: self._entries[userId] for userId in by_user if userId in self._entries}
+        if self.persist:
+            missing = [userId for userId in by_user if userId not in profiles]
+            for start in range(0, len(missing), _LOOKUP_CHUNK):
+                results = await db.execute(
+                    select(UserProfiles).where(UserProfiles.userId.in_(missing[start:start + _LOOKUP_CHUNK]))
+                )
+                for row in results.scalars():
+                    profiles[row.userId] = UserProfile.from_row(row, self.top_n)
+        if not profiles:
+            return
+        for userId, profile in profiles.items():
+            for _, movieId, rating, timestamp, previous in by_user[userId]:
+                profile.apply(movieId, rating, timestamp, previous)
+        self.updates += len(profiles)
+        if self.persist:
+            await self._upsert(db, list(profiles.values()))
+
+    def discard(self, userIds: Iterable[int]):
+        # 롤백된 쓰기로 바뀐 메모리 프로필은 버리고 다음 조회 때 테이블/ratings에서 다시 읽는다
+        for userId in set(userIds):
+            self._entries.pop(userId, None)
+            for changed in self._building.get(userId, ()):
+                changed[0] = True
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.builds
+        return {"entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "top_n": self.top_n,
+                "persist": self.persist,
+                "hits": self.hits,
+                "persistent_hits": self.persistent_hits,
+                "builds": self.builds,
+                "updates": self.updates,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0}
+
+
+user_profiles = UserProfileStore()
+metrics.gauge("user_profile_cache_entries", "User profiles held in memory", lambda: len(user_profiles))
@@ -0,0 +1,84 @@
+'''
+전체 유저 배치 추천 (batch_recommend.run_batch)을 가짜 LLM으로 실행해 users/sec 측정
+
+python benchmarks/bench_batch.py --llm-delay 0.2 --concurrency 32 --rate 0
+python benchmarks/bench_batch.py --fail-rate 0.1 --max-users 1000   # 재시도/체크포인트, resume 때 실패 유저 재시도 확인
+
+마지막에 앞쪽 유저들의 배치 프롬프트(히스토리 + 후보)가 온라인 추천 경로와 같은지 비교한다.
+'''
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+
+from common import setup_app_env, make_synthetic_db, make_fake_chain
+
+
+async def compare_with_online(n_users: int) -> int:
+    # 같은 유저면 배치와 온라인(recommend_func)이 같은 프롬프트를 만들어야 한다, 다른 유저 수를 돌려준다
+    from database import async_session_maker, engine
+    from catalog import movie_catalog
+    from batch_recommend import build_chunk_prompts
+    from candidates import generate_candidates, format_candidates
+    from llm_recommend import fill_template, target_template
+    from user_profiles import user_profiles
+
+    mismatches = 0
+    async with async_session_maker() as db:
+        await movie_catalog.ensure_loaded(db)
+        user_ids = list(range(1, n_users + 1))
+        prompts = await build_chunk_prompts(user_ids, db)
+        for userId in user_ids:
+            profile = await user_profiles.get(userId, db)
+            online = {"movie_candidates": format_candidates(await generate_candidates(userId, db)),
+                      "question": fill_template(target_template, {'rating_history': profile.rating_history()})}
+            if prompts.get(userId) != online:
+                mismatches += 1
+    await engine.dispose()
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ratings", type=int, default=1_000_209)
+    parser.add_argument("--llm-delay", type=float, default=0.2)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--chunk-size", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--rate", type=float, default=0.0)
+    parser.add_argument("--max-users", type=int, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        setup_app_env(db_path)
+        titles = make_synthetic_db(db_path, n_ratings=args.ratings)
+
+        from batch_recommend import run_batch
+        chain = make_fake_chain(titles, delay=args.llm_delay, fail_rate=args.fail_rate)
+        checkpoint_path = os.path.join(tmp, "checkpoint.json")
+
+        # 절반만 돌리고 멈춘 뒤 --resume으로 이어서 실행
+        first_half = (args.max_users or 6040) // 2
+        first = asyncio.run(run_batch(args.chunk_size, args.concurrency, args.rate, retries=3, backoff=0.01,
+                                      checkpoint_path=checkpoint_path, max_users=first_half, chain=chain))
+        second = asyncio.run(run_batch(args.chunk_size, args.concurrency, args.rate, retries=3, backoff=0.01,
+                                       checkpoint_path=checkpoint_path, resume=True,
+                                       max_users=None if args.max_users is None else args.max_users - first_half,
+                                       chain=chain))
+
+        conn = sqlite3.connect(db_path)
+        stored_users = conn.execute("SELECT COUNT(DISTINCT userId) FROM recommendations").fetchone()[0]
+        conn.close()
+        mismatches = asyncio.run(compare_with_online(200))
+        print(json.dumps({"first_run": first, "resumed_run": second,
+                          "users_with_recommendations": stored_users,
+                          # 체크포인트의 done은 누적이라 resume 뒤에는 저장된 유저 수와 같아야 한다
+                          "done_matches_stored": second["recommended_users"] == stored_users,
+                          "prompt_mismatches_vs_online": mismatches}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
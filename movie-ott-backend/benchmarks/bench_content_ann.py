@@ -0,0 +1,93 @@
+'''
+콘텐츠 벡터 IVF 색인: nprobe별 recall@k / 질의 지연 시간을 전체 탐색(brute force)과 비교
+
+python benchmarks/bench_content_ann.py --movies 3883 --queries 1000
+python benchmarks/bench_content_ann.py --movies 100000   # 큰 카탈로그에서의 차이
+
+질의는 유저 히스토리(선호 장르에 몰린 영화 10개 + 평점)에서 만든 가중 평균 벡터, 본 영화는 결과에서 뺀다.
+앱은 CONTENT_EXACT_MAX편 이하면 brute force를 쓰므로, IVF는 큰 카탈로그에서 보는 것이 맞다.
+'''
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from common import setup_app_env, summarize
+
+
+def make_histories(records, n: int, rng: random.Random):
+    # 실제 유저처럼 좋아하는 장르 한두 개에 몰린 히스토리 (20%는 아무 영화)
+    by_genre = {}
+    for record in records:
+        for genre in record.genres:
+            by_genre.setdefault(genre, []).append(record.movieId)
+    genres = sorted(by_genre)
+    all_ids = [record.movieId for record in records]
+    histories = []
+    for _ in range(n):
+        favourites = rng.sample(genres, 2)
+        picked = set()
+        while len(picked) < 10:
+            pool = all_ids if rng.random() < 0.2 else by_genre[rng.choice(favourites)]
+            picked.add(rng.choice(pool))
+        histories.append([(movieId, float(rng.randint(3, 5))) for movieId in picked])
+    return histories
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--movies", type=int, default=3883)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", default="1,2,4,8,16,32")
+    args = parser.parse_args()
+
+    setup_app_env(":memory:")
+    from content_index import ContentIndex
+    from bench_title_resolve import make_catalog
+
+    rng = random.Random(0)
+    records = make_catalog(args.movies, rng)
+    with tempfile.TemporaryDirectory() as tmp:
+        index = ContentIndex(vectors_path=os.path.join(tmp, "vectors.npy"),
+                             index_path=os.path.join(tmp, "index.npz"))
+        start = time.perf_counter()
+        index.build(records)
+        build_s = time.perf_counter() - start
+
+        # 다시 열 때는 벡터를 읽지 않고 memmap만 연다
+        reopened = ContentIndex(vectors_path=index.vectors_path, index_path=index.index_path)
+        start = time.perf_counter()
+        assert reopened.load(index.signature)
+        load_s = time.perf_counter() - start
+
+        queries = []
+        for history in make_histories(records, args.queries, rng):
+            query = reopened.query_vector(history)
+            queries.append((query, reopened._rows([movieId for movieId, _ in history])))
+
+        truth, brute_times = [], []
+        for query, exclude in queries:
+            start = time.perf_counter()
+            truth.append(set(reopened.brute_force(query, args.k, exclude)))
+            brute_times.append(time.perf_counter() - start)
+
+        report = {"movies": args.movies, "dim": reopened.dim, "lists": len(reopened.centroids), "k": args.k,
+                  "build_s": round(build_s, 3), "mmap_load_ms": round(load_s * 1000, 2),
+                  "brute_force": summarize(brute_times), "ivf": {}}
+        for nprobe in [int(value) for value in args.nprobe.split(",")]:
+            times, hits = [], 0
+            for (query, exclude), expected in zip(queries, truth):
+                start = time.perf_counter()
+                found = reopened.search(query, args.k, nprobe=nprobe, exclude=exclude)
+                times.append(time.perf_counter() - start)
+                hits += len(expected.intersection(found))
+            report["ivf"][f"nprobe={nprobe}"] = {"recall_at_k": round(hits / (args.k * len(queries)), 4),
+                                                 **summarize(times)}
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+'''
+DB 프로필(dev / prod) 별 읽기/쓰기 혼합 동시성 처리량 비교
+
+python benchmarks/bench_db_profile.py --readers 16 --writers 4 --seconds 10
+
+프로필마다 같은 합성 DB 복사본을 쓰는 별도 프로세스를 띄운다 (엔진은 import 시점에 만들어지므로).
+읽기는 get_rating_history 쿼리, 쓰기는 /api/ratings처럼 INSERT 하나 + COMMIT 하나.
+'''
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import setup_app_env, make_synthetic_db, summarize
+
+
+async def worker(args):
+    from sqlalchemy import insert
+    from database import async_session_maker, engine, database_settings
+    from models import Ratings
+    from llm_recommend import get_rating_history
+
+    deadline = time.perf_counter() + args.seconds
+    read_latency, write_latency = [], []
+    errors = {"read": 0, "write": 0}
+    next_movie = iter(range(1_000_000, 10_000_000))
+
+    async def reader(seed):
+        rng = random.Random(seed)
+        async with async_session_maker() as db:
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    await get_rating_history(rng.randint(1, 6040), db)
+                    read_latency.append(time.perf_counter() - start)
+                except Exception:
+                    errors["read"] += 1
+
+    async def writer(seed):
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            async with async_session_maker() as db:
+                start = time.perf_counter()
+                try:
+                    await db.execute(insert(Ratings).values(userId=rng.randint(1, 6040), movieId=next(next_movie),
+                                                            rating=4.0, timestamp=int(time.time())))
+                    await db.commit()
+                    write_latency.append(time.perf_counter() - start)
+                except Exception:
+                    await db.rollback()
+                    errors["write"] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[reader(i) for i in range(args.readers)],
+                         *[writer(1000 + i) for i in range(args.writers)])
+    elapsed = time.perf_counter() - start
+    await engine.dispose()
+    return {"profile": database_settings.profile,
+            "reads_per_sec": round(len(read_latency) / elapsed, 1),
+            "writes_per_sec": round(len(write_latency) / elapsed, 1),
+            "errors": errors,
+            "read_latency": summarize(read_latency),
+            "write_latency": summarize(write_latency)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ratings", type=int, default=1_000_209)
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--profiles", default="dev,prod")
+    parser.add_argument("--worker-db", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker_db:
+        setup_app_env(args.worker_db)
+        result = asyncio.run(worker(args))
+        sys.__stdout__.write("RESULT " + json.dumps(result) + "\n")
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        base_db = os.path.join(tmp, "base.db")
+        setup_app_env(base_db)
+        make_synthetic_db(base_db, n_ratings=args.ratings)
+        for profile in args.profiles.split(","):
+            db_path = os.path.join(tmp, f"{profile}.db")
+            shutil.copy(base_db, db_path)
+            env = dict(os.environ, DB_PROFILE=profile)
+            # dev 프로필은 SQL echo를 출력하므로 stdout은 결과 줄만 골라낸다
+            proc = subprocess.run([sys.executable, __file__, "--worker-db", db_path,
+                                   "--readers", str(args.readers), "--writers", str(args.writers),
+                                   "--seconds", str(args.seconds)],
+                                  env=env, cwd=tmp, capture_output=True, text=True)
+            lines = [line for line in proc.stdout.splitlines() if line.startswith("RESULT ")]
+            if not lines:
+                raise RuntimeError(proc.stderr[-2000:])
+            results.append(json.loads(lines[-1][len("RESULT "):]))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
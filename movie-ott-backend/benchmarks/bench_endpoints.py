@@ -0,0 +1,186 @@
+'''
+API 엔드포인트 벤치마크: MovieLens-1M 크기 합성 DB + 가짜 LLM, 엔드포인트별 처리량과 p50/p95/p99
+
+python benchmarks/bench_endpoints.py --concurrency 16 --requests 500 --output before.json
+python benchmarks/bench_endpoints.py --concurrency 16 --requests 500 --output after.json --baseline before.json
+
+임시 디렉터리에 합성 SQLite 파일(기본 6040 유저 / 3883 영화 / 1,000,209 평점)을 만들고 llm_recommend.chain을
+고정 시드의 가짜 모델로 바꾼 뒤, 앱 프로세스 안의 ASGI 클라이언트로 엔드포인트마다 --requests개 요청을
+--concurrency개 동시 작업으로 보낸다. 결과는 JSON 파일로 저장되고, --baseline을 주면 이전 결과와의 차이를 출력한다.
+합성 DB 생성이 오래 걸리므로 --data-cache 디렉터리를 주면 처음 만든 DB를 복사해 재사용한다.
+'''
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+
+from common import setup_app_env, make_synthetic_db, make_fake_chain, summarize
+
+ENDPOINTS = ("search", "rating_history", "recommend", "recommended", "ratings")
+
+
+def make_request(endpoint: str, i: int, rng: random.Random, args) -> tuple:
+    # (method, path, httpx 인자)
+    userId = rng.randint(1, args.users)
+    if endpoint == "search":
+        return "GET", "/api/search", {"params": {"query": rng.choice(args.search_terms)}}
+    if endpoint == "rating_history":
+        return "POST", "/api/rating_history", {"json": {"userId": str(userId)}}
+    if endpoint == "recommend":
+        # 유저를 돌아가며 골라 결과 캐시에 걸리지 않게 한다
+        return "POST", "/api/recommend", {"json": {"userId": str(i % args.users + 1)}}
+    if endpoint == "recommended":
+        return "GET", "/api/recommended", {"params": {"userId": str(i % args.users + 1)}}
+    if endpoint == "ratings":
+        return "POST", "/api/ratings", {"json": {"userId": userId, "movieId": rng.randint(1, args.movies),
+                                                 "rating": float(rng.randint(1, 5)),
+                                                 "timestamp": int(time.time())}}
+    raise ValueError(endpoint)
+
+
+async def drive(client, endpoint: str, args) -> dict:
+    rng = random.Random(f"{args.seed}-{endpoint}")
+    requests = [make_request(endpoint, i, rng, args) for i in range(args.requests)]
+    latencies, statuses = [], {}
+    next_index = iter(range(len(requests)))
+
+    async def worker():
+        for i in next_index:
+            method, path, kwargs = requests[i]
+            start = time.perf_counter()
+            response = await client.request(method, path, **kwargs)
+            elapsed = time.perf_counter() - start
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if response.status_code < 400:
+                latencies.append(elapsed)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+    elapsed = time.perf_counter() - start
+    return {"requests": len(requests),
+            "status_codes": {str(code): count for code, count in sorted(statuses.items())},
+            "throughput_rps": round(len(latencies) / elapsed, 1),
+            "latency": summarize(latencies)}
+
+
+async def run(args, titles) -> dict:
+    import httpx
+    import llm_recommend
+    from main import app
+
+    llm_recommend.chain = make_fake_chain(titles, delay=args.llm_delay)
+    args.search_terms = sorted({word for title in titles[:200] for word in title.split()[:1]})
+
+    results = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            # /api/recommended가 읽을 추천이 있도록 recommend를 먼저, 쓰기(ratings)는 마지막에
+            for endpoint in [e for e in ENDPOINTS if e in args.endpoints]:
+                results[endpoint] = await drive(client, endpoint, args)
+                print(f"{endpoint}: {results[endpoint]['throughput_rps']} req/s, "
+                      f"p50 {results[endpoint]['latency']['p50_ms']} ms, "
+                      f"p99 {results[endpoint]['latency']['p99_ms']} ms", flush=True)
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+
+def prepare_db(args, db_path: str):
+    # 같은 크기/시드의 합성 DB는 --data-cache에 한 번만 만든다
+    if not args.data_cache:
+        return make_synthetic_db(db_path, args.users, args.movies, args.ratings, seed=args.seed)
+    os.makedirs(args.data_cache, exist_ok=True)
+    name = f"movielens-{args.users}-{args.movies}-{args.ratings}-{args.seed}"
+    cached_db = os.path.join(args.data_cache, f"{name}.db")
+    cached_titles = os.path.join(args.data_cache, f"{name}.titles.json")
+    if not (os.path.exists(cached_db) and os.path.exists(cached_titles)):
+        titles = make_synthetic_db(cached_db, args.users, args.movies, args.ratings, seed=args.seed)
+        with open(cached_titles, "w") as f:
+            json.dump(titles, f)
+    shutil.copy(cached_db, db_path)
+    with open(cached_titles) as f:
+        return json.load(f)
+
+
+def compare(report: dict, baseline: dict):
+    print(f"\n{'endpoint':<16}" + "".join(f"{title:>28}" for title in ("rps", "p50 ms", "p95 ms", "p99 ms")))
+
+    def cell(old, new):
+        if old in (None, 0) or new is None:
+            return f"{old} -> {new}"
+        return f"{old} -> {new} ({(new - old) / old * 100:+.0f}%)"
+
+    for endpoint, result in report["endpoints"].items():
+        old = baseline.get("endpoints", {}).get(endpoint)
+        if old is None:
+            continue
+        cells = [cell(old['throughput_rps'], result['throughput_rps'])]
+        cells += [cell(old['latency'][key], result['latency'][key]) for key in ("p50_ms", "p95_ms", "p99_ms")]
+        print(f"{endpoint:<16}" + "".join(f"{value:>28}" for value in cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=6040)
+    parser.add_argument("--movies", type=int, default=3883)
+    parser.add_argument("--ratings", type=int, default=1_000_209)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500, help="엔드포인트마다 보낼 요청 수")
+    parser.add_argument("--llm-delay", type=float, default=0.05, help="가짜 LLM 응답 지연 (초)")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--data-cache", help="합성 DB를 저장해 두고 재사용할 디렉터리")
+    parser.add_argument("--output", default="bench_endpoints.json")
+    parser.add_argument("--baseline", help="비교할 이전 결과 JSON")
+    args = parser.parse_args()
+    args.endpoints = args.endpoints.split(",")
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        setup_app_env(db_path)
+        # 시작 시 만드는 캐시 파일과 app.log가 저장소에 생기지 않게 임시 디렉터리로
+        os.environ["ITEM_CF_CACHE_PATH"] = os.path.join(tmp, "item_cf.npz")
+        os.environ["CONTENT_VECTORS_PATH"] = os.path.join(tmp, "content_vectors.npy")
+        os.environ["CONTENT_INDEX_PATH"] = os.path.join(tmp, "content_index.npz")
+        os.environ.setdefault("LLM_WARMUP", "0")
+        data_start = time.perf_counter()
+        titles = prepare_db(args, db_path)
+        data_s = time.perf_counter() - data_start
+        os.chdir(tmp)
+        endpoints = asyncio.run(run(args, titles))
+
+    report = {"commit": git_commit(),
+              "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "python": platform.python_version(),
+              "db_profile": os.environ.get("DB_PROFILE"),
+              "dataset": {"users": args.users, "movies": args.movies, "ratings": args.ratings, "seed": args.seed,
+                          "prepare_s": round(data_s, 1)},
+              "concurrency": args.concurrency,
+              "requests_per_endpoint": args.requests,
+              "llm_delay_s": args.llm_delay,
+              "endpoints": endpoints}
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"saved {output}")
+    if baseline_path:
+        with open(baseline_path) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
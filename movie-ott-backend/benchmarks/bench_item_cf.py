@@ -0,0 +1,83 @@
+'''
+item-item 협업 필터링 추천기: 빌드 시간과 빌드 중 이벤트 루프가 멈춘 시간, 캐시 로드 시간, 유저별 top-10 지연 시간,
+새 평점이 들어온 뒤 refresh()가 모델을 다시 만드는지
+
+python benchmarks/bench_item_cf.py --ratings 1000209 --users-sampled 200
+'''
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+from common import setup_app_env, make_synthetic_db, summarize, loop_stalls
+
+
+async def run(args):
+    from database import async_session_maker, engine
+    from movie_stats import init_movie_stats
+    from item_cf import ItemItemRecommender
+
+    cache_path = os.path.join(args.tmp, "item_cf.npz")
+    samples = []
+    async with async_session_maker() as db:
+        await init_movie_stats(db)
+
+        recommender = ItemItemRecommender(cache_path=cache_path)
+        start = time.perf_counter()
+        _, build_loop_stall = await loop_stalls(recommender.ensure_ready(db))
+        build_s = time.perf_counter() - start
+
+        cached = ItemItemRecommender(cache_path=cache_path)
+        start = time.perf_counter()
+        await cached.ensure_ready(db)
+        cache_load_s = time.perf_counter() - start
+
+        rng = random.Random(0)
+        for userId in rng.sample(range(1, 6041), args.users_sampled):
+            start = time.perf_counter()
+            movies = await cached.recommend(userId, db, k=10)
+            samples.append(time.perf_counter() - start)
+            assert len(movies) == 10, movies
+
+        # 평점이 없으면 refresh는 아무것도 안 하고, 새 평점이 들어오면 다시 만든다
+        from schemas import RatingBase
+        from rating_writer import save_ratings
+        unchanged = not await cached.refresh(db)
+        await save_ratings(db, [RatingBase(userId=1, movieId=movieId, rating=5.0, timestamp=int(time.time()))
+                                for movieId in range(1, 21)])
+        start = time.perf_counter()
+        rebuilt = await cached.refresh(db)
+        refresh_s = time.perf_counter() - start
+        signature_current = (cached.signature == await cached.ratings_signature(db)).all()
+
+    await engine.dispose()
+    return {"ratings": args.ratings,
+            "build_s": round(build_s, 3),
+            "build_loop_stall": build_loop_stall,
+            "cache_load_s": round(cache_load_s, 3),
+            "similarities": int(cached.sim_T.nnz),
+            "refresh": {"skipped_when_unchanged": bool(unchanged),
+                        "rebuilt_after_new_ratings": bool(rebuilt and signature_current),
+                        "seconds": round(refresh_s, 3)},
+            "recommend_top10": summarize(samples)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ratings", type=int, default=1_000_209)
+    parser.add_argument("--users-sampled", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        args.tmp = tmp
+        db_path = os.path.join(tmp, "bench.db")
+        setup_app_env(db_path)
+        make_synthetic_db(db_path, n_ratings=args.ratings)
+        print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+'''
+/api/recommend 지연 시간 예산: 느리거나 깨진 JSON을 내는 가짜 LLM에서도 모든 요청이 SLO 안에 끝나는지
+
+python benchmarks/bench_latency_budget.py --budget 2 --slow-rate 0.2 --slow-delay 5 --garbage-rate 0.1
+python benchmarks/bench_latency_budget.py --budget 2 --slow-rate 0.2 --slow-delay 5 --hedge-delay 0.3
+
+가짜 모델은 호출의 --slow-rate만큼 --slow-delay초 걸리고, --garbage-rate만큼 JSON이 아닌 답을 낸다.
+케이스(기본값 / hedge 끔 / parse retry 끔 / fallback 끔)마다 같은 요청을 보내고 상태 코드, 지연 시간,
+LLM 답과 fallback 답의 비율, hedge/retry 횟수를 비교한다. 예산 + --slo-margin을 넘긴 요청이나
+5xx 응답이 (fallback을 켠 케이스에서) 하나라도 있으면 종료 코드 1로 끝난다.
+'''
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from common import setup_app_env, make_synthetic_db, make_fake_chain, summarize
+
+
+async def run_case(client, llm_recommend, args, name: str, hedge_delay: float, parse_retries: int,
+                   fallback: bool) -> dict:
+    llm_recommend.LLM_HEDGE_DELAY = hedge_delay
+    llm_recommend.LLM_PARSE_RETRIES = parse_retries
+    llm_recommend.RECOMMEND_FALLBACK = fallback
+    llm_recommend.recommend_cache.ttl = 0  # 같은 프롬프트라도 매번 모델을 부르게
+    hedges = llm_recommend.LLM_HEDGES.snapshot().get((), 0)
+    retries = llm_recommend.LLM_RETRIES.snapshot().get((), 0)
+
+    latencies, statuses, sources = [], {}, {}
+    next_user = iter(range(1, args.requests + 1))
+
+    async def worker():
+        for userId in next_user:
+            start = time.perf_counter()
+            response = await client.post("/api/recommend", json={"userId": str(userId % args.users + 1)})
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if response.status_code == 200:
+                source = response.json().get("fallback") or "llm"
+                sources[source] = sources.get(source, 0) + 1
+
+    await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+    slo = args.budget + args.slo_margin
+    return {"case": name,
+            "hedge_delay_s": hedge_delay,
+            "parse_retries": parse_retries,
+            "fallback": fallback,
+            "status_codes": {str(code): count for code, count in sorted(statuses.items())},
+            "answers": sources,
+            "hedged_calls": llm_recommend.LLM_HEDGES.snapshot().get((), 0) - hedges,
+            "parse_retries_used": llm_recommend.LLM_RETRIES.snapshot().get((), 0) - retries,
+            "over_slo": sum(1 for latency in latencies if latency > slo),
+            "latency": summarize(latencies)}
+
+
+async def run(args, titles) -> list:
+    import httpx
+    import llm_recommend
+    from main import app
+
+    llm_recommend.chain = make_fake_chain(titles, delay=args.llm_delay, fail_rate=args.fail_rate,
+                                          slow_rate=args.slow_rate, slow_delay=args.slow_delay,
+                                          garbage_rate=args.garbage_rate)
+    llm_recommend.RECOMMEND_BUDGET = args.budget
+    cases = [("default", args.hedge_delay, args.parse_retries, True),
+             ("no_hedge", 0.0, args.parse_retries, True),
+             ("no_parse_retry", args.hedge_delay, 0, True),
+             ("no_fallback", args.hedge_delay, args.parse_retries, False)]
+    results = []
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://budget", timeout=None) as client:
+            for case in cases:
+                result = await run_case(client, llm_recommend, args, *case)
+                results.append(result)
+                print(f"{result['case']}: {result['status_codes']} answers {result['answers']} "
+                      f"p99 {result['latency']['p99_ms']} ms, max {result['latency']['max_ms']} ms, "
+                      f"over SLO {result['over_slo']}", flush=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--movies", type=int, default=3883)
+    parser.add_argument("--ratings", type=int, default=100_000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--budget", type=float, default=2.0, help="RECOMMEND_BUDGET (초)")
+    parser.add_argument("--slo-margin", type=float, default=0.5, help="예산 위로 허용하는 여유 (초)")
+    parser.add_argument("--hedge-delay", type=float, default=0.3)
+    parser.add_argument("--parse-retries", type=int, default=1)
+    parser.add_argument("--llm-delay", type=float, default=0.1, help="보통 호출의 지연 (초)")
+    parser.add_argument("--slow-rate", type=float, default=0.2)
+    parser.add_argument("--slow-delay", type=float, default=5.0)
+    parser.add_argument("--garbage-rate", type=float, default=0.1)
+    parser.add_argument("--fail-rate", type=float, default=0.05)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "budget.db")
+        setup_app_env(db_path)
+        os.environ["ITEM_CF_CACHE_PATH"] = os.path.join(tmp, "item_cf.npz")
+        os.environ["CONTENT_VECTORS_PATH"] = os.path.join(tmp, "content_vectors.npy")
+        os.environ["CONTENT_INDEX_PATH"] = os.path.join(tmp, "content_index.npz")
+        os.environ.setdefault("LLM_WARMUP", "0")
+        os.environ.setdefault("LLM_MAX_CONCURRENCY", str(args.concurrency * 2))  # hedge가 쓸 빈 슬롯
+        titles = make_synthetic_db(db_path, args.users, args.movies, args.ratings)
+        os.chdir(tmp)  # app.log
+        results = asyncio.run(run(args, titles))
+    print(json.dumps(results, indent=2))
+
+    violations = [r["case"] for r in results
+                  if r["fallback"] and (r["over_slo"] or any(int(code) >= 500 for code in r["status_codes"]))]
+    if violations:
+        print(f"SLO violated: {violations}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+'''
+get_movie_info 평균 평점 조회 비교: ratings 전체 GROUP BY 서브쿼리 vs movie_stats 조회
+
+python benchmarks/bench_mean_rating.py --ratings 1000209 --repeat 50
+'''
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+from common import setup_app_env, make_synthetic_db, summarize
+
+
+async def run(args, titles):
+    from sqlalchemy import select, func
+    from database import async_session_maker, engine
+    from models import Movies, Ratings
+    from movie_stats import init_movie_stats, get_mean_ratings
+
+    # 수정 전 get_movie_info 쿼리
+    async def old_lookup(db, movie_titles):
+        avg_rating_subquery = (
+            select(Ratings.movieId, func.round(func.avg(Ratings.rating), 1).label("meanRating"))
+            .group_by(Ratings.movieId)
+            .subquery()
+        )
+        query = (
+            select(Movies.movieId, Movies.title, Movies.genre, avg_rating_subquery.c.meanRating)
+            .select_from(Movies)
+            .join(avg_rating_subquery, Movies.movieId == avg_rating_subquery.c.movieId, isouter=True)
+            .where(Movies.title.in_(movie_titles))
+        )
+        results = await db.execute(query)
+        return {row.movieId: row.meanRating for row in results.all()}
+
+    title_to_id = {title: movieId for movieId, title in enumerate(titles, start=1)}
+    rng = random.Random(1)
+    samples_old, samples_new = [], []
+
+    async with async_session_maker() as db:
+        start = time.perf_counter()
+        await init_movie_stats(db)
+        build_s = time.perf_counter() - start
+
+        for _ in range(args.repeat):
+            movie_titles = rng.sample(titles, args.k)
+            movie_ids = [title_to_id[t] for t in movie_titles]
+
+            start = time.perf_counter()
+            old = await old_lookup(db, movie_titles)
+            samples_old.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            new = await get_mean_ratings(db, movie_ids)
+            samples_new.append(time.perf_counter() - start)
+
+            assert {k: v for k, v in old.items() if v is not None} == new, (old, new)
+
+    await engine.dispose()
+    return {"ratings": args.ratings,
+            "k": args.k,
+            "movie_stats_build_s": round(build_s, 3),
+            "group_by_subquery": summarize(samples_old),
+            "movie_stats_lookup": summarize(samples_new)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ratings", type=int, default=1_000_209)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        setup_app_env(db_path)
+        titles = make_synthetic_db(db_path, n_ratings=args.ratings)
+        print(json.dumps(asyncio.run(run(args, titles)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+'''
+/api/movies 장르 브라우즈: 비트마스크 배열 필터 vs 장르 문자열 비교, 페이지 크기/깊이별 지연,
+cursor로 끝까지 넘긴 결과가 전체 정렬과 같은지
+
+python benchmarks/bench_movie_browse.py --movies 388300 --ratings 1000209 --repeat 200
+
+MovieLens-1M보다 영화가 100배 많은 합성 카탈로그에서 무작위 장르 1~3개, any/all, popularity/rating 정렬로
+--repeat번씩 첫 페이지를 읽는다. before는 같은 필터를 카탈로그의 장르 문자열로 (record.genres 집합 비교)
+거른 뒤 전체를 정렬하는 방식, SQL은 변경 전 search_movies처럼 genre LIKE '%장르%'로 거르는 쿼리다.
+'''
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from common import setup_app_env, make_synthetic_db, summarize, GENRES
+
+
+def string_filter(records, names, match, scores_by_id, k):
+    # 변경 전 방식: 영화마다 장르 문자열을 나눈 집합과 비교하고 전부 정렬
+    wanted = set(names)
+    if match == "all":
+        hits = [r for r in records if wanted <= set(r.genres)]
+    else:
+        hits = [r for r in records if wanted & set(r.genres)]
+    hits.sort(key=lambda r: (scores_by_id.get(r.movieId, -1.0), r.movieId), reverse=True)
+    return [r.movieId for r in hits[:k]], len(hits)
+
+
+async def measure(args, db_path) -> dict:
+    from database import async_session_maker, engine
+    from catalog import movie_catalog
+    from popularity import popularity_index
+    from genre_bits import genres_mask
+    from movie_browse import browse_movies, browse_scores
+    from pagination import decode_cursor
+
+    report = {}
+    rng = random.Random(0)
+    async with async_session_maker() as db:
+        start = time.perf_counter()
+        await movie_catalog.load(db)
+        report["catalog_load_s"] = round(time.perf_counter() - start, 3)
+        await popularity_index.ensure_ready(db)
+        start = time.perf_counter()
+        movie_catalog.genre_arrays()
+        report["genre_arrays_s"] = round(time.perf_counter() - start, 4)
+    records = list(movie_catalog.by_id.values())
+    all_ids, _ = movie_catalog.genre_arrays()
+
+    queries = []
+    for _ in range(args.repeat):
+        names = rng.sample(GENRES, rng.randint(1, 3))
+        queries.append((names, rng.choice(["any", "all"]), rng.choice(["popularity", "rating"])))
+
+    for sort in ("popularity", "rating"):
+        scores, _, _ = browse_scores(all_ids, sort)
+        scores_by_id = dict(zip(all_ids.tolist(), scores.tolist()))
+        before, after, mismatches = [], [], 0
+        for names, match, _ in queries[:max(args.repeat // 10, 10)]:
+            t0 = time.perf_counter()
+            expected, expected_total = string_filter(records, names, match, scores_by_id, args.limit)
+            before.append(time.perf_counter() - t0)
+            movies, total, _ = browse_movies(genres_mask(names), match, sort, args.limit, None)
+            if [m["movieId"] for m in movies] != expected or total != expected_total:
+                mismatches += 1
+        for names, match, _ in queries:
+            t0 = time.perf_counter()
+            browse_movies(genres_mask(names), match, sort, args.limit, None)
+            after.append(time.perf_counter() - t0)
+        report[f"string_filter_{sort}"] = summarize(before)
+        report[f"bitmask_{sort}"] = summarize(after)
+        report[f"mismatches_{sort}"] = mismatches
+
+    # SQL LIKE (변경 전 search_movies의 장르 검색), any 하나짜리만
+    conn = sqlite3.connect(db_path)
+    samples = []
+    for names, _, _ in queries[:20]:
+        t0 = time.perf_counter()
+        conn.execute("SELECT movieId, title, genre FROM movies WHERE genre LIKE ?", (f"%{names[0]}%",)).fetchall()
+        samples.append(time.perf_counter() - t0)
+    conn.close()
+    report["sql_like_one_genre"] = summarize(samples)
+
+    # cursor로 끝까지: 페이지를 이어 붙이면 전체 정렬과 같아야 하고 깊은 페이지도 비용이 같아야 한다
+    names, match = ["Comedy"], "any"
+    movies, total, cursor = browse_movies(genres_mask(names), match, "rating", args.page_size, None)
+    paged, page_times = [m["movieId"] for m in movies], []
+    while cursor:
+        t0 = time.perf_counter()
+        movies, _, cursor = browse_movies(genres_mask(names), match, "rating", args.page_size,
+                                          decode_cursor(cursor, 2))
+        page_times.append(time.perf_counter() - t0)
+        paged.extend(m["movieId"] for m in movies)
+    scores, _, _ = browse_scores(all_ids, "rating")
+    scores_by_id = dict(zip(all_ids.tolist(), scores.tolist()))
+    expected, _ = string_filter(records, names, match, scores_by_id, len(records))
+    report["paged_matches_full_sort"] = paged == expected and len(paged) == total
+    report["pages"] = len(page_times) + 1
+    report["page_latency"] = summarize(page_times)
+    await engine.dispose()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=6040)
+    parser.add_argument("--movies", type=int, default=388_300)
+    parser.add_argument("--ratings", type=int, default=1_000_209)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--page-size", type=int, default=100, help="cursor로 끝까지 넘길 때 페이지 크기")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "browse.db")
+        setup_app_env(db_path)
+        os.environ.setdefault("LLM_WARMUP", "0")
+        os.chdir(tmp)  # app.log
+        make_synthetic_db(db_path, args.users, args.movies, args.ratings)
+        report = asyncio.run(measure(args, db_path))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
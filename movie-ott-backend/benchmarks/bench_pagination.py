@@ -0,0 +1,112 @@
+'''
+rating history 페이지 지연 시간: keyset(cursor) vs OFFSET, 첫 페이지와 깊은 페이지 비교
+
+python benchmarks/bench_pagination.py --history 3000 --repeat 200
+
+유저 1에게 평점 --history개를 몰아 넣은 뒤 같은 정렬 순서로 --page번째 페이지를 cursor로 읽을 때와
+LIMIT/OFFSET으로 읽을 때를 비교한다. keyset은 앱 코드(get_rating_history)를 그대로 부르고,
+OFFSET은 같은 쿼리에 OFFSET만 붙인다. (/api/recommended는 최신 run 하나만 보여주므로 깊은 페이지가 없다)
+'''
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from common import setup_app_env, make_synthetic_db, summarize
+
+HEAVY_USER = 1
+
+
+def add_heavy_user(db_path: str, n_history: int, n_movies: int):
+    rng = random.Random(1)
+    conn = sqlite3.connect(db_path)
+    conn.execute("DELETE FROM ratings WHERE userId = ?", (HEAVY_USER,))
+    movies = rng.sample(range(1, n_movies + 1), min(n_history, n_movies))
+    conn.executemany("INSERT INTO ratings VALUES (?, ?, ?, ?)",
+                     [(HEAVY_USER, m, float(rng.randint(1, 5)), 956703932 + rng.randint(0, 90_000_000))
+                      for m in movies])
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+
+async def measure(args):
+    from sqlalchemy import select, desc
+    from database import async_session_maker, engine, init_db
+    from models import Movies, Ratings
+    from llm_recommend import get_rating_history
+
+    await init_db()
+    limit = args.page_size
+    report = {"page_size": limit, "page": args.page, "rating_history": {}}
+
+    async with async_session_maker() as db:
+        # 깊은 페이지의 cursor는 앞 페이지를 실제로 넘겨서 얻는다
+        history_cursor = None
+        for _ in range(args.page - 1):
+            history_cursor = (await get_rating_history(HEAVY_USER, db, limit=limit,
+                                                       cursor=history_cursor))["nextCursor"]
+        if history_cursor is None:
+            raise SystemExit("--page가 데이터보다 깊습니다")
+
+        async def keyset_history(cursor):
+            return (await get_rating_history(HEAVY_USER, db, limit=limit, cursor=cursor))["rating_history"]
+
+        async def offset_history(offset):
+            query = (select(Ratings.userId, Ratings.movieId, Ratings.rating, Movies.title, Movies.genre,
+                            Ratings.timestamp)
+                     .join(Movies, Ratings.movieId == Movies.movieId)
+                     .where(Ratings.userId == HEAVY_USER)
+                     .order_by(desc(Ratings.rating), desc(Ratings.timestamp), desc(Ratings.movieId))
+                     .limit(limit).offset(offset))
+            return (await db.execute(query)).all()
+
+        deep_offset = (args.page - 1) * limit
+        cases = {
+            "rating_history": [("keyset_first", keyset_history, None),
+                               ("keyset_deep", keyset_history, history_cursor),
+                               ("offset_first", offset_history, 0),
+                               ("offset_deep", offset_history, deep_offset)],
+        }
+        for endpoint, runs in cases.items():
+            pages = {}
+            for name, fn, arg in runs:
+                pages[name] = [(row["movieId"] if isinstance(row, dict) else row.movieId) for row in await fn(arg)]
+                times = []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    await fn(arg)
+                    times.append(time.perf_counter() - start)
+                report[endpoint][name] = summarize(times)
+            # 같은 정렬 순서이므로 두 방식의 페이지 내용이 같아야 한다
+            report[endpoint]["same_rows"] = (pages["keyset_first"] == pages["offset_first"]
+                                             and pages["keyset_deep"] == pages["offset_deep"])
+    await engine.dispose()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ratings", type=int, default=200_000)
+    parser.add_argument("--history", type=int, default=3000, help="유저 1의 평점 수 (영화 수 이하)")
+    parser.add_argument("--page-size", type=int, default=10)
+    parser.add_argument("--page", type=int, default=250, help="비교할 깊은 페이지 번호")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "pagination.db")
+        setup_app_env(db_path)
+        os.environ.setdefault("LLM_WARMUP", "0")
+        make_synthetic_db(db_path, n_ratings=args.ratings)
+        add_heavy_user(db_path, args.history, 3883)
+        report = asyncio.run(measure(args))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+'''
+인기/트렌딩 순위: 빌드/스냅샷 로드 시간, /api/popular·/api/trending 조회 지연, 평점 이벤트 반영 비용,
+증분 갱신한 top-K가 처음부터 다시 만든 것과 같은지, 빌드하는 동안 이벤트 루프가 얼마나 멈추는지
+
+python benchmarks/bench_popularity.py --ratings 1000209 --events 20000 --repeat 2000
+
+합성 DB에서 popularity_index를 ratings로 만들고 스냅샷으로 다시 읽은 뒤, 장르 없이/장르별로 두 순위를
+--repeat번씩 조회한다. 그 다음 save_ratings로 --events개 평점(일부는 다시 매기기)을 쓰면서 record() 비용을
+재고, 마지막에 같은 DB로 새 인덱스를 만들어 순위가 같은지 비교한다.
+'''
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+from common import setup_app_env, make_synthetic_db, summarize, loop_stalls, GENRES
+
+
+async def measure(args) -> dict:
+    from database import async_session_maker, engine
+    from catalog import movie_catalog
+    from schemas import RatingBase
+    from popularity import PopularityIndex, popularity_index
+    from rating_writer import save_ratings
+    from main import get_popular, get_trending
+
+    report = {}
+    async with async_session_maker() as db:
+        await movie_catalog.load(db)
+        start = time.perf_counter()
+        # 빌드 중에도 이벤트 루프가 다른 요청을 처리할 수 있어야 한다 (틱이 늦게 깬 정도)
+        _, report["build_loop_stall"] = await loop_stalls(popularity_index.ensure_ready(db))
+        report["build_s"] = round(time.perf_counter() - start, 3)
+        popularity_index.save_snapshot()
+
+        reloaded = PopularityIndex()
+        start = time.perf_counter()
+        await reloaded.ensure_ready(db)
+        report["snapshot_load_s"] = round(time.perf_counter() - start, 3)
+
+        rng = random.Random(0)
+        for name, handler in (("popular", get_popular), ("trending", get_trending)):
+            for label, genres in (("all", [None]), ("genre", GENRES)):
+                samples = []
+                for _ in range(args.repeat):
+                    genre = rng.choice(genres)
+                    t0 = time.perf_counter()
+                    await handler(genre=genre, limit=10, db=db)
+                    samples.append(time.perf_counter() - t0)
+                report[f"{name}_{label}"] = summarize(samples)
+
+        # 평점 쓰기: record()는 커밋 뒤 한 번, 이벤트 하나당 배열 갱신 + 힙 몇 개
+        record = popularity_index.record
+        record_time = [0.0]
+
+        def timed_record(events):
+            t0 = time.perf_counter()
+            record(events)
+            record_time[0] += time.perf_counter() - t0
+        popularity_index.record = timed_record
+
+        now = int(time.time())
+        batch = []
+        for i in range(args.events):
+            batch.append(RatingBase(userId=rng.randint(1, 6040), movieId=rng.randint(1, 3883),
+                                    rating=float(rng.randint(1, 5)), timestamp=now + i))
+            if len(batch) == 100:
+                await save_ratings(db, batch)
+                batch = []
+                # 쓰는 중간중간 읽어서 힙이 갱신되는 경로를 탄다
+                popularity_index.ranking("popular", rng.choice([None, *GENRES]))
+                popularity_index.ranking("trending", rng.choice([None, *GENRES]))
+        if batch:
+            await save_ratings(db, batch)
+        report["record_us_per_event"] = round(record_time[0] / args.events * 1e6, 2)
+
+        # 같은 전체 평균 기준으로 비교한다
+        popularity_index.refresh_prior()
+        fresh = PopularityIndex(snapshot_path=os.devnull)
+        await fresh.build(db)
+        mismatches = []
+        for kind in ("popular", "trending"):
+            for genre in (None, *GENRES):
+                incremental = [m["movieId"] for m in popularity_index.ranking(kind, genre, 50)]
+                rebuilt = [m["movieId"] for m in fresh.ranking(kind, genre, 50)]
+                if incremental != rebuilt:
+                    mismatches.append(f"{kind}/{genre}")
+        report["incremental_matches_rebuild"] = not mismatches
+        report["mismatches"] = mismatches
+    await engine.dispose()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ratings", type=int, default=1_000_209)
+    parser.add_argument("--events", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "popularity.db")
+        setup_app_env(db_path)
+        os.environ.setdefault("LLM_WARMUP", "0")
+        os.chdir(tmp)  # app.log
+        make_synthetic_db(db_path, n_ratings=args.ratings)
+        report = asyncio.run(measure(args))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+'''
+평점 쓰기 처리량 (ratings/sec): 단건 /api/ratings (요청마다 COMMIT) vs 단건 + group commit vs /api/ratings/bulk 묶음 크기별
+
+python benchmarks/bench_rating_ingest.py --ratings-per-case 5000 --clients 32 --batch-sizes 1,10,100,1000
+
+파일 DB(prod 프로필, WAL + synchronous=NORMAL)에 앱을 그대로 띄우고 httpx ASGI 클라이언트로 호출한다.
+평점의 --rerate 비율은 이미 있는 (userId, movieId)를 다시 매기는 요청이고, 끝나면 movie_stats가
+ratings를 다시 집계한 값과 같은지 확인한다.
+'''
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from common import setup_app_env, make_synthetic_db, summarize
+
+
+def make_ratings(n: int, rerate: float, existing, rng: random.Random):
+    ratings = []
+    for _ in range(n):
+        if rng.random() < rerate:
+            userId, movieId = rng.choice(existing)
+        else:
+            userId, movieId = rng.randint(1, 6040), rng.randint(1, 3883)
+        ratings.append({"userId": userId, "movieId": movieId, "rating": float(rng.randint(1, 5)),
+                        "timestamp": int(time.time())})
+    return ratings
+
+
+async def run_cases(args, db_path):
+    import httpx
+    from database import engine
+    from rating_writer import rating_buffer
+    from main import app
+
+    conn = sqlite3.connect(db_path)
+    existing = conn.execute("SELECT userId, movieId FROM ratings ORDER BY random() LIMIT 20000").fetchall()
+    conn.close()
+    rng = random.Random(0)
+    report = {"clients": args.clients, "rerate": args.rerate, "cases": {}}
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://ingest", timeout=None) as client:
+
+            async def single(ratings, latencies, errors):
+                for rating in ratings:
+                    start = time.perf_counter()
+                    response = await client.post("/api/ratings", json=rating)
+                    if response.status_code == 200:
+                        latencies.append(time.perf_counter() - start)
+                    else:
+                        errors.append(response.status_code)
+
+            async def single_case(name, group_commit):
+                rating_buffer.enabled = group_commit
+                ratings = make_ratings(args.ratings_per_case, args.rerate, existing, rng)
+                latencies, errors = [], []
+                start = time.perf_counter()
+                await asyncio.gather(*[single(ratings[i::args.clients], latencies, errors)
+                                       for i in range(args.clients)])
+                elapsed = time.perf_counter() - start
+                report["cases"][name] = {"ratings_per_sec": round(len(latencies) / elapsed, 1),
+                                         "errors": len(errors), "request_latency": summarize(latencies)}
+
+            await single_case("single_commit_per_request", False)
+            flushes = rating_buffer.flushes
+            await single_case("single_group_commit", True)
+            report["cases"]["single_group_commit"]["commits"] = rating_buffer.flushes - flushes
+            rating_buffer.enabled = False
+
+            for size in [int(value) for value in args.batch_sizes.split(",")]:
+                ratings = make_ratings(args.ratings_per_case, args.rerate, existing, rng)
+                batches = [ratings[i:i + size] for i in range(0, len(ratings), size)]
+                latencies, errors = [], []
+
+                async def bulk(my_batches):
+                    for batch in my_batches:
+                        t0 = time.perf_counter()
+                        response = await client.post("/api/ratings/bulk", json=batch)
+                        if response.status_code == 200:
+                            latencies.append(time.perf_counter() - t0)
+                        else:
+                            errors.append(response.status_code)
+
+                # 큰 묶음은 요청 수가 적으니 동시 클라이언트 수도 요청 수를 넘지 않게
+                clients = min(args.clients, len(batches))
+                start = time.perf_counter()
+                await asyncio.gather(*[bulk(batches[i::clients]) for i in range(clients)])
+                elapsed = time.perf_counter() - start
+                report["cases"][f"bulk_{size}"] = {
+                    "ratings_per_sec": round(len(latencies) * size / elapsed, 1),
+                    "errors": len(errors), "request_latency": summarize(latencies)}
+    await engine.dispose()
+    return report
+
+
+def check_movie_stats(db_path: str) -> bool:
+    conn = sqlite3.connect(db_path)
+    mismatched = conn.execute(
+        "SELECT count(*) FROM (SELECT movieId, count(*) AS c, sum(rating) AS s FROM ratings GROUP BY movieId) r "
+        "LEFT JOIN movie_stats m USING (movieId) "
+        "WHERE m.ratingCount IS NOT r.c OR abs(m.ratingSum - r.s) > 1e-6").fetchone()[0]
+    conn.close()
+    return mismatched == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ratings", type=int, default=200_000, help="합성 DB의 기존 평점 수")
+    parser.add_argument("--ratings-per-case", type=int, default=5000)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--batch-sizes", default="1,10,100,1000")
+    parser.add_argument("--rerate", type=float, default=0.2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "ingest.db")
+        setup_app_env(db_path)
+        os.environ.setdefault("LLM_WARMUP", "0")
+        os.chdir(tmp)  # app.log
+        make_synthetic_db(db_path, n_ratings=args.ratings)
+        report = asyncio.run(run_cases(args, db_path))
+        report["movie_stats_consistent"] = check_movie_stats(db_path)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
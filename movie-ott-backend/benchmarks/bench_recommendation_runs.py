@@ -0,0 +1,134 @@
+'''
+run 단위 추천 저장: 최신 run 조회 / run 저장 지연 시간과 compaction 전후 테이블 크기
+
+python benchmarks/bench_recommendation_runs.py --users 2000 --runs-per-user 30 --repeat 500
+
+유저마다 --runs-per-user개(각 10편)의 run을 쌓은 뒤 /api/recommended 핸들러와 insert_recommend를 재고,
+같은 runId로 다시 저장해도 행이 늘지 않는지, 다른 영화로 다시 쓰면 새 영화만 남는지 확인한다.
+그 다음 compact_recommendations로 유저별 최근 --keep개만 남기고 같은 측정을 반복한다.
+'''
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from common import setup_app_env, make_synthetic_db, summarize
+
+
+def seed_runs(db_path: str, n_users: int, runs_per_user: int, n_movies: int = 3883):
+    rng = random.Random(2)
+    conn = sqlite3.connect(db_path)
+    runs, items = [], []
+    started = 1_750_000_000.0
+    for userId in range(1, n_users + 1):
+        for run in range(runs_per_user):
+            runId = f"seed-{userId}-{run}"
+            created_at = started + run * 3600 + rng.random()
+            runs.append((runId, userId, 2, 'LLM-Gemini-Prompt-v1', created_at, 10))
+            for rank, movieId in enumerate(rng.sample(range(1, n_movies + 1), 10)):
+                items.append((runId, movieId, userId, rank, round(rng.uniform(1, 5), 1), str(created_at),
+                              2, 'LLM-Gemini-Prompt-v1'))
+    conn.executemany('INSERT INTO recommendation_runs ("runId", "userId", "recommenderId", "recommenderName", '
+                     '"createdAt", "itemCount") VALUES (?, ?, ?, ?, ?, ?)', runs)
+    conn.executemany('INSERT INTO recommendations ("runId", "movieId", "userId", rank, "meanRating", timestamp, '
+                     '"recommenderId", "recommenderName") VALUES (?, ?, ?, ?, ?, ?, ?, ?)', items)
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+
+def table_sizes(db_path: str) -> dict:
+    conn = sqlite3.connect(db_path)
+    sizes = {"runs": conn.execute("SELECT count(*) FROM recommendation_runs").fetchone()[0],
+             "items": conn.execute("SELECT count(*) FROM recommendations").fetchone()[0]}
+    conn.close()
+    return sizes
+
+
+async def measure(args, db_path: str) -> dict:
+    from fastapi import Response
+    from database import async_session_maker, engine
+    from llm_recommend import insert_recommend
+    from recommendation_store import compact_recommendations
+    from main import get_recommend
+
+    rng = random.Random(0)
+    report = {}
+
+    async def phase(name):
+        read_times, write_times = [], []
+        async with async_session_maker() as db:
+            for _ in range(args.repeat):
+                userId = rng.randint(1, args.users)
+                start = time.perf_counter()
+                await get_recommend(str(userId), Response(), db, limit=10, cursor=None)
+                read_times.append(time.perf_counter() - start)
+            for _ in range(args.repeat // 10):
+                movies = [{"movieId": m, "rating": 4.0, "timestamp": time.time()}
+                          for m in rng.sample(range(1, 3884), 10)]
+                start = time.perf_counter()
+                await insert_recommend(movies, rng.randint(1, args.users), db)
+                write_times.append(time.perf_counter() - start)
+        report[name] = {"tables": table_sizes(db_path),
+                        "latest_run_page": summarize(read_times),
+                        "insert_run": summarize(write_times)}
+
+    await phase("before_compaction")
+
+    # 같은 runId로 두 번 저장해도 run/행 수는 한 번 저장한 것과 같아야 한다
+    async with async_session_maker() as db:
+        movies = [{"movieId": m, "rating": 3.5, "timestamp": time.time()} for m in range(1, 11)]
+        before = table_sizes(db_path)
+        await insert_recommend(movies, 1, db, runId="idempotency-check")
+        once = table_sizes(db_path)
+        await insert_recommend(movies, 1, db, runId="idempotency-check")
+        report["idempotent_rewrite"] = table_sizes(db_path) == once and once["items"] == before["items"] + 10
+
+        # 같은 runId를 다른 영화로 다시 쓰면 (batch_recommend --resume) 이전 영화가 남으면 안 된다
+        rewritten = [{"movieId": m, "rating": 4.5, "timestamp": time.time()} for m in range(101, 104)]
+        await insert_recommend(rewritten, 1, db, runId="idempotency-check")
+        conn = sqlite3.connect(db_path)
+        rows = conn.execute('SELECT "movieId", rank FROM recommendations WHERE "runId" = ?',
+                            ("idempotency-check",)).fetchall()
+        item_count = conn.execute('SELECT "itemCount" FROM recommendation_runs WHERE "runId" = ?',
+                                  ("idempotency-check",)).fetchone()[0]
+        conn.close()
+        report["rewrite_replaces_items"] = (sorted(m for m, _ in rows) == [101, 102, 103]
+                                            and sorted(r for _, r in rows) == [0, 1, 2] and item_count == 3)
+
+        start = time.perf_counter()
+        removed = await compact_recommendations(db, keep=args.keep)
+        report["compaction"] = {"keep": args.keep, "runs_removed": removed,
+                                "seconds": round(time.perf_counter() - start, 3)}
+
+    await phase("after_compaction")
+    await engine.dispose()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ratings", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--runs-per-user", type=int, default=30)
+    parser.add_argument("--keep", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "runs.db")
+        setup_app_env(db_path)
+        os.environ.setdefault("LLM_WARMUP", "0")
+        os.chdir(tmp)  # app.log
+        make_synthetic_db(db_path, n_ratings=args.ratings)
+        seed_runs(db_path, args.users, args.runs_per_user)
+        report = asyncio.run(measure(args, db_path))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
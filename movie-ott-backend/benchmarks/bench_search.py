@@ -0,0 +1,87 @@
+'''
+/api/search 검색 엔진 비교: movies ILIKE '%q%' SQL vs 메모리 역색인 (queries/sec)
+
+python benchmarks/bench_search.py --movies 3883 --queries 2000
+python benchmarks/bench_search.py --movies 388300   # 100배 카탈로그
+'''
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+from common import setup_app_env, make_synthetic_db, GENRES
+
+
+def make_queries(titles, n, seed=0):
+    # 타이핑 중인 검색어처럼 제목 단어/장르의 접두사를 만든다
+    rng = random.Random(seed)
+    words = [w for title in titles[:500] for w in title.split() if w.isalpha()] + GENRES
+    queries = []
+    for _ in range(n):
+        word = rng.choice(words)
+        queries.append(word[:rng.randint(2, len(word))])
+    return queries
+
+
+async def run(args, titles):
+    from sqlalchemy import select
+    from database import async_session_maker, engine
+    from models import Movies
+    from catalog import MovieCatalog
+
+    queries = make_queries(titles, args.queries)
+    async with async_session_maker() as db:
+        # 수정 전 search_movies 쿼리
+        start = time.perf_counter()
+        for q in queries[:args.sql_queries]:
+            search_term = f"%{q}%"
+            results = await db.execute(select(Movies).where(
+                Movies.title.ilike(search_term) | Movies.genre.ilike(search_term)))
+            [dict(movieId=m.movieId, title=m.title, genre=m.genre) for m in results.scalars().all()]
+        sql_qps = args.sql_queries / (time.perf_counter() - start)
+
+        catalog = MovieCatalog()
+        start = time.perf_counter()
+        await catalog.load(db)
+        load_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for q in queries:
+        catalog.search(q)
+    scan_qps = len(queries) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for q in queries:
+        records, _ = catalog.search_page(q, limit=args.limit)
+        [record.as_dict() for record in records]
+    index_qps = len(queries) / (time.perf_counter() - start)
+
+    await engine.dispose()
+    return {"movies": args.movies,
+            "catalog_and_index_load_s": round(load_s, 3),
+            "sql_ilike_qps": round(sql_qps, 1),
+            "memory_substring_scan_qps": round(scan_qps, 1),
+            "inverted_index_qps": round(index_qps, 1),
+            "page_limit": args.limit}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--movies", type=int, default=3883)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--sql-queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        setup_app_env(db_path)
+        titles = make_synthetic_db(db_path, n_users=100, n_movies=args.movies, n_ratings=1000)
+        print(json.dumps(asyncio.run(run(args, titles)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
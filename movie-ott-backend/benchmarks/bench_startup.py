@@ -0,0 +1,126 @@
+'''
+애플리케이션 cold start 측정: import 시간(모듈별), startup 이벤트, 첫 응답까지의 시간
+
+python benchmarks/bench_startup.py --runs 3
+
+lazy  : 기본 동작, LLM chain은 첫 추천 요청에서 만든다 (LLM_WARMUP=0으로 warm-up도 끈다)
+eager : 수정 전처럼 서비스 전에 chain을 만든 경우 (import 직후 get_chain() 호출)
+모듈별 import 시간은 python -X importtime 결과에서 app 모듈과 무거운 top-level 패키지만 뽑는다.
+'''
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import APP_DIR, setup_app_env, make_synthetic_db
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+async def _first_responses(app):
+    import httpx
+    timings = {}
+    start = time.perf_counter()
+    async with app.router.lifespan_context(app):
+        timings["startup_s"] = time.perf_counter() - start
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            for name, url in (("root", "/"), ("search", "/api/search?query=dra")):
+                request_start = time.perf_counter()
+                response = await client.get(url)
+                assert response.status_code == 200, response.text
+                timings[f"first_{name}_s"] = time.perf_counter() - request_start
+    return timings
+
+
+def worker(db_path: str, eager: bool):
+    # 부모 프로세스가 만든 DB로 import부터 첫 응답까지 측정, 결과는 stdout에 JSON 한 줄
+    import asyncio
+    process_start = time.perf_counter()
+    setup_app_env(db_path)
+    os.environ["LLM_WARMUP"] = "0"
+
+    start = time.perf_counter()
+    import llm_recommend
+    from main import app
+    timings = {"import_main_s": time.perf_counter() - start}
+    if eager:
+        start = time.perf_counter()
+        llm_recommend.get_chain()
+        timings["chain_build_s"] = time.perf_counter() - start
+
+    timings.update(asyncio.run(_first_responses(app)))
+    timings["ready_s"] = time.perf_counter() - process_start
+
+    if not eager:
+        # lazy 모드에서 첫 추천 요청이 추가로 부담하는 비용
+        start = time.perf_counter()
+        llm_recommend.get_chain()
+        timings["deferred_chain_build_s"] = time.perf_counter() - start
+    print(json.dumps(timings))
+
+
+def run_worker(db_path: str, eager: bool) -> dict:
+    args = [sys.executable, os.path.join(BENCH_DIR, "bench_startup.py"), "--worker-db", db_path]
+    if eager:
+        args.append("--eager")
+    start = time.perf_counter()
+    out = subprocess.run(args, cwd=APP_DIR, capture_output=True, text=True, check=True).stdout
+    timings = json.loads(out.strip().splitlines()[-1])
+    timings["process_wall_s"] = time.perf_counter() - start
+    return timings
+
+
+def import_times(db_path: str, top: int) -> dict:
+    env = dict(os.environ, DATABASE_URL=f"sqlite+aiosqlite:///{db_path}")
+    env.setdefault("GOOGLE_API_KEY", "benchmark-dummy-key")
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=APP_DIR,
+                            env=env, capture_output=True, text=True, check=True).stderr
+    app_modules = {name[:-3] for name in os.listdir(APP_DIR) if name.endswith(".py")}
+    app_times, packages = {}, {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, _self_us, cumulative_us, name = [part for part in line.replace("import time:", "|").split("|")]
+        module = name.strip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        cumulative_ms = int(cumulative_us) / 1000
+        if module in app_modules:
+            app_times[module] = round(cumulative_ms, 1)
+        elif depth <= 1 and "." not in module:
+            packages[module] = round(max(packages.get(module, 0.0), cumulative_ms), 1)
+    heaviest = dict(sorted(packages.items(), key=lambda item: -item[1])[:top])
+    return {"app_modules_cumulative_ms": dict(sorted(app_times.items(), key=lambda item: -item[1])),
+            "heaviest_packages_ms": heaviest}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--worker-db", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--eager", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker_db:
+        worker(args.worker_db, args.eager)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        setup_app_env(db_path)
+        make_synthetic_db(db_path, n_ratings=100_000)
+
+        report = {"runs": args.runs}
+        for mode in ("lazy", "eager"):
+            runs = [run_worker(db_path, mode == "eager") for _ in range(args.runs)]
+            report[mode] = {key: round(statistics.median(run[key] for run in runs), 3) for key in runs[0]}
+        report["import_time"] = import_times(db_path, args.top)
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
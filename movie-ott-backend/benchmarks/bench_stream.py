@@ -0,0 +1,98 @@
+'''
+스트리밍 추천 time-to-first-recommendation 측정: POST /api/recommend vs POST /api/recommend/stream
+
+python benchmarks/bench_stream.py --delay 2.0 --requests 20
+
+가짜 모델은 응답 JSON을 --delay초 동안 조금씩 흘려보낸다 (make_fake_model의 astream).
+httpx ASGITransport는 응답 본문을 다 모은 뒤 돌려주므로, ASGI app을 직접 호출하고
+send()로 body chunk가 도착한 시각을 기록한다.
+'''
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from common import setup_app_env, make_synthetic_db, make_fake_chain, summarize
+
+
+async def call_asgi(app, path: str, payload: dict):
+    """
+    Returns (status, seconds to the first recommendation, seconds to the end of the body).
+    """
+    body = json.dumps(payload).encode()
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+             "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+             "root_path": "", "headers": [(b"content-type", b"application/json"),
+                                          (b"content-length", str(len(body)).encode())],
+             "client": ("127.0.0.1", 1234), "server": ("bench", 80)}
+    received = False
+    buffer = bytearray()
+    state = {"status": None, "first": None}
+    start = time.perf_counter()
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await asyncio.sleep(3600)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            state["status"] = message["status"]
+        elif message["type"] == "http.response.body" and state["first"] is None:
+            buffer.extend(message.get("body", b""))
+            # 스트리밍은 첫 recommendation 이벤트, 일반 응답은 본문 전체가 와야 첫 추천을 볼 수 있다
+            if b"event: recommendation" in buffer or (b"movieInfo" in buffer and not message.get("more_body")):
+                state["first"] = time.perf_counter() - start
+
+    await app(scope, receive, send)
+    return state["status"], state["first"], time.perf_counter() - start
+
+
+async def run(args, titles):
+    import llm_recommend
+    from main import app
+
+    llm_recommend.chain = make_fake_chain(titles, delay=args.delay)
+    report = {"delay_s": args.delay, "requests": args.requests}
+    async with app.router.lifespan_context(app):
+        user_id = 1
+        for name, path in (("blocking", "/api/recommend"), ("stream", "/api/recommend/stream")):
+            first, total, errors = [], [], 0
+            for _ in range(args.requests):
+                # 유저마다 프롬프트가 달라 캐시에 걸리지 않는다
+                status, first_s, total_s = await call_asgi(app, path, {"userId": str(user_id)})
+                user_id += 1
+                if status != 200 or first_s is None:
+                    errors += 1
+                    continue
+                first.append(first_s)
+                total.append(total_s)
+            report[name] = {"time_to_first_recommendation": summarize(first),
+                            "total": summarize(total),
+                            "errors": errors}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--delay", type=float, default=2.0, help="가짜 LLM 전체 생성 시간 (초)")
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--movies", type=int, default=3883)
+    parser.add_argument("--ratings", type=int, default=50_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        setup_app_env(db_path)
+        titles = make_synthetic_db(db_path, args.users, args.movies, args.ratings)
+        print(json.dumps(asyncio.run(run(args, titles)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
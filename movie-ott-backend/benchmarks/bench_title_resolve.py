@@ -0,0 +1,119 @@
+'''
+LLM 출력 제목 -> movieId 변환 비교: 정확 일치(Movies.title.in_) vs TitleResolver (정규화 + trigram/편집 거리)
+
+python benchmarks/bench_title_resolve.py --movies 3883 --batches 2000
+
+카탈로그 제목 일부는 MovieLens처럼 "Matrix, The (1999)" 형태로 관사를 뒤로 보내고,
+LLM이 흔히 바꿔 쓰는 형태(연도 누락, 관사 앞으로, 문장 부호/대소문자 변경, 오타 한 글자)로 질의를 만든다.
+'''
+import argparse
+import json
+import random
+import time
+
+from common import setup_app_env, GENRES
+
+ARTICLES = ["The", "A", "An"]
+
+
+def make_catalog(n_movies: int, rng: random.Random):
+    from catalog import MovieRecord
+    syllables = ["ka", "ro", "mi", "ten", "sa", "lo", "ver", "an", "dor", "ei", "ly", "mon",
+                 "tra", "qui", "zen", "bel", "or", "ni", "pa", "ust"]
+    vocabulary = sorted({"".join(rng.sample(syllables, rng.randint(2, 3))).capitalize() for _ in range(3000)})
+    records, seen = [], set()
+    for movieId in range(1, n_movies + 1):
+        title = None
+        while title is None or title in seen:
+            words = " ".join(rng.sample(vocabulary, rng.randint(1, 4)))
+            if rng.random() < 0.2:
+                words = f"{words}, {rng.choice(ARTICLES)}"
+            elif rng.random() < 0.1:
+                words = words.replace(" ", ": ", 1)
+            title = f"{words} ({rng.randint(1919, 2000)})"
+        seen.add(title)
+        records.append(MovieRecord(movieId, title, rng.choice(GENRES)))
+    return records
+
+
+def llm_variant(title: str, rng: random.Random) -> str:
+    # 모델이 제목을 되돌려줄 때 흔히 생기는 변형
+    name, year = title[:-7], title[-6:]
+    kind = rng.choice(["exact", "no_year", "article", "punctuation", "case", "typo"])
+    if kind == "no_year":
+        return name
+    if kind == "article":
+        for article in ARTICLES:
+            if name.endswith(f", {article}"):
+                return f"{article} {name[:-len(article) - 2]} {year}"
+        return f"{name} {year}"
+    if kind == "punctuation":
+        return f"{name.replace(':', ' -').replace(',', '')} {year}"
+    if kind == "case":
+        return f"{name.lower()} {year}"
+    if kind == "typo" and len(name) > 6:
+        i = rng.randrange(1, len(name) - 1)
+        return f"{name[:i]}{name[i + 1:]} {year}"
+    return title
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--movies", type=int, default=3883)
+    parser.add_argument("--batches", type=int, default=2000, help="10개짜리 추천 목록 수")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    setup_app_env(":memory:")
+    from title_index import TitleResolver
+
+    rng = random.Random(args.seed)
+    records = make_catalog(args.movies, rng)
+    by_title = {record.title: record.movieId for record in records}
+
+    start = time.perf_counter()
+    resolver = TitleResolver()
+    resolver.build(records)
+    build_s = time.perf_counter() - start
+
+    batches = []
+    for _ in range(args.batches):
+        targets = rng.sample(records, 10)
+        batches.append(([record.movieId for record in targets], [llm_variant(r.title, rng) for r in targets]))
+
+    exact_correct = 0
+    start = time.perf_counter()
+    for expected, titles in batches:
+        found = [by_title.get(title) for title in titles]
+        exact_correct += sum(1 for movieId, want in zip(found, expected) if movieId == want)
+    exact_s = time.perf_counter() - start
+
+    resolved_correct = wrong = 0
+    start = time.perf_counter()
+    for expected, titles in batches:
+        for match, want in zip(resolver.resolve(titles), expected):
+            if match is None:
+                continue
+            if match.movieId == want:
+                resolved_correct += 1
+            else:
+                wrong += 1
+    resolve_s = time.perf_counter() - start
+
+    total = args.batches * 10
+    print(json.dumps({
+        "movies": args.movies,
+        "titles": total,
+        "index_build_ms": round(build_s * 1000, 1),
+        "exact_match": {"recall": round(exact_correct / total, 4),
+                        "avg_matched_per_10": round(exact_correct / args.batches, 2),
+                        "us_per_title": round(exact_s / total * 1e6, 2)},
+        "title_resolver": {"recall": round(resolved_correct / total, 4),
+                           "wrong_movie": round(wrong / total, 4),
+                           "avg_matched_per_10": round(resolved_correct / args.batches, 2),
+                           "us_per_title": round(resolve_s / total * 1e6, 2)},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+'''
+유저 프로필: 추천 프롬프트 + 후보 필터링 준비 시간 (ratings 조인 vs 프로필), 평점 쓰기 비용,
+증분 갱신한 프로필이 ratings에서 다시 만든 것과 같은지
+
+python benchmarks/bench_user_profiles.py --ratings 1000209 --users 6040 --events 20000 --repeat 2000
+
+before: get_rating_history(ratings ⋈ movies) + 유저 평점 전체 조회 + 장르 선호도 계산 (변경 전 recommend_func 경로)
+after: user_profiles.get (cold = ratings에서 만들기, table = user_profiles 행, warm = 메모리 LRU)
+그 다음 save_ratings로 --events개 평점(일부는 다시 매기기, 일부는 상위 평점을 낮추기)을 쓰고,
+모든 유저의 프로필을 ratings에서 새로 만든 것과 비교한다.
+'''
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+from common import setup_app_env, make_synthetic_db, summarize
+
+
+async def before_path(userId: int, db):
+    # 변경 전: 히스토리 조인 + 후보 필터링용 평점 전체 조회
+    from sqlalchemy import select
+    from models import Ratings
+    from llm_recommend import get_rating_history, fill_template, target_template
+    from candidates import genre_affinity
+
+    history = await get_rating_history(userId, db)
+    prompt = fill_template(target_template, history)
+    results = await db.execute(select(Ratings.movieId, Ratings.rating).where(Ratings.userId == userId))
+    rated = {row.movieId: row.rating for row in results.all()}
+    return prompt, rated, genre_affinity(rated)
+
+
+async def after_path(userId: int, db):
+    from llm_recommend import fill_template, target_template
+    from user_profiles import user_profiles
+
+    profile = await user_profiles.get(userId, db)
+    prompt = fill_template(target_template, {'rating_history': profile.rating_history()})
+    return prompt, profile.rated, profile.genre_affinity()
+
+
+async def timed(fn, user_ids, db) -> dict:
+    samples = []
+    for userId in user_ids:
+        t0 = time.perf_counter()
+        await fn(userId, db)
+        samples.append(time.perf_counter() - t0)
+    return summarize(samples)
+
+
+def same_profile(a, b) -> bool:
+    if a.count != b.count or abs(a.total - b.total) > 1e-6 or a.rated != b.rated:
+        return False
+    if a.top_rated() != b.top_rated():
+        return False
+    affinity_a, affinity_b = a.genre_affinity(), b.genre_affinity()
+    return (affinity_a.keys() == affinity_b.keys()
+            and all(abs(affinity_a[g] - affinity_b[g]) < 1e-9 for g in affinity_a))
+
+
+async def measure(args) -> dict:
+    from sqlalchemy import select
+    from database import async_session_maker, engine
+    from catalog import movie_catalog
+    from models import Ratings
+    from schemas import RatingBase
+    from rating_writer import save_ratings
+    from user_profiles import user_profiles, UserProfile
+
+    report = {}
+    rng = random.Random(0)
+    async with async_session_maker() as db:
+        await movie_catalog.load(db)
+        sample = [rng.randint(1, args.users) for _ in range(args.repeat)]
+        distinct = list(dict.fromkeys(sample))
+
+        # 같은 유저에 대해 결과가 같은지 먼저 확인
+        mismatched = 0
+        for userId in distinct[:200]:
+            prompt_a, rated_a, affinity_a = await before_path(userId, db)
+            prompt_b, rated_b, affinity_b = await after_path(userId, db)
+            if prompt_a != prompt_b or set(rated_a) != rated_b or affinity_a.keys() != affinity_b.keys():
+                mismatched += 1
+        report["before_after_mismatches"] = mismatched
+        user_profiles.clear()
+
+        report["before"] = await timed(before_path, sample, db)
+        report["after_cold"] = await timed(after_path, distinct, db)
+        user_profiles.clear()
+        report["after_table"] = await timed(after_path, distinct, db)
+        report["after_warm"] = await timed(after_path, sample, db)
+
+        # 쓰기: 새 평점, 다시 매기기, 상위 평점을 1점으로 낮추기 (힙이 stale이 되는 경로)
+        apply = user_profiles.apply
+        apply_time = [0.0]
+
+        async def timed_apply(session, events):
+            t0 = time.perf_counter()
+            await apply(session, events)
+            apply_time[0] += time.perf_counter() - t0
+        user_profiles.apply = timed_apply
+
+        now = int(time.time())
+        batch = []
+        start = time.perf_counter()
+        for i in range(args.events):
+            userId = rng.choice(distinct) if rng.random() < 0.5 else rng.randint(1, args.users)
+            profile = user_profiles._entries.get(userId)
+            if profile is not None and profile.top and rng.random() < 0.1:
+                movieId, rating = profile.top_rated()[0][2], 1.0
+            else:
+                movieId, rating = rng.randint(1, args.movies), float(rng.randint(1, 5))
+            batch.append(RatingBase(userId=userId, movieId=movieId, rating=rating, timestamp=now + i))
+            if len(batch) == args.batch:
+                await save_ratings(db, batch)
+                batch = []
+        if batch:
+            await save_ratings(db, batch)
+        user_profiles.apply = apply
+        report["write_s"] = round(time.perf_counter() - start, 3)
+        report["apply_us_per_event"] = round(apply_time[0] / args.events * 1e6, 2)
+
+        # 메모리, 테이블 모두 ratings에서 새로 만든 것과 비교
+        mismatches = []
+        for layer in ("memory", "table"):
+            if layer == "table":
+                user_profiles.clear()
+            for userId in distinct:
+                results = await db.execute(
+                    select(Ratings.movieId, Ratings.rating, Ratings.timestamp).where(Ratings.userId == userId)
+                )
+                fresh = UserProfile.from_ratings(userId, results.all(), user_profiles.top_n)
+                if not same_profile(await user_profiles.get(userId, db), fresh):
+                    mismatches.append(f"{layer}/{userId}")
+        report["incremental_matches_rebuild"] = not mismatches
+        report["mismatches"] = mismatches[:20]
+        report["store"] = user_profiles.stats()
+    await engine.dispose()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=6040)
+    parser.add_argument("--movies", type=int, default=3883)
+    parser.add_argument("--ratings", type=int, default=1_000_209)
+    parser.add_argument("--events", type=int, default=20_000)
+    parser.add_argument("--batch", type=int, default=100, help="save_ratings 한 번에 쓰는 평점 수")
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "profiles.db")
+        setup_app_env(db_path)
+        os.environ.setdefault("LLM_WARMUP", "0")
+        os.chdir(tmp)  # app.log
+        make_synthetic_db(db_path, args.users, args.movies, args.ratings)
+        report = asyncio.run(measure(args))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
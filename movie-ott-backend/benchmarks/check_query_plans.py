@@ -0,0 +1,122 @@
+'''
+API 요청 경로에서 실행되는 모든 SQL의 EXPLAIN QUERY PLAN 검사
+
+python benchmarks/check_query_plans.py
+
+/api/search, /api/rating_history, /api/recommend (llm, item-cf, mode=job 작업 큐), /api/recommended(cursor 페이지 포함),
+/api/ratings를
+가짜 LLM으로 호출하면서 실행된 쿼리를 모은 뒤, 큰 테이블을 SCAN(전체 탐색)하는 계획이 있으면
+쿼리와 계획을 출력하고 종료 코드 1로 끝난다. 시작 시 한 번만 도는 적재 쿼리(카탈로그, movie_stats,
+item-cf 빌드)는 검사 대상이 아니다.
+'''
+import argparse
+import asyncio
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+
+from common import setup_app_env, make_synthetic_db, make_fake_chain
+
+LARGE_TABLES = ("ratings", "recommendations", "movies", "users", "recommend_jobs")
+_SCAN = re.compile(r"^SCAN (\w+)")
+
+
+def full_scans(conn: sqlite3.Connection, statement: str, parameters) -> tuple:
+    if isinstance(parameters, list):
+        parameters = parameters[0]  # executemany는 첫 번째 행의 값으로 계획을 본다
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {statement}", parameters or ()).fetchall()
+    details = [row[-1] for row in plan]
+    return [d for d in details
+            if (m := _SCAN.match(d)) and m.group(1) in LARGE_TABLES], details
+
+
+async def capture_queries(titles):
+    import httpx
+    from sqlalchemy import event
+    import llm_recommend
+    from database import engine, async_session_maker
+    from item_cf import item_cf_recommender
+    from main import app
+
+    llm_recommend.chain = make_fake_chain(titles, delay=0)
+    captured = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")):
+            captured.append((statement, parameters))
+
+    async with app.router.lifespan_context(app):
+        async with async_session_maker() as db:
+            await item_cf_recommender.ensure_ready(db)
+
+        event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://plan", timeout=None) as client:
+            calls = [
+                client.get("/api/search", params={"query": "comedy"}),
+                client.post("/api/rating_history", json={"userId": "1"}),
+                client.post("/api/recommend", json={"userId": "2"}),
+                client.post("/api/recommend", json={"userId": "3", "recommender": "item-cf"}),
+                client.get("/api/recommended", params={"userId": "2"}),
+                client.post("/api/ratings", json={"userId": 4, "movieId": 3883, "rating": 4.0, "timestamp": 1}),
+            ]
+            for call in calls:
+                response = await call
+                if response.status_code >= 400:
+                    raise RuntimeError(f"{response.request.url}: {response.status_code} {response.text}")
+
+            # cursor가 붙은 다음 페이지 쿼리도 인덱스 범위 탐색이어야 한다
+            response = await client.post("/api/rating_history", params={"limit": 3}, json={"userId": "1"})
+            await client.post("/api/rating_history", params={"limit": 3, "cursor": response.json()["nextCursor"]},
+                              json={"userId": "1"})
+            response = await client.get("/api/recommended", params={"userId": "2", "limit": 3})
+            await client.get("/api/recommended",
+                             params={"userId": "2", "limit": 3, "cursor": response.headers["X-Next-Cursor"]})
+
+            # 작업 큐: 등록(+ 중복 합치기), worker의 claim/완료, 상태/결과 조회
+            response = await client.post("/api/recommend", params={"mode": "job"}, json={"userId": "5"})
+            await client.post("/api/recommend", params={"mode": "job"}, json={"userId": "5"})
+            result_url = f"/api/recommend/jobs/{response.json()['jobId']}/result"
+            while (await client.get(result_url)).status_code == 202:
+                await asyncio.sleep(0.05)
+        event.remove(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    await engine.dispose()
+    return captured
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ratings", type=int, default=200_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "plan.db")
+        setup_app_env(db_path)
+        os.environ["ITEM_CF_CACHE_PATH"] = os.path.join(tmp, "item_cf.npz")
+        titles = make_synthetic_db(db_path, n_ratings=args.ratings)
+        captured = asyncio.run(capture_queries(titles))
+
+        conn = sqlite3.connect(db_path)
+        conn.execute("ANALYZE")
+        failures = 0
+        seen = set()
+        for statement, parameters in captured:
+            if statement in seen:
+                continue
+            seen.add(statement)
+            scans, details = full_scans(conn, statement, parameters)
+            status = "FULL SCAN" if scans else "ok"
+            print(f"[{status}] {' '.join(statement.split())[:120]}")
+            for detail in details:
+                print(f"    {detail}")
+            failures += bool(scans)
+        conn.close()
+
+    print(f"\n{len(seen)} queries checked, {failures} with full table scans on {', '.join(LARGE_TABLES)}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+'''
+LLM 없이 바로 결과를 내는 추천기(item-cf, content, popular)가 유저가 이미 평가한 영화를 추천하지 않는지 검사
+
+python benchmarks/check_rated_excluded.py --users 200
+
+합성 DB에서 무작위 유저마다 LOCAL_RECOMMENDERS의 함수를 그대로 호출하고, 결과 movieId가
+user_profiles의 profile.rated(평가한 영화 전체)에 있으면 추천기별로 세어 출력한다. 하나라도 있으면 종료 코드 1.
+'''
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+
+from common import setup_app_env, make_synthetic_db
+
+
+async def check(args) -> dict:
+    from database import async_session_maker, engine
+    from catalog import movie_catalog
+    from llm_recommend import LOCAL_RECOMMENDERS
+    from user_profiles import user_profiles
+
+    rng = random.Random(0)
+    report = {name: {"results": 0, "already_rated": 0} for name in LOCAL_RECOMMENDERS}
+    async with async_session_maker() as db:
+        await movie_catalog.load(db)
+        for userId in rng.sample(range(1, args.n_users + 1), args.users):
+            profile = await user_profiles.get(userId, db)
+            for name, (recommend, _, _) in LOCAL_RECOMMENDERS.items():
+                movies = await recommend(userId, db)
+                report[name]["results"] += len(movies)
+                report[name]["already_rated"] += sum(movie["movieId"] in profile.rated for movie in movies)
+    await engine.dispose()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ratings", type=int, default=200_000)
+    parser.add_argument("--n-users", type=int, default=6040)
+    parser.add_argument("--users", type=int, default=200, help="검사할 유저 수")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "rated.db")
+        setup_app_env(db_path)
+        os.environ.setdefault("LLM_WARMUP", "0")
+        os.environ["ITEM_CF_CACHE_PATH"] = os.path.join(tmp, "item_cf.npz")
+        os.environ["CONTENT_VECTORS_PATH"] = os.path.join(tmp, "content_vectors.npy")
+        os.environ["CONTENT_INDEX_PATH"] = os.path.join(tmp, "content_index.npz")
+        os.chdir(tmp)  # app.log
+        make_synthetic_db(db_path, n_users=args.n_users, n_ratings=args.ratings)
+        report = asyncio.run(check(args))
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if any(counts["already_rated"] for counts in report.values()) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+# 벤치마크 공용 도구: 합성 MovieLens 데이터, 가짜 LLM, 지연 시간 통계
+import asyncio
+import itertools
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+from typing import Any, List, Optional
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+
+GENRES = ["Action", "Adventure", "Animation", "Children's", "Comedy", "Crime",
+          "Documentary", "Drama", "Fantasy", "Film-Noir", "Horror", "Musical",
+          "Mystery", "Romance", "Sci-Fi", "Thriller", "War", "Western"]
+
+
+def setup_app_env(db_path: str):
+    """
+    Point the backend at db_path and make the flat app modules importable.
+    Must be called before importing database / main / llm_recommend.
+    """
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{db_path}"
+    os.environ.setdefault("DB_PROFILE", "prod")  # SQL echo가 측정값을 왜곡하지 않도록
+    os.environ.setdefault("GOOGLE_API_KEY", "benchmark-dummy-key")
+    os.environ.setdefault("GEMINI_CREDENTIAL_PATH", "")
+    # 시작 시 만드는 스냅샷이 저장소(app/)가 아니라 DB 옆에 생기도록
+    os.environ.setdefault("POPULARITY_SNAPSHOT_PATH", os.path.join(os.path.dirname(db_path), "popularity.npz"))
+    if APP_DIR not in sys.path:
+        sys.path.insert(0, APP_DIR)
+
+
+def make_synthetic_db(db_path: str, n_users: int = 6040, n_movies: int = 3883,
+                      n_ratings: int = 1_000_209, seed: int = 0) -> List[str]:
+    """
+    Create a MovieLens-1M shaped SQLite file and return the movie titles.
+    """
+    from sqlalchemy import create_engine
+    from models import Base
+    from genre_bits import genre_mask
+
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    sync_engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(sync_engine)
+    sync_engine.dispose()
+
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+
+    users = [(u, rng.choice("MF"), rng.choice([1, 18, 25, 35, 45, 50, 56]),
+              str(rng.randint(0, 20)), f"{rng.randint(10000, 99999)}")
+             for u in range(1, n_users + 1)]
+    # 음절을 이어 붙인 가짜 단어로 제목을 만든다 (제목은 유일해야 한다)
+    syllables = ["ka", "ro", "mi", "ten", "sa", "lo", "ver", "an", "dor", "ei", "ly", "mon",
+                 "tra", "qui", "zen", "bel", "or", "ni", "pa", "ust"]
+    vocabulary = sorted({"".join(rng.sample(syllables, rng.randint(1, 3))).capitalize()
+                         for _ in range(3000)})
+    titles = []
+    movies = []
+    seen_titles = set()
+    for m in range(1, n_movies + 1):
+        title = None
+        while title is None or title in seen_titles:
+            words = " ".join(rng.sample(vocabulary, rng.randint(1, 4)))
+            title = f"{words} ({rng.randint(1919, 2000)})"
+        seen_titles.add(title)
+        genre = "|".join(rng.sample(GENRES, rng.randint(1, 3)))
+        titles.append(title)
+        movies.append((m, title, genre, genre_mask(genre)))
+
+    conn.execute("BEGIN")
+    conn.executemany("INSERT INTO users VALUES (?, ?, ?, ?, ?)", users)
+    conn.executemany("INSERT INTO movies (movieId, title, genre, genreMask) VALUES (?, ?, ?, ?)", movies)
+    conn.executemany("INSERT INTO recommenders (id, model_name, is_active, start_date) "
+                     "VALUES (?, ?, 1, '2025-01-01')",
+                     [(2, 'LLM-Gemini-Prompt-v1'), (3, 'ItemCF-Cosine-v1'), (4, 'Content-IVF-v1'),
+                      (5, 'Fallback-GenrePopular-v1')])
+
+    # 인기 영화에 평점이 몰리도록 zipf 비슷한 분포로 뽑는다
+    weights = [1.0 / (rank ** 0.8) for rank in range(1, n_movies + 1)]
+    cum_weights = list(itertools.accumulate(weights))  # choices()가 유저마다 다시 누적하지 않게
+    per_user = max(n_ratings // n_users, 1)
+    batch = []
+    total = 0
+    for u in range(1, n_users + 1):
+        count = min(per_user if u < n_users else n_ratings - total, n_movies)
+        if count <= 0:
+            break
+        seen = set()
+        for m in rng.choices(range(1, n_movies + 1), cum_weights=cum_weights, k=count * 2):
+            if m in seen:
+                continue
+            seen.add(m)
+            batch.append((u, m, float(rng.randint(1, 5)), 956703932 + rng.randint(0, 90_000_000)))
+            if len(seen) >= count:
+                break
+        total += len(seen)
+        if len(batch) >= 50_000:
+            conn.executemany("INSERT INTO ratings VALUES (?, ?, ?, ?)", batch)
+            batch.clear()
+    if batch:
+        conn.executemany("INSERT INTO ratings VALUES (?, ?, ?, ?)", batch)
+    conn.commit()
+    # 기본 ott.db처럼 rollback journal 모드로 되돌린다 (WAL은 DB 파일에 남는 설정)
+    conn.execute("PRAGMA journal_mode=DELETE")
+    conn.close()
+    return titles
+
+
+def make_fake_model(titles: List[str], delay: float = 1.0, k: int = 10, seed: int = 0,
+                    fail_rate: float = 0.0, stream_chunk: int = 8, slow_rate: float = 0.0,
+                    slow_delay: float = 0.0, garbage_rate: float = 0.0):
+    """
+    Chat model that sleeps for `delay` seconds and answers in the RecommendationJson format.
+    The async path uses asyncio.sleep, the sync path uses time.sleep, like a real network call.
+    With fail_rate > 0 a share of calls raise, to exercise retries.
+    slow_rate of the calls take slow_delay seconds instead (tail latency), and garbage_rate
+    of the answers are not JSON, to exercise the latency budget, hedging and parse retries.
+    Streaming (astream) spreads the same delay evenly over `stream_chunk`-character chunks.
+    """
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langchain_core.messages import AIMessage, AIMessageChunk
+    from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+    rng = random.Random(seed)
+
+    class SleepyFakeChatModel(BaseChatModel):
+        delay: float = 1.0
+        calls: int = 0
+
+        @property
+        def _llm_type(self) -> str:
+            return "sleepy-fake-chat-model"
+
+        def _answer(self) -> ChatResult:
+            self.calls += 1
+            if fail_rate and rng.random() < fail_rate:
+                raise RuntimeError("fake model failure")
+            if garbage_rate and rng.random() < garbage_rate:
+                content = "Sorry, here are some movies I like: {items: [unterminated"
+            else:
+                items = rng.sample(titles, min(k, len(titles)))
+                content = json.dumps({"items": items, "explanation": "benchmark"})
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+        def _delay(self) -> float:
+            return slow_delay if slow_rate and rng.random() < slow_rate else self.delay
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+            time.sleep(self._delay())
+            return self._answer()
+
+        async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+            await asyncio.sleep(self._delay())
+            return self._answer()
+
+        async def _astream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+            delay = self._delay()
+            content = self._answer().generations[0].message.content
+            pieces = [content[i:i + stream_chunk] for i in range(0, len(content), stream_chunk)]
+            for piece in pieces:
+                await asyncio.sleep(delay / len(pieces))
+                yield ChatGenerationChunk(message=AIMessageChunk(content=piece))
+
+    return SleepyFakeChatModel(delay=delay)
+
+
+def make_fake_chain(titles: List[str], delay: float = 1.0, k: int = 10, fail_rate: float = 0.0, **faults):
+    import llm_recommend
+    return llm_recommend.build_chain(make_fake_model(titles, delay, k, fail_rate=fail_rate, **faults))
+
+
+def percentile(samples: List[float], pct: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    idx = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[idx]
+
+
+def summarize(samples: List[float]) -> dict:
+    """
+    Latency samples in seconds -> milliseconds summary.
+    """
+    def ms(v):
+        return None if v is None else round(v * 1000, 3)
+    return {"count": len(samples),
+            "p50_ms": ms(percentile(samples, 50)),
+            "p95_ms": ms(percentile(samples, 95)),
+            "p99_ms": ms(percentile(samples, 99)),
+            "max_ms": ms(max(samples) if samples else None)}
+
+
+async def loop_stalls(coro, tick: float = 0.001):
+    """
+    Await `coro` while a ticker sleeps `tick` seconds in a loop; returns (result, summary of
+    how late each tick woke up). Large values mean the coroutine held the event loop.
+    """
+    samples = []
+    sleeping_since = [time.perf_counter()]
+
+    async def ticker():
+        while True:
+            sleeping_since[0] = time.perf_counter()
+            await asyncio.sleep(tick)
+            samples.append(time.perf_counter() - sleeping_since[0] - tick)
+
+    task = asyncio.create_task(ticker())
+    try:
+        result = await coro
+    finally:
+        task.cancel()
+        # coro가 끝날 때까지 루프를 잡고 있었으면 마지막 틱은 아직 깨지 못했다
+        samples.append(max(time.perf_counter() - sleeping_since[0] - tick, 0.0))
+    return result, summarize(samples)
@@ -0,0 +1,94 @@
+'''
+/api/recommend 동시 요청 중 /api/search 지연 시간 측정
+
+python benchmarks/load_test_recommend.py --recommend-requests 32 --llm-delay 1.0
+python benchmarks/load_test_recommend.py --blocking   # 예전 chain.invoke 동작과 비교
+'''
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from common import setup_app_env, make_synthetic_db, make_fake_chain, summarize
+
+
+async def search_loop(client, n_requests: int, samples: list):
+    for i in range(n_requests):
+        start = time.perf_counter()
+        response = await client.get("/api/search", params={"query": f"Movie {i % 50 + 1}"})
+        samples.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.text
+
+
+async def recommend_one(client, user_id: int, statuses: dict):
+    response = await client.post("/api/recommend", json={"userId": str(user_id)})
+    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+
+async def run(args):
+    import httpx
+    import llm_recommend
+    from main import app
+
+    titles = args.titles
+    llm_recommend.chain = make_fake_chain(titles, delay=args.llm_delay)
+    llm_recommend.llm_limiter = llm_recommend.LLMConcurrencyLimiter(
+        args.max_concurrency, args.max_queue, args.timeout)
+
+    if args.blocking:
+        # 수정 전처럼 이벤트 루프 안에서 동기 호출
+        async def blocking_invoke(inputs, deadline=None):
+            return llm_recommend.chain.invoke(inputs)
+        llm_recommend.invoke_with_budget = blocking_invoke
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            idle = []
+            await search_loop(client, args.search_requests, idle)
+
+            loaded = []
+            statuses = {}
+            start = time.perf_counter()
+            recommend_tasks = [asyncio.create_task(recommend_one(client, user_id, statuses))
+                               for user_id in range(1, args.recommend_requests + 1)]
+            await asyncio.sleep(0)
+            await search_loop(client, args.search_requests, loaded)
+            await asyncio.gather(*recommend_tasks)
+            elapsed = time.perf_counter() - start
+
+    return {"mode": "blocking" if args.blocking else "async",
+            "llm_delay_s": args.llm_delay,
+            "max_concurrency": args.max_concurrency,
+            "recommend_requests": args.recommend_requests,
+            "recommend_status_codes": statuses,
+            "search_idle": summarize(idle),
+            "search_under_recommend_load": summarize(loaded),
+            "total_elapsed_s": round(elapsed, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=6040)
+    parser.add_argument("--movies", type=int, default=3883)
+    parser.add_argument("--ratings", type=int, default=100_000)
+    parser.add_argument("--recommend-requests", type=int, default=32)
+    parser.add_argument("--search-requests", type=int, default=200)
+    parser.add_argument("--llm-delay", type=float, default=1.0)
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    parser.add_argument("--max-queue", type=int, default=64)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--blocking", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        setup_app_env(db_path)
+        args.titles = make_synthetic_db(db_path, args.users, args.movies, args.ratings)
+        print(json.dumps(asyncio.run(run(args)), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()